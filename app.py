@@ -5,7 +5,8 @@ Production Flask server for Jennifur RAG system on Azure App Service
 
 import os
 import sys
-from flask import Flask, request, jsonify
+import json
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import asyncio
 import logging
@@ -20,6 +21,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 # Import the RAG engine
 try:
     from api.client_aware_rag import ClientAwareRAGEngine
+    from api.event_loop import iterate_in_new_loop
     logger.info("Successfully imported ClientAwareRAGEngine")
 except ImportError as e:
     logger.error(f"Failed to import RAG engine: {e}")
@@ -56,7 +58,8 @@ def home():
         "status": "running",
         "endpoints": {
             "health": "/health",
-            "chat": "/api/chat"
+            "chat": "/api/chat",
+            "chat_stream": "/api/chat/stream"
         }
     })
 
@@ -118,12 +121,75 @@ def chat():
             logger.error(f"Chat processing failed: {str(e)}")
             return jsonify({"error": f"Chat processing failed: {str(e)}"}), 500
         finally:
-            loop.close()
+            # The engine's async search client is bound to this loop - close it first
+            try:
+                loop.run_until_complete(rag_engine.close_loop_clients())
+            finally:
+                loop.close()
             
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+def format_sse(event):
+    """Format a chat stream event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST', 'OPTIONS'])
+def chat_stream():
+    """Streaming chat endpoint - sends thoughts, then response tokens, as Server-Sent Events"""
+    
+    # Handle CORS preflight
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required"}), 400
+        
+        messages = data.get('messages', [])
+        if not messages:
+            return jsonify({"error": "Messages array is required"}), 400
+        
+        # Initialize RAG if needed
+        if rag_engine is None:
+            if not initialize_rag():
+                return jsonify({"error": "Failed to initialize RAG engine"}), 500
+        
+        logger.info(f"Streaming chat with {len(messages)} messages")
+        
+        def generate():
+            # Same per-request event loop as /api/chat, kept open until the stream ends
+            events = iterate_in_new_loop(
+                rag_engine.client_aware_chat_stream(
+                    messages=messages,
+                    client_context=data.get("client_context"),
+                    pm_context=data.get("pm_context"),
+                    session_id=data.get('session_id', 'production-session')
+                ),
+                cleanup=rag_engine.close_loop_clients
+            )
+            try:
+                for event in events:
+                    yield format_sse(event)
+            except Exception as e:
+                logger.error(f"Chat stream failed: {str(e)}")
+                yield format_sse({"type": "error", "error": f"Chat processing failed: {str(e)}"})
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"  # Don't let App Service's front end buffer the stream
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {str(e)}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
 # Initialize RAG engine on startup
 try:
     initialize_rag()
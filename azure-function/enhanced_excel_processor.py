@@ -3,13 +3,27 @@ Enhanced Excel Processor with Table-Aware Processing
 Processes Excel documents sheet by sheet while keeping entire tables together
 """
 
+import os
 import openpyxl
 from io import BytesIO
 import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from typing import Dict, Any, List, Optional, Tuple
 import datetime
 import re
+import itertools
 from dataclasses import dataclass
+try:
+    import numpy as np
+except ImportError:  # Optional - table detection falls back to the cell-by-cell scan
+    np = None
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # Optional Rust-backed reader; openpyxl is used without it
+    CalamineWorkbook = None
 
 @dataclass
 class TableRegion:
@@ -153,12 +167,114 @@ class SheetClientDetector:
             
         return min(1.0, score)
 
+class OpenpyxlWorkbookReader:
+    """openpyxl - pure Python, .xlsx/.xlsm only"""
+    
+    name = "openpyxl"
+    extensions = ('.xlsx', '.xlsm')
+    
+    @staticmethod
+    def available() -> bool:
+        return True
+    
+    def __init__(self, doc_content: bytes, processor: "EnhancedExcelProcessor"):
+        self.processor = processor
+        logger = processor.logger
+        # Try multiple loading strategies to handle formulas properly
+        try:
+            # First try: Load with data_only=True and read_only=False for best formula handling
+            self.workbook = openpyxl.load_workbook(BytesIO(doc_content), data_only=True, read_only=False)
+            logger.info(f'Loaded Excel workbook with data_only=True, read_only=False: {len(self.workbook.worksheets)} sheets')
+        except Exception as e:
+            logger.warning(f'Failed to load with data_only=True read_only=False: {str(e)}')
+            try:
+                # Second try: Standard data_only loading
+                self.workbook = openpyxl.load_workbook(BytesIO(doc_content), data_only=True, read_only=True)
+                logger.info(f'Loaded Excel workbook with data_only=True, read_only=True: {len(self.workbook.worksheets)} sheets')
+            except Exception as e2:
+                logger.warning(f'Failed to load with data_only=True: {str(e2)}')
+                # Third try: Load without data_only and handle formulas manually
+                self.workbook = openpyxl.load_workbook(BytesIO(doc_content), read_only=True)
+                logger.info(f'Loaded Excel workbook without data_only: {len(self.workbook.worksheets)} sheets')
+    
+    @property
+    def sheet_names(self) -> List[str]:
+        return self.workbook.sheetnames
+    
+    def read_grid(self, sheet_name: str) -> Optional[Tuple[List[List[str]], int, int]]:
+        """Formatted cell grid of the sheet's used range with its first row/column, or None if empty"""
+        sheet = self.workbook[sheet_name]
+        used_range = self.processor._get_used_range(sheet)
+        if not used_range:
+            return None
+        min_row, max_row, min_col, max_col = used_range
+        cell_grid = self.processor._read_cell_grid(sheet, min_row, max_row, min_col, max_col)
+        return self.processor._trim_blank_edges(cell_grid, min_row, min_col)
+    
+    def close(self):
+        self.workbook.close()
+
+
+class CalamineWorkbookReader:
+    """python-calamine (Rust calamine bindings) - much faster, and also reads legacy .xls"""
+    
+    name = "calamine"
+    extensions = ('.xlsx', '.xlsm', '.xlsb', '.xls', '.ods')
+    
+    @staticmethod
+    def available() -> bool:
+        return CalamineWorkbook is not None
+    
+    def __init__(self, doc_content: bytes, processor: "EnhancedExcelProcessor"):
+        self.processor = processor
+        self.workbook = CalamineWorkbook.from_filelike(BytesIO(doc_content))
+    
+    @property
+    def sheet_names(self) -> List[str]:
+        return self.workbook.sheet_names
+    
+    def read_grid(self, sheet_name: str) -> Optional[Tuple[List[List[str]], int, int]]:
+        """Formatted cell grid of the sheet's used range with its first row/column, or None if empty"""
+        sheet = self.workbook.get_sheet_by_name(sheet_name)
+        rows = sheet.to_python(skip_empty_area=True)
+        if not rows or sheet.start is None:
+            return None
+        width = max(len(row) for row in rows)
+        cell_grid = self.processor._format_cell_rows(rows, len(rows), width, self._format_cell_value)
+        return self.processor._trim_blank_edges(cell_grid, sheet.start[0] + 1, sheet.start[1] + 1)
+    
+    def _format_cell_value(self, cell_value) -> str:
+        # calamine returns date-only cells as dates; openpyxl returns midnight datetimes
+        if type(cell_value) is datetime.date:
+            cell_value = datetime.datetime.combine(cell_value, datetime.time())
+        return self.processor._format_cell_value(cell_value)
+    
+    def close(self):
+        self.workbook.close()
+
+
+# Tried in this order when the reader is "auto": calamine reads error cells (#DIV/0!, #N/A, ...)
+# as blank, so it is only the default for formats openpyxl cannot open
+WORKBOOK_READERS = {reader.name: reader for reader in (OpenpyxlWorkbookReader, CalamineWorkbookReader)}
+
+
 class EnhancedExcelProcessor:
     """Enhanced Excel processor that keeps tables together while processing sheet by sheet"""
     
-    def __init__(self, min_table_rows: int = 2, max_chunk_size: int = 8000):
+    # Excel error values, shown as empty cells
+    FORMULA_ERRORS = frozenset(['#REF!', '#VALUE!', '#DIV/0!', '#NAME?', '#N/A', '#NULL!', '#NUM!'])
+    
+    # Smaller workbooks are quicker to process in-line than to hand to the process pool
+    PARALLEL_MIN_BYTES = 128 * 1024
+    
+    def __init__(self, min_table_rows: int = 2, max_chunk_size: int = 8000, reader: str = "auto", workers: int = 0):
         self.min_table_rows = min_table_rows
         self.max_chunk_size = max_chunk_size
+        self.reader = reader  # "auto", "calamine" or "openpyxl"
+        # Processes for sheet-level parallel extraction; 0 or 1 processes sheets in this thread
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()  # extract_from_excel may run on several threads
         self.logger = logging.getLogger(__name__)
         # Initialize client detector for sheet-level client identification
         self.client_detector = SheetClientDetector()
@@ -166,37 +282,10 @@ class EnhancedExcelProcessor:
     def extract_from_excel(self, doc_content: bytes, filename: str = "") -> Dict[str, Any]:
         """Extract content from Excel file with table-aware processing"""
         try:
-            # Try multiple loading strategies to handle formulas properly
-            try:
-                # First try: Load with data_only=True and read_only=False for best formula handling
-                workbook = openpyxl.load_workbook(BytesIO(doc_content), data_only=True, read_only=False)
-                self.logger.info(f'Loaded Excel workbook with data_only=True, read_only=False: {len(workbook.worksheets)} sheets')
-                
-                # Force calculation of formulas by accessing all cells
-                for sheet in workbook.worksheets:
-                    for row in sheet.iter_rows():
-                        for cell in row:
-                            _ = cell.value  # Access value to trigger calculation
-                
-            except Exception as e:
-                self.logger.warning(f'Failed to load with data_only=True read_only=False: {str(e)}')
-                try:
-                    # Second try: Standard data_only loading
-                    workbook = openpyxl.load_workbook(BytesIO(doc_content), data_only=True, read_only=True)
-                    self.logger.info(f'Loaded Excel workbook with data_only=True, read_only=True: {len(workbook.worksheets)} sheets')
-                except Exception as e2:
-                    self.logger.warning(f'Failed to load with data_only=True: {str(e2)}')
-                    # Third try: Load without data_only and handle formulas manually
-                    workbook = openpyxl.load_workbook(BytesIO(doc_content), read_only=True)
-                    self.logger.info(f'Loaded Excel workbook without data_only: {len(workbook.worksheets)} sheets')
-            
+            reader_name, sheet_results = self._process_sheets(doc_content, filename)
             sheets_data = {}
             
-            for sheet_name in workbook.sheetnames:
-                self.logger.info(f'Processing sheet: {sheet_name}')
-                sheet = workbook[sheet_name]
-                sheet_data = self._process_sheet_with_tables(sheet, sheet_name)
-                
+            for sheet_name, sheet_data in sheet_results:
                 self.logger.info(f'Sheet "{sheet_name}" processed: content_length={len(sheet_data.get("content", ""))}, tables={len(sheet_data.get("tables", []))}')
                 
                 if sheet_data["content"] and len(sheet_data["content"].strip()) > 10:  # Lowered threshold
@@ -205,14 +294,13 @@ class EnhancedExcelProcessor:
                 else:
                     self.logger.warning(f'Sheet "{sheet_name}" skipped - insufficient content (length: {len(sheet_data.get("content", ""))})')
             
-            workbook.close()
-            
             return {
                 "type": "excel_sheets_enhanced",
                 "sheets": sheets_data,
                 "total_sheets": len(sheets_data),
                 "sheet_names": list(sheets_data.keys()),
-                "filename": filename
+                "filename": filename,
+                "reader": reader_name
             }
             
         except Exception as e:
@@ -226,24 +314,114 @@ class EnhancedExcelProcessor:
                 "filename": filename
             }
     
-    def _process_sheet_with_tables(self, sheet, sheet_name: str) -> Dict[str, Any]:
+    def _process_sheets(self, doc_content: bytes, filename: str = "") -> Tuple[str, List[Tuple[str, Dict[str, Any]]]]:
+        """Process every sheet in workbook order. Returns (reader name, [(sheet name, sheet data)])"""
+        workbook = self._open_workbook(doc_content, filename)
+        try:
+            sheet_names = workbook.sheet_names
+            self.logger.info(f'Reading {filename or "workbook"} with {workbook.name}: {len(sheet_names)} sheets')
+            
+            if self.workers > 1 and len(doc_content) >= self.PARALLEL_MIN_BYTES:
+                try:
+                    return workbook.name, self._process_sheets_in_pool(doc_content, filename, workbook.name, sheet_names)
+                except Exception as e:
+                    self.logger.warning(f'Parallel extraction of {filename or "workbook"} failed, processing sheets serially: {str(e)}')
+            
+            return workbook.name, [
+                (sheet_name, self._process_sheet_with_tables(workbook, sheet_name)) for sheet_name in sheet_names
+            ]
+        finally:
+            workbook.close()
+    
+    def _process_sheets_in_pool(self, doc_content: bytes, filename: str, reader_name: str,
+                                sheet_names: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Process sheets in worker processes
+        
+        The workbook bytes go into one shared memory block that every worker reads, instead of
+        being pickled into each task. A single-sheet workbook becomes one task, so workbooks
+        extracted concurrently from several threads still run on separate cores.
+        """
+        batch_count = min(len(sheet_names), self.workers * 2)
+        # Interleaved so large and small sheets spread across workers
+        batches = [sheet_names[index::batch_count] for index in range(batch_count)]
+        settings = {"min_table_rows": self.min_table_rows, "max_chunk_size": self.max_chunk_size, "reader": reader_name}
+        
+        shared = shared_memory.SharedMemory(create=True, size=max(len(doc_content), 1))
+        try:
+            shared.buf[:len(doc_content)] = doc_content
+            pool = self._get_pool()
+            futures = [
+                pool.submit(_process_sheet_batch, shared.name, len(doc_content), filename, batch, settings)
+                for batch in batches
+            ]
+            sheet_data = {}
+            for future in futures:
+                sheet_data.update(future.result())
+        finally:
+            shared.close()
+            shared.unlink()
+        
+        return [(sheet_name, sheet_data[sheet_name]) for sheet_name in sheet_names]
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # Spawned, not forked: callers run extraction from worker threads, and a fork
+                # taken while another thread holds a lock (logging, SDK clients) can deadlock
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+    
+    def close(self):
+        """Shut down the worker processes, if any were started"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+    
+    def _open_workbook(self, doc_content: bytes, filename: str = ""):
+        """
+        Open a workbook with the configured reader
+        
+        "auto" uses openpyxl for .xlsx/.xlsm and calamine for .xls/.xlsb/.ods; naming a
+        reader still falls back to the other one if it cannot open the file.
+        """
+        extension = os.path.splitext(filename)[1].lower() or '.xlsx'
+        preferred = [WORKBOOK_READERS[self.reader]] if self.reader in WORKBOOK_READERS else []
+        candidates = preferred + [reader for reader in WORKBOOK_READERS.values() if reader not in preferred]
+        
+        errors = []
+        for reader_class in candidates:
+            if not reader_class.available() or extension not in reader_class.extensions:
+                continue
+            try:
+                return reader_class(doc_content, self)
+            except Exception as e:
+                self.logger.warning(f'{reader_class.name} could not open {filename or "workbook"}: {str(e)}')
+                errors.append(f'{reader_class.name}: {str(e)}')
+        
+        if not errors:
+            raise ValueError(f'No Excel reader available for {extension} files (python-calamine is needed for .xls)')
+        raise ValueError('; '.join(errors))
+    
+    def _process_sheet_with_tables(self, workbook, sheet_name: str) -> Dict[str, Any]:
         """Process a single sheet identifying and preserving table structures"""
         
         # Detect client information from sheet name
         sheet_client_info = self.client_detector.detect_client_from_sheet_name(sheet_name)
         
-        # Get the actual used range of the sheet
-        used_range = self._get_used_range(sheet)
-        if not used_range:
+        # Read the used range of the sheet into a grid of cell values
+        grid = workbook.read_grid(sheet_name)
+        if not grid:
             result = {"content": "", "tables": [], "summary": "Empty sheet"}
             if sheet_client_info:
                 result["client_info"] = sheet_client_info
             return result
         
-        min_row, max_row, min_col, max_col = used_range
-        
-        # Read all cell values into a grid
-        cell_grid = self._read_cell_grid(sheet, min_row, max_row, min_col, max_col)
+        cell_grid, min_row, min_col = grid
         
         # Identify table regions
         table_regions = self._identify_table_regions(cell_grid, min_row, min_col)
@@ -283,19 +461,62 @@ class EnhancedExcelProcessor:
             return None
     
     def _read_cell_grid(self, sheet, min_row: int, max_row: int, min_col: int, max_col: int) -> List[List[str]]:
-        """Read all cell values into a 2D grid"""
+        """
+        Read all cell values into a 2D grid
+        
+        One streaming iter_rows pass - in read-only mode every sheet.cell() lookup re-parses the
+        sheet XML, which made large sheets quadratic.
+        """
+        rows = sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col, values_only=True)
+        return self._format_cell_rows(rows, max_row - min_row + 1, max_col - min_col + 1)
+    
+    def _format_cell_rows(self, rows, height: int, width: int, format_value=None) -> List[List[str]]:
+        """
+        Format rows of raw cell values into a height x width grid of strings
+        
+        Text and empty cells, the bulk of any sheet, are handled inline; everything else goes
+        through format_value (default _format_cell_value).
+        """
+        format_value = format_value or self._format_cell_value
+        formula_errors = self.FORMULA_ERRORS
         cell_grid = []
         
-        for row_idx in range(min_row, max_row + 1):
-            row_data = []
-            for col_idx in range(min_col, max_col + 1):
-                cell = sheet.cell(row=row_idx, column=col_idx)
-                cell_value = self._format_cell_value(cell.value)
-                row_data.append(cell_value)
+        for row in rows:
+            row_data = [
+                "" if value is None else format_value(value) if type(value) is not str
+                else "" if value.strip() in formula_errors else value.strip()
+                for value in row
+            ]
+            if len(row_data) < width:
+                row_data.extend([""] * (width - len(row_data)))
             cell_grid.append(row_data)
         
+        # Readers stop at the last stored row; keep the grid the size of the used range
+        while len(cell_grid) < height:
+            cell_grid.append([""] * width)
+        
         return cell_grid
     
+    def _trim_blank_edges(self, cell_grid: List[List[str]], min_row: int, min_col: int) -> Optional[Tuple[List[List[str]], int, int]]:
+        """
+        Drop blank outer rows and columns, or return None for a blank sheet
+        
+        openpyxl's <dimension> also counts styled and formula-only cells while calamine stops
+        at the last value, so both readers trim to the cells that actually have content.
+        """
+        occupied_rows = [row_idx for row_idx, row in enumerate(cell_grid) if any(row)]
+        if not occupied_rows:
+            return None
+        
+        cell_grid = cell_grid[occupied_rows[0]:occupied_rows[-1] + 1]
+        occupied = [row for row in cell_grid if any(row)]
+        left = min(next(col_idx for col_idx, value in enumerate(row) if value) for row in occupied)
+        right = max(len(row) - next(col_idx for col_idx, value in enumerate(reversed(row)) if value) for row in occupied)
+        if left or right < len(cell_grid[0]):
+            cell_grid = [row[left:right] for row in cell_grid]
+        
+        return cell_grid, min_row + occupied_rows[0], min_col + left
+    
     def _format_cell_value(self, cell_value) -> str:
         """Format a cell value to string, handling formulas and errors"""
         if cell_value is None:
@@ -305,7 +526,7 @@ class EnhancedExcelProcessor:
         if isinstance(cell_value, str):
             cell_str = cell_value.strip()
             # Skip cells with formula errors
-            if cell_str in ['#REF!', '#VALUE!', '#DIV/0!', '#NAME?', '#N/A', '#NULL!', '#NUM!']:
+            if cell_str in self.FORMULA_ERRORS:
                 return ""
             # Skip empty strings  
             if not cell_str:
@@ -335,6 +556,72 @@ class EnhancedExcelProcessor:
         if not cell_grid:
             return []
         
+        # Ragged grids (not produced by _read_cell_grid) keep the cell-by-cell semantics
+        width = len(cell_grid[0])
+        if np is None or width == 0 or any(len(row) != width for row in cell_grid):
+            return self._identify_table_regions_by_cell(cell_grid, start_row, start_col)
+        return self._identify_table_regions_vectorized(cell_grid, start_row, start_col)
+    
+    def _identify_table_regions_vectorized(self, cell_grid: List[List[str]], start_row: int, start_col: int) -> List[TableRegion]:
+        """
+        Same regions as _identify_table_regions_by_cell, found on a NumPy occupancy mask
+        
+        In the cell-by-cell scan a table can only start at the first unvisited non-empty cell of
+        a row, and it does when that cell has another non-empty cell to its right (header) and
+        the table reaches min_table_rows before two consecutive empty rows. End rows, header
+        counts and end columns are computed for all rows at once, so only one small array
+        operation per row remains, plus a slice assignment per table instead of a set entry per cell.
+        """
+        num_rows, width = len(cell_grid), len(cell_grid[0])
+        occupied = np.fromiter(
+            map(bool, map(str.strip, itertools.chain.from_iterable(cell_grid))), dtype=bool, count=num_rows * width
+        ).reshape(num_rows, width)
+        
+        # Table end row: the first of two consecutive empty rows below the header, else the last row
+        empty_rows = ~occupied.any(axis=1)
+        double_empty = np.flatnonzero(empty_rows[:-1] & empty_rows[1:])
+        row_indexes = np.arange(num_rows)
+        next_break = np.searchsorted(double_empty, row_indexes, side='right')
+        end_rows = np.append(double_empty, num_rows - 1)[next_break]
+        long_enough = end_rows - row_indexes + 1 >= self.min_table_rows
+        
+        # Header check: non-empty cells from each column to the end of the row
+        cells_to_right = np.cumsum(occupied[:, ::-1], axis=1)[:, ::-1]
+        last_cols = width - 1 - np.argmax(occupied[:, ::-1], axis=1)
+        header_starts = occupied & (cells_to_right >= 2)
+        first_starts = np.argmax(header_starts, axis=1).tolist()
+        last_starts = (width - 1 - np.argmax(header_starts[:, ::-1], axis=1)).tolist()
+        end_rows, last_cols = end_rows.tolist(), last_cols.tolist()
+        
+        table_regions = []
+        visited = np.zeros_like(occupied)
+        active = []  # (end_row, start_col, end_col) of tables found above that reach this row
+        for row_idx in np.flatnonzero(long_enough & header_starts.any(axis=1)).tolist():
+            active = [table for table in active if table[0] >= row_idx]
+            if not active:
+                col_idx = first_starts[row_idx]
+            elif any(first_col <= first_starts[row_idx] and last_starts[row_idx] <= last_col for _, first_col, last_col in active):
+                continue  # every possible header start lies inside a table already found
+            else:
+                candidates = header_starts[row_idx] & ~visited[row_idx]
+                if not candidates.any():
+                    continue
+                # Any unvisited non-empty cell further left would be a header start too
+                col_idx = int(np.argmax(candidates))
+            end_row, end_col = end_rows[row_idx], last_cols[row_idx]
+            table_regions.append(self._build_table_region(
+                cell_grid, row_idx, col_idx, end_row, end_col, start_row, start_col
+            ))
+            visited[row_idx:end_row + 1, col_idx:end_col + 1] = True
+            active.append((end_row, col_idx, end_col))
+        
+        return table_regions
+    
+    def _identify_table_regions_by_cell(self, cell_grid: List[List[str]], start_row: int, start_col: int) -> List[TableRegion]:
+        """Identify table regions by scanning the grid cell by cell"""
+        if not cell_grid:
+            return []
+        
         table_regions = []
         visited = set()
         
@@ -375,21 +662,14 @@ class EnhancedExcelProcessor:
         if end_row - start_row + 1 < self.min_table_rows:
             return None
         
-        # Extract headers and data
-        headers = []
-        for col in range(start_col, end_col + 1):
-            if col < len(current_row):
-                headers.append(current_row[col].strip())
-        
-        # Extract data rows
-        data_rows = []
-        for row_idx in range(start_row + 1, end_row + 1):
-            if row_idx < len(cell_grid):
-                row_data = []
-                for col_idx in range(start_col, end_col + 1):
-                    if col_idx < len(cell_grid[row_idx]):
-                        row_data.append(cell_grid[row_idx][col_idx].strip())
-                data_rows.append(row_data)
+        return self._build_table_region(cell_grid, start_row, start_col, end_row, end_col, sheet_start_row, sheet_start_col)
+    
+    def _build_table_region(self, cell_grid: List[List[str]], start_row: int, start_col: int, end_row: int, end_col: int,
+                            sheet_start_row: int, sheet_start_col: int) -> TableRegion:
+        """TableRegion for a header row and extent given as grid indexes"""
+        # Extract headers and data (slices stop at the end of short rows)
+        headers = list(map(str.strip, cell_grid[start_row][start_col:end_col + 1]))
+        data_rows = [list(map(str.strip, row[start_col:end_col + 1])) for row in cell_grid[start_row + 1:end_row + 1]]
         
         # Determine table type
         table_type = self._classify_table_type(headers, data_rows)
@@ -680,6 +960,22 @@ class EnhancedExcelProcessor:
         
         return chunk
 
+def _process_sheet_batch(shared_name: str, size: int, filename: str, sheet_names: List[str],
+                         settings: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Worker process: read the workbook bytes from shared memory and process some of its sheets"""
+    shared = shared_memory.SharedMemory(name=shared_name)
+    try:
+        doc_content = bytes(shared.buf[:size])
+    finally:
+        shared.close()
+    
+    processor = EnhancedExcelProcessor(**settings)
+    workbook = processor._open_workbook(doc_content, filename)
+    try:
+        return {sheet_name: processor._process_sheet_with_tables(workbook, sheet_name) for sheet_name in sheet_names}
+    finally:
+        workbook.close()
+
 # Test function
 def test_excel_processor():
     """Test the enhanced Excel processor with a sample file"""
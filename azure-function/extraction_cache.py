@@ -0,0 +1,184 @@
+"""
+Content-Addressed Extraction Cache
+Document Intelligence results keyed by the SHA-256 of the document bytes, so the same file
+copied into several folders, or re-ingested after a metadata fix, is only analysed once
+"""
+
+import os
+import gzip
+import json
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached payload format changes so old entries are ignored
+CACHE_FORMAT_VERSION = 1
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def cache_key(digest: str, model: str, variant: str = "") -> str:
+    """Blob/file name for an extraction: results differ per model and request options (e.g. page ranges)"""
+    suffix = f"-{variant}" if variant else ""
+    return f"v{CACHE_FORMAT_VERSION}/{model}/{digest[:2]}/{digest}{suffix}.json.gz"
+
+
+class LocalExtractionStore:
+    """Directory-backed store for local development and tests"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "extraction-cache")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, *key.split("/"))
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class BlobExtractionStore:
+    """Azure Blob Storage backed store shared by every ingestion run"""
+
+    def __init__(self, blob_service_client, container: str = "extraction-cache"):
+        self.container_client = blob_service_client.get_container_client(container)
+        self._container_checked = False
+
+    @classmethod
+    def from_connection_string(cls, connection_string: str, container: str = "extraction-cache") -> "BlobExtractionStore":
+        from azure.storage.blob import BlobServiceClient
+        return cls(BlobServiceClient.from_connection_string(connection_string), container)
+
+    def get(self, key: str) -> Optional[bytes]:
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            return self.container_client.download_blob(key).readall()
+        except ResourceNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        from azure.core.exceptions import ResourceExistsError
+        if not self._container_checked:
+            try:
+                self.container_client.create_container()
+            except ResourceExistsError:
+                pass
+            self._container_checked = True
+        self.container_client.upload_blob(name=key, data=data, overwrite=True)
+
+
+class ExtractionCache:
+    """
+    Cache of extraction payloads (JSON-serialisable, e.g. AnalyzeResult.to_dict()) by content hash
+
+    Lookups and writes never raise - a broken cache only costs the extraction it would have saved.
+    """
+
+    def __init__(self, store, enabled: bool = True):
+        self.store = store
+        self.enabled = enabled and store is not None
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "writes": 0, "errors": 0, "dollars_saved": 0.0}
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, content: bytes, model: str, variant: str = "", digest: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Cached record {"payload", "cost", ...} for content, or None"""
+        if not self.enabled:
+            return None
+        self._count("lookups")
+        key = cache_key(digest or content_hash(content), model, variant)
+        try:
+            data = self.store.get(key)
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed for {key}: {e}")
+            self._count("errors")
+            return None
+        if data is None:
+            self._count("misses")
+            return None
+        try:
+            record = json.loads(gzip.decompress(data).decode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable extraction cache entry {key}: {e}")
+            self._count("errors")
+            self._count("misses")
+            return None
+        self._count("hits")
+        self._count("dollars_saved", record.get("cost", 0.0))
+        return record
+
+    def put(self, content: bytes, model: str, payload: Any, cost: float = 0.0, filename: str = "",
+            variant: str = "", digest: Optional[str] = None):
+        """Store an extraction payload; cost is what a later hit saves"""
+        if not self.enabled:
+            return
+        key = cache_key(digest or content_hash(content), model, variant)
+        record = {
+            "payload": payload,
+            "cost": cost,
+            "model": model,
+            "size_bytes": len(content),
+            "first_filename": filename,
+            "created": datetime.datetime.utcnow().isoformat() + "Z",
+        }
+        try:
+            self.store.put(key, gzip.compress(json.dumps(record, separators=(",", ":")).encode("utf-8")))
+            self._count("writes")
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed for {key}: {e}")
+            self._count("errors")
+
+    async def aget(self, content: bytes, model: str, variant: str = "") -> Optional[Dict[str, Any]]:
+        """get() for async callers - hashing and storage I/O run off the event loop"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, content, model, variant)
+
+    async def aput(self, content: bytes, model: str, payload: Any, cost: float = 0.0, filename: str = "", variant: str = ""):
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.put, content, model, payload, cost, filename, variant)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["dollars_saved"] = round(stats["dollars_saved"], 4)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        return stats
+
+
+def create_extraction_cache(backend: str = "blob", connection_string: Optional[str] = None,
+                            blob_service_client=None, directory: Optional[str] = None) -> ExtractionCache:
+    """Cache for a backend name: "blob", "local" or "off" """
+    backend = (backend or "off").lower()
+    if backend == "local":
+        return ExtractionCache(LocalExtractionStore(directory))
+    if backend == "blob":
+        if blob_service_client is not None:
+            return ExtractionCache(BlobExtractionStore(blob_service_client))
+        if connection_string:
+            return ExtractionCache(BlobExtractionStore.from_connection_string(connection_string))
+    return ExtractionCache(None, enabled=False)
@@ -5,17 +5,42 @@ import azure.functions as func
 from azure.storage.blob import BlobServiceClient
 from azure.keyvault.secrets import SecretClient
 from azure.identity import DefaultAzureCredential
-from azure.ai.formrecognizer import DocumentAnalysisClient
+from azure.ai.formrecognizer import AnalyzeResult, DocumentAnalysisClient
 from azure.core.credentials import AzureKeyCredential
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
 import os
 import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import hashlib
 import random
+import time
+import queue
+import threading
 from pptx import Presentation  # Add this import for PowerPoint extraction
 from io import BytesIO
 import openpyxl
+import zipfile
+from xml.etree import ElementTree
 from urllib.parse import quote
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+try:
+    from pypdf import PdfReader
+except ImportError:  # Optional - without it every PDF goes to Document Intelligence
+    PdfReader = None
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # Optional - without it .xls files go to Document Intelligence
+    CalamineWorkbook = None
+try:
+    from azure.search.documents import SearchClient
+except ImportError:  # Optional - without it CHUNK_STORAGE_MODE=jsonl is not available
+    SearchClient = None
+
+# driveItem fields the crawlers use - keeps listing payloads small (eTag/cTag feed change detection)
+GRAPH_ITEM_SELECT = "id,name,size,file,folder,lastModifiedDateTime,eTag,cTag,@microsoft.graph.downloadUrl,parentReference"
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -39,7 +64,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         if file_name:
             folder_path = req_body.get('folder_path')
             processor = DocumentProcessor()
-            result = processor.process_single_file(site_name, folder_path, file_name)
+            try:
+                result = processor.process_single_file(site_name, folder_path, file_name)
+            finally:
+                processor.close()
             return func.HttpResponse(
                 json.dumps(result, indent=2),
                 status_code=200,
@@ -57,12 +85,15 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 
         processor = DocumentProcessor()
         results = []
-        for folder_path in folder_paths:
-            if folder_path:
-                result = processor.process_site_documents(site_name, folder_path, recursive)
-            else:
-                result = processor.process_site_documents(site_name, None, recursive)
-            results.append(result)
+        try:
+            for folder_path in folder_paths:
+                if folder_path:
+                    result = processor.process_site_documents(site_name, folder_path, recursive)
+                else:
+                    result = processor.process_site_documents(site_name, None, recursive)
+                results.append(result)
+        finally:
+            processor.close()
 
         return func.HttpResponse(
             json.dumps(results, indent=2),
@@ -77,6 +108,333 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json"
         )
 
+class GraphClient:
+    """
+    Microsoft Graph HTTP client shared by the crawlers and downloads
+    
+    One pooled requests.Session keeps TLS connections alive across calls. The access token
+    is cached and refreshed refresh_margin seconds before it expires (and once on a 401).
+    429/503/504 responses are retried after the server's Retry-After, or an exponential
+    backoff when none is given, with jitter so parallel workers don't retry in lockstep.
+    """
+    
+    RETRY_STATUSES = {429, 503, 504}
+    
+    def __init__(self, token_provider, max_retries: int = 5, backoff_base: float = 1.0, max_backoff: float = 60.0,
+                 pool_size: int = 32, refresh_margin: int = 300, timeout: float = 120.0):
+        self.token_provider = token_provider  # () -> (access_token, expires_in_seconds)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "throttled": 0, "retries": 0, "errors": 0, "token_refreshes": 0, "throttle_wait_seconds": 0.0}
+    
+    def token(self) -> str:
+        """Cached access token, refreshed shortly before it expires"""
+        with self._token_lock:
+            if self._token is None or time.monotonic() >= self._token_expires_at - self.refresh_margin:
+                token, expires_in = self.token_provider()
+                self._token = token
+                self._token_expires_at = time.monotonic() + expires_in
+                self._count("token_refreshes")
+            return self._token
+    
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+    
+    def _count(self, name: str, amount: float = 1):
+        with self._stats_lock:
+            self._stats[name] += amount
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["throttle_wait_seconds"] = round(stats["throttle_wait_seconds"], 2)
+        return stats
+    
+    def _retry_delay(self, response, attempt: int) -> float:
+        """Seconds to wait before the next attempt"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = (parsedate_to_datetime(retry_after) - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                # Never earlier than asked; jitter on top spreads out the retries
+                return max(0.0, delay) + random.uniform(0, self.backoff_base)
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * (2 ** attempt)))
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Authenticated request with throttling retries; the caller checks the final status"""
+        kwargs.setdefault('timeout', self.timeout)
+        extra_headers = kwargs.pop('headers', None) or {}
+        refreshed_on_401 = False
+        attempt = 0
+        while True:
+            headers = {**extra_headers, 'Authorization': f'Bearer {self.token()}'}
+            self._count("requests")
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    self._count("errors")
+                    raise
+                delay = self._retry_delay(None, attempt)
+                logging.warning(f'Graph request failed ({str(e)}), retrying in {delay:.1f}s')
+            else:
+                if response.status_code == 401 and not refreshed_on_401:
+                    refreshed_on_401 = True
+                    self.invalidate_token()
+                    continue
+                if response.status_code not in self.RETRY_STATUSES:
+                    if response.status_code >= 400:
+                        self._count("errors")
+                    return response
+                self._count("throttled")
+                if attempt >= self.max_retries:
+                    self._count("errors")
+                    return response
+                delay = self._retry_delay(response, attempt)
+                self._count("throttle_wait_seconds", delay)
+                logging.warning(f'⏳ Graph throttled ({response.status_code}), retrying in {delay:.1f}s')
+            
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+def _parse_timestamp(value: str):
+    """ISO 8601 timestamp (Graph or blob style) as an aware UTC datetime, or None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+class ProcessedDocumentLedger:
+    """
+    Documents already stored in jennifur-processed, held in memory for the run
+    
+    Each entry records the SharePoint version it was processed at (eTag, cTag,
+    lastModifiedDateTime, size), so edited files are picked up again while unchanged
+    ones are skipped. Persisted as one manifest blob so a run loads it with a single
+    download instead of a HEAD request per document. When no manifest exists yet it is
+    bootstrapped from one listing of the chunk container. New entries are written back in
+    batches with an ETag condition; if another run updated the manifest in the meantime,
+    both sets of entries are merged.
+    """
+    
+    def __init__(self, storage_client, container: str = "processed-documents",
+                 blob_name: str = "ledger/processed_documents.json",
+                 chunk_container: str = "jennifur-processed", batch_size: int = 25):
+        self.storage_client = storage_client
+        self.container = container
+        self.blob_name = blob_name
+        self.chunk_container = chunk_container
+        self.batch_size = max(1, batch_size)
+        self._documents = None  # doc_id -> entry, loaded on first use
+        self._pending = {}
+        self._removed = set()
+        self._etag = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {"source": None, "documents": 0, "marked": 0, "flushes": 0, "conflicts": 0, "flush_errors": 0}
+    
+    def _blob_client(self):
+        return self.storage_client.get_blob_client(container=self.container, blob=self.blob_name)
+    
+    def _download(self) -> tuple[Dict[str, Any], str]:
+        """Manifest entries and ETag; raises ResourceNotFoundError when there is no manifest"""
+        downloader = self._blob_client().download_blob()
+        manifest = json.loads(downloader.readall().decode('utf-8'))
+        return manifest.get("documents", {}), downloader.properties.etag
+    
+    def _bootstrap_from_chunks(self) -> Dict[str, Any]:
+        """One listing of the chunk container - a document is {doc_id}_0.json or {doc_id}.jsonl"""
+        container_client = self.storage_client.get_container_client(self.chunk_container)
+        documents = {}
+        for blob in container_client.list_blobs():
+            for suffix in ("_0.json", ".jsonl"):
+                if blob.name.endswith(suffix):
+                    last_modified = blob.last_modified.isoformat() if blob.last_modified else None
+                    documents[blob.name[:-len(suffix)]] = {"processed_at": last_modified}
+        return documents
+    
+    def _ensure_loaded(self):
+        if self._documents is not None:
+            return
+        with self._lock:
+            if self._documents is not None:
+                return
+            try:
+                documents, self._etag = self._download()
+                self.stats["source"] = "manifest"
+            except ResourceNotFoundError:
+                documents = self._load_fallback("no manifest yet")
+            except Exception as e:
+                documents = self._load_fallback(f"manifest unreadable: {str(e)}")
+            self.stats["documents"] = len(documents)
+            self._documents = documents
+            logging.info(f'📒 Processed-document ledger loaded from {self.stats["source"]}: {len(documents)} documents')
+    
+    def _load_fallback(self, reason: str) -> Dict[str, Any]:
+        """Rebuild from the chunk container; the result is persisted by the next flush"""
+        logging.info(f'📒 Building processed-document ledger from chunk listing ({reason})')
+        try:
+            documents = self._bootstrap_from_chunks()
+            self.stats["source"] = "chunk_listing"
+        except Exception as e:
+            logging.warning(f'Failed to list processed chunks, treating all documents as new: {str(e)}')
+            self.stats["source"] = "empty"
+            return {}
+        self._pending.update(documents)
+        return documents
+    
+    def contains(self, doc_id: str) -> bool:
+        self._ensure_loaded()
+        return doc_id in self._documents
+    
+    def entry(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """The recorded entry for a document (version fields and anything stored with it)"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._documents.get(doc_id)
+            return dict(entry) if entry is not None else None
+    
+    def change_status(self, doc_id: str, version: Dict[str, Any]) -> str:
+        """
+        "new", "changed" or "unchanged" for a document at the given SharePoint version
+        
+        Entries bootstrapped from the chunk listing carry no version; they count as changed
+        if the file was modified after it was processed, otherwise they adopt this version.
+        """
+        self._ensure_loaded()
+        entry = self._documents.get(doc_id)
+        if entry is None:
+            return "new"
+        
+        # eTag also changes on rename/move, which changes the path-derived client metadata
+        for key in ("etag", "ctag"):
+            if entry.get(key) and version.get(key):
+                return "unchanged" if entry[key] == version[key] else "changed"
+        if entry.get("last_modified") and version.get("last_modified"):
+            unchanged = entry["last_modified"] == version["last_modified"] and entry.get("size") == version.get("size")
+            return "unchanged" if unchanged else "changed"
+        
+        processed_at = _parse_timestamp(entry.get("processed_at"))
+        modified = _parse_timestamp(version.get("last_modified"))
+        if processed_at and modified and modified > processed_at:
+            return "changed"
+        with self._lock:
+            adopted = {**entry, **{k: v for k, v in version.items() if v}}
+            self._documents[doc_id] = adopted
+            self._pending[doc_id] = adopted
+        return "unchanged"
+    
+    def mark_processed(self, doc_id: str, version: Dict[str, Any] = None):
+        """Record a stored document; the manifest is written once batch_size entries are pending"""
+        self._ensure_loaded()
+        entry = {"processed_at": datetime.datetime.utcnow().isoformat() + "Z", **(version or {})}
+        with self._lock:
+            self._documents[doc_id] = entry
+            self._pending[doc_id] = entry
+            self.stats["marked"] += 1
+            self.stats["documents"] = len(self._documents)
+            batch_full = len(self._pending) >= self.batch_size
+        if batch_full:
+            self.flush()
+    
+    def forget(self, doc_id: str):
+        """Drop a document that was deleted from SharePoint; persisted by the next flush"""
+        self._ensure_loaded()
+        with self._lock:
+            self._documents.pop(doc_id, None)
+            self._pending.pop(doc_id, None)
+            self._removed.add(doc_id)
+            self.stats["documents"] = len(self._documents)
+    
+    def flush(self, max_attempts: int = 3):
+        """Write pending entries to the manifest, merging with concurrent writers"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._removed:
+                    return
+                pending = dict(self._pending)
+                removed = set(self._removed)
+                self._pending.clear()
+            
+            for attempt in range(max_attempts):
+                try:
+                    self._upload()
+                    with self._lock:
+                        self._removed -= removed
+                    self.stats["flushes"] += 1
+                    logging.info(f'📒 Processed-document ledger saved ({len(pending)} new, {self.stats["documents"]} total)')
+                    return
+                except (ResourceModifiedError, ResourceExistsError):
+                    # Another run wrote the manifest since we read it - merge its entries and retry
+                    self.stats["conflicts"] += 1
+                    try:
+                        remote, etag = self._download()
+                    except Exception as e:
+                        logging.warning(f'Failed to reload processed-document ledger: {str(e)}')
+                        break
+                    with self._lock:
+                        # Rebuilt from the remote manifest, not our copy, so entries another run
+                        # forgot stay forgotten; only this run's own changes are laid on top
+                        self._documents = {**remote, **pending, **self._pending}
+                        for doc_id in self._removed:
+                            self._documents.pop(doc_id, None)
+                        self._etag = etag
+                        self.stats["documents"] = len(self._documents)
+                except Exception as e:
+                    logging.warning(f'Failed to save processed-document ledger: {str(e)}')
+                    break
+            
+            # Keep the entries pending so the next flush tries again
+            self.stats["flush_errors"] += 1
+            with self._lock:
+                for doc_id, entry in pending.items():
+                    self._pending.setdefault(doc_id, entry)
+    
+    def _upload(self):
+        with self._lock:
+            manifest = {
+                "updated": datetime.datetime.utcnow().isoformat() + "Z",
+                "documents": dict(self._documents)
+            }
+            etag = self._etag
+        data = json.dumps(manifest, separators=(',', ':'))
+        if etag:
+            response = self._blob_client().upload_blob(
+                data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified,
+                content_type='application/json'
+            )
+        else:
+            response = self._blob_client().upload_blob(data, overwrite=False, content_type='application/json')
+        with self._lock:
+            self._etag = response.get('etag')
+
 class DocumentProcessor:
     def __init__(self):
         """Initialize Azure services and Graph API connection"""
@@ -93,18 +451,111 @@ class DocumentProcessor:
             self.test_mode = os.environ.get('TEST_MODE', 'false').lower() == 'true'
             self.max_documents_per_run = int(os.environ.get('MAX_DOCUMENTS_PER_RUN', '100'))  # Increased from 50
             self.max_file_size_mb = int(os.environ.get('MAX_FILE_SIZE_MB', '100'))
+            self.max_cost_per_run = float(os.environ.get('MAX_COST_PER_RUN', '0'))  # 0 = no dollar limit
             self.skip_doc_intelligence_for_large_files = True
             
+            # *** Pipeline Settings ***
+            # Workers per stage - downloads, Document Intelligence and uploads of different
+            # documents overlap; set all to 1 for strictly one-at-a-time processing
+            self.download_workers = max(1, int(os.environ.get('PIPELINE_DOWNLOAD_WORKERS', '4')))
+            self.extract_workers = max(1, int(os.environ.get('PIPELINE_EXTRACT_WORKERS', '4')))
+            self.upload_workers = max(1, int(os.environ.get('PIPELINE_UPLOAD_WORKERS', '4')))
+            self.pipeline_queue_size = max(1, int(os.environ.get('PIPELINE_QUEUE_SIZE', '8')))
+            self._stats_lock = threading.Lock()
+            # Wall-clock budget for the whole invocation - host.json's functionTimeout is 10 minutes,
+            # the rest is headroom for flushing the ledger and returning the response
+            self.run_time_budget_seconds = float(os.environ.get('RUN_TIME_BUDGET_SECONDS', '540'))
+            self.run_deadline = time.monotonic() + self.run_time_budget_seconds
+            # No new documents are admitted once less than this is left; those in flight finish
+            self.pipeline_admission_cutoff_seconds = float(os.environ.get('PIPELINE_ADMISSION_CUTOFF_SECONDS', '120'))
+            
+            # *** Crawler Settings ***
+            # "children" pages through folder listings; "delta" uses Graph delta queries and
+            # after the first full pass only fetches items changed or deleted since the last run
+            self.crawl_mode = os.environ.get('GRAPH_CRAWL_MODE', 'children').lower()
+            # Folder listings in flight at once when crawling recursively
+            self.crawl_concurrency = max(1, int(os.environ.get('GRAPH_CRAWL_CONCURRENCY', '8')))
+            self._pending_delta_state = {}
+            
+            # *** Storage Settings ***
+            # "blob_per_chunk" writes {chunk_id}.json per chunk; "jsonl" writes one {doc_id}.jsonl
+            # per document for a blob indexer with parsingMode=jsonLines (same index schema and keys);
+            # jsonl needs the search index settings below to delete chunks a new version drops
+            self.chunk_storage_mode = os.environ.get('CHUNK_STORAGE_MODE', 'blob_per_chunk').lower()
+            # Magic Meeting Tracker: keep a content hash per sheet in the ledger and, when the
+            # file changes, only rebuild and upload sheets whose hash changed
+            self.incremental_tracker_ingest = os.environ.get('INCREMENTAL_TRACKER_INGEST', 'true').lower() == 'true'
+            
+            # *** Extraction Routing ***
+            # Office/text files are parsed locally first and only escalated to Document
+            # Intelligence when the local text is missing or looks unusable
+            self.local_first_extraction = os.environ.get('LOCAL_FIRST_EXTRACTION', 'true').lower() == 'true'
+            self.local_extraction_min_chars = int(os.environ.get('LOCAL_EXTRACTION_MIN_CHARS', '100'))
+            self.local_extractors = {
+                '.txt': ("text decoder", self._extract_txt_locally),
+                '.docx': ("docx XML parser", self._extract_docx_locally),
+                '.pptx': ("python-pptx", self._extract_pptx_locally),
+                '.xlsx': ("openpyxl", self._extract_xlsx_locally),
+            }
+            if CalamineWorkbook is not None:
+                self.local_extractors['.xls'] = ("calamine", self._extract_xls_locally)
+            # PDFs: use the embedded text layer and only OCR pages without one
+            self.pdf_text_layer_detection = os.environ.get('PDF_TEXT_LAYER_DETECTION', 'true').lower() == 'true' and PdfReader is not None
+            self.pdf_min_chars_per_page = int(os.environ.get('PDF_MIN_CHARS_PER_PAGE', '50'))
+            self.pdf_min_text_coverage = float(os.environ.get('PDF_MIN_TEXT_COVERAGE', '0.5'))  # else OCR the whole file
+            
             # Initialize Azure clients
             self.storage_client = BlobServiceClient.from_connection_string(self.storage_connection)
+            
+            # Search index - a rewritten .jsonl blob keeps existing, so blob deletion detection never
+            # removes chunks a new version dropped; jsonl mode deletes them from the index directly
+            self.search_client = None
+            search_endpoint = os.environ.get('AZURE_SEARCH_ENDPOINT')
+            search_key = os.environ.get('AZURE_SEARCH_ADMIN_KEY')
+            search_index = os.environ.get('EXISTING_INDEX_NAME')
+            if SearchClient is not None and search_endpoint and search_key and search_index:
+                self.search_client = SearchClient(
+                    endpoint=search_endpoint,
+                    index_name=search_index,
+                    credential=AzureKeyCredential(search_key)
+                )
+            if self.chunk_storage_mode == 'jsonl' and self.search_client is None:
+                logging.error('CHUNK_STORAGE_MODE=jsonl needs azure-search-documents, AZURE_SEARCH_ENDPOINT, '
+                              'AZURE_SEARCH_ADMIN_KEY and EXISTING_INDEX_NAME to remove dropped chunks - '
+                              'storing one blob per chunk instead')
+                self.chunk_storage_mode = 'blob_per_chunk'
+            
+            # Document Intelligence results by SHA-256 of the file bytes - "blob" (shared
+            # extraction-cache container), "local" (EXTRACTION_CACHE_DIR, for tests) or "off"
+            import sys
+            sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+            from extraction_cache import create_extraction_cache
+            self.extraction_cache = create_extraction_cache(
+                os.environ.get('EXTRACTION_CACHE', 'blob'),
+                blob_service_client=self.storage_client,
+                directory=os.environ.get('EXTRACTION_CACHE_DIR')
+            )
+            self.processed_ledger = ProcessedDocumentLedger(
+                self.storage_client,
+                batch_size=int(os.environ.get('LEDGER_FLUSH_BATCH_SIZE', '25'))
+            )
+            # Magic Meeting Tracker extraction - one processor, and one worker pool when
+            # EXCEL_WORKERS > 1, for the whole run; shut down by close()
+            from enhanced_excel_processor import EnhancedExcelProcessor
+            self.excel_processor = EnhancedExcelProcessor(
+                reader=os.environ.get('EXCEL_READER', 'auto'),
+                workers=int(os.environ.get('EXCEL_WORKERS', '0'))
+            )
             self.key_vault_client = SecretClient(vault_url=self.key_vault_url, credential=DefaultAzureCredential())
             self.doc_intelligence_client = DocumentAnalysisClient(
                 endpoint=self.doc_intelligence_endpoint,
                 credential=AzureKeyCredential(self.doc_intelligence_key)
             )
             
-            # Get Graph API token
-            self.graph_token = self._get_graph_token()
+            # Graph API client - pooled connections, cached token, throttling retries
+            self._graph_client_secret = None
+            self.graph_client = GraphClient(self._request_graph_token)
+            self.graph_client.token()  # Fail fast on bad credentials
             
             # Define supported file types with size preferences
             self.supported_extensions = {'.pdf', '.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt', '.txt'}
@@ -133,30 +584,37 @@ class DocumentProcessor:
             logging.error(f'Failed to initialize DocumentProcessor: {str(e)}')
             raise
     
-    def _get_graph_token(self) -> str:
-        """Get Microsoft Graph API access token"""
+    def _request_graph_token(self) -> tuple[str, int]:
+        """Fetch a Microsoft Graph API access token. Returns (token, expires_in_seconds)"""
         try:
-            client_secret = self.key_vault_client.get_secret("Jennifur-Client-Secret").value
+            if self._graph_client_secret is None:
+                self._graph_client_secret = self.key_vault_client.get_secret("Jennifur-Client-Secret").value
             
             token_data = {
                 'client_id': '8bb9c943-15df-4b66-b52f-4c40debdee88',  # Your Jennifur-AI-Assistant app ID
-                'client_secret': client_secret,
+                'client_secret': self._graph_client_secret,
                 'scope': 'https://graph.microsoft.com/.default',
                 'grant_type': 'client_credentials'
             }
             
-            response = requests.post(
+            response = self.graph_client.session.post(
                 'https://login.microsoftonline.com/95be67cb-cbae-432a-b9ca-d3befaae2e0e/oauth2/v2.0/token',
-                data=token_data
+                data=token_data,
+                timeout=30
             )
             response.raise_for_status()
             
-            return response.json()['access_token']
+            payload = response.json()
+            return payload['access_token'], int(payload.get('expires_in', 3599))
             
         except Exception as e:
             logging.error(f'Failed to get Graph API token: {str(e)}')
             raise
 
+    def close(self):
+        """Shut down the Excel worker processes, if any were started"""
+        self.excel_processor.close()
+    
     def process_site_documents(self, site_name: str, folder_path: str = None, recursive: bool = False) -> Dict[str, Any]:
         """Process documents from a specific SharePoint site with comprehensive error tracking"""
         
@@ -168,13 +626,22 @@ class DocumentProcessor:
             "documents_quarantined": 0,
             "documents_flagged": 0,
             "documents_skipped": 0,
+            "documents_new": 0,
+            "documents_changed": 0,
+            "documents_unchanged": 0,
             "documents_failed": 0,
             "documents_skipped_size_limit": 0,
             "documents_skipped_extraction_failed": 0,
+            "documents_skipped_deadline": 0,
             "folders_skipped": 0,
             "processing_errors": [],
             "file_type_summary": {},
             "cost_estimate": 0.0,
+            "chunk_storage_mode": self.chunk_storage_mode,
+            "blobs_written": 0,
+            "bytes_written": 0,
+            "extraction_routes": {},
+            "pdf_pages": {},
             "total_processing_time_seconds": 0
         }
         
@@ -189,6 +656,7 @@ class DocumentProcessor:
             
             # Load checkpoint for resuming from last position
             checkpoint = self._load_checkpoint(site_name, folder_path)
+            self._pending_delta_state = {}
             
             # Get documents from site
             documents = self._get_site_documents(site_id, folder_path, site_name, checkpoint, recursive)
@@ -199,66 +667,18 @@ class DocumentProcessor:
             site_results["folder_path"] = folder_path or "/"
             site_results["recursive"] = recursive
 
+            # Compare against the processed-document ledger - only new and changed files are processed
+            self._classify_documents(documents, site_results)
+            
             # Prioritize documents for RAG ingestion
             documents_to_process = self._prioritize_documents_for_testing(documents)
             logging.info(f"[BATCH] Prioritized {len(documents_to_process)} documents for processing (max per run: {self.max_documents_per_run})")
 
-            processed_count = 0
-            # Process each document with cost tracking
-            for doc in documents_to_process:
-                # Check if we've hit our processing limit
-                if self.processing_stats["documents_processed_this_run"] >= self.max_documents_per_run:
-                    logging.info(f'🛑 Hit processing limit ({self.max_documents_per_run}), stopping')
-                    break
-                
-                try:
-                    result = self._process_single_document_with_cost_control(doc)
-                    
-                    # Update counters
-                    action = result.get("action", "unknown")
-                    extension = result.get("extension", "unknown")
-                    cost = result.get("cost_estimate", 0.0)
-                    
-                    # Update processing stats
-                    if action in ["processed", "quarantined", "flagged"]:
-                        self.processing_stats["documents_processed_this_run"] += 1
-                        self.processing_stats["total_cost_estimate"] += cost
-                        site_results["cost_estimate"] += cost
-                    
-                    # Count by action
-                    if action == "processed":
-                        site_results["documents_processed"] += 1
-                    elif action == "quarantined":
-                        site_results["documents_quarantined"] += 1
-                    elif action == "flagged":
-                        site_results["documents_flagged"] += 1
-                    elif action == "skipped":
-                        site_results["documents_skipped"] += 1
-                        if result.get("reason") == "already_processed":
-                            logging.debug(f'⏭️ Document already processed: {result.get("path", "unknown")}')
-                    elif action == "skipped_size_limit":
-                        site_results["documents_skipped_size_limit"] += 1
-                    elif action == "skipped_extraction_failed":
-                        site_results["documents_skipped_extraction_failed"] += 1
-                    else:
-                        site_results["documents_failed"] += 1
-                        site_results["processing_errors"].append({
-                            "file": result.get("path", "unknown"),
-                            "reason": result.get("reason", "unknown"),
-                            "extension": extension
-                        })
-                    
-                    # Count by file type
-                    site_results["file_type_summary"][extension] = site_results["file_type_summary"].get(extension, 0) + 1
-                    
-                except Exception as e:
-                    logging.error(f'❌ Critical error processing document {doc.get("name", "unknown")}: {str(e)}')
-                    site_results["documents_failed"] += 1
-                    site_results["processing_errors"].append({
-                        "file": doc.get("path", doc.get("name", "unknown")),
-                        "reason": f"critical_error: {str(e)}",
-                        "extension": doc.get("extension", "unknown")
-                    })
+            # Download, extract and store documents in overlapping stages
+            processed_count = self._run_document_pipeline(documents_to_process, site_results, self.run_deadline)
+            self._commit_delta_checkpoint(site_name, folder_path, checkpoint, site_results)
+            site_results["graph"] = self.graph_client.stats()
+            site_results["extraction_cache"] = self.extraction_cache.stats()
             
             # Calculate total processing time
             processing_end = datetime.datetime.utcnow()
@@ -270,11 +690,19 @@ class DocumentProcessor:
             logging.info(f'   Quarantined: {site_results["documents_quarantined"]}')
             logging.info(f'   Flagged: {site_results["documents_flagged"]}')
             logging.info(f'   Skipped (already processed): {site_results["documents_skipped"]}')
+            logging.info(f'   Discovered new/changed/unchanged: {site_results["documents_new"]}/{site_results["documents_changed"]}/{site_results["documents_unchanged"]}')
             logging.info(f'   Skipped (size limit): {site_results["documents_skipped_size_limit"]}')
             logging.info(f'   Skipped (extraction failed): {site_results["documents_skipped_extraction_failed"]}')
+            logging.info(f'   Skipped (out of time, retried next run): {site_results["documents_skipped_deadline"]}')
             logging.info(f'   Failed: {site_results["documents_failed"]}')
             logging.info(f'   Estimated cost: ${site_results["cost_estimate"]:.4f}')
+            logging.info(f'   Chunk storage ({self.chunk_storage_mode}): {site_results["blobs_written"]} blobs, {site_results["bytes_written"]:,} bytes')
             logging.info(f'   Total time: {site_results["total_processing_time_seconds"]}s')
+            logging.info(f'   Pipeline workers: {site_results["pipeline"]}')
+            logging.info(f'   Graph requests: {site_results["graph"]}')
+            logging.info(f'   Extraction routes: {site_results["extraction_routes"]}')
+            logging.info(f'   PDF pages (total/text layer/OCR): {site_results["pdf_pages"]}')
+            logging.info(f'   Extraction cache: {site_results["extraction_cache"]["hits"]} hits, ${site_results["extraction_cache"]["dollars_saved"]:.4f} saved')
             logging.info(f"[BATCH] Actually processed {processed_count} documents in this run.")
             
             return site_results
@@ -291,16 +719,248 @@ class DocumentProcessor:
             })
             return site_results
 
+    def _estimate_extraction_cost(self, size_bytes: int) -> float:
+        """Document Intelligence cost estimate - ~$1.00 per 1,000 pages at ~0.5MB per page"""
+        estimated_pages = max(1, (size_bytes / (1024 * 1024)) / 0.5)
+        return estimated_pages * 0.001
+
+    def _record_document_result(self, site_results: Dict[str, Any], result: Dict[str, Any]) -> bool:
+        """Fold one document result into site_results. Returns True if it counts toward the run limit"""
+        action = result.get("action", "unknown")
+        extension = result.get("extension", "unknown")
+        cost = result.get("cost_estimate", 0.0)
+        counted = action in ["processed", "quarantined", "flagged"]
+        
+        with self._stats_lock:
+            # Update processing stats
+            if counted:
+                self.processing_stats["documents_processed_this_run"] += 1
+                self.processing_stats["total_cost_estimate"] += cost
+                site_results["cost_estimate"] += cost
+            site_results["blobs_written"] += result.get("blobs_written", 0)
+            site_results["bytes_written"] += result.get("bytes_written", 0)
+            route = result.get("extraction_route")
+            if route:
+                route_stats = site_results["extraction_routes"].setdefault(route, {"documents": 0, "seconds": 0.0})
+                route_stats["documents"] += 1
+                route_stats["seconds"] = round(route_stats["seconds"] + result.get("extraction_seconds", 0.0), 3)
+            for key, pages in result.get("pdf_pages", {}).items():
+                site_results["pdf_pages"][key] = site_results["pdf_pages"].get(key, 0) + pages
+            
+            # Count by action
+            if action == "processed":
+                site_results["documents_processed"] += 1
+            elif action == "quarantined":
+                site_results["documents_quarantined"] += 1
+            elif action == "flagged":
+                site_results["documents_flagged"] += 1
+            elif action == "skipped":
+                site_results["documents_skipped"] += 1
+                if result.get("reason") == "already_processed":
+                    logging.debug(f'⏭️ Document already processed: {result.get("path", "unknown")}')
+            elif action == "skipped_size_limit":
+                site_results["documents_skipped_size_limit"] += 1
+            elif action == "skipped_extraction_failed":
+                site_results["documents_skipped_extraction_failed"] += 1
+            elif action == "skipped_deadline":
+                site_results["documents_skipped_deadline"] += 1
+            else:
+                site_results["documents_failed"] += 1
+                site_results["processing_errors"].append({
+                    "file": result.get("path", "unknown"),
+                    "reason": result.get("reason", "unknown"),
+                    "extension": extension
+                })
+            
+            # Count by file type
+            site_results["file_type_summary"][extension] = site_results["file_type_summary"].get(extension, 0) + 1
+        
+        return counted
+
+    def _run_document_pipeline(self, documents: List[Dict[str, Any]], site_results: Dict[str, Any],
+                               deadline: Optional[float] = None) -> int:
+        """
+        Process documents through download -> extract -> store stages, each with its own worker pool
+        
+        Stages are connected by bounded queues, so a slow stage applies back-pressure instead of
+        buffering whole documents in memory. A document is only admitted while the run still has
+        room under max_documents_per_run and max_cost_per_run, counting documents in flight as
+        if they will succeed - the limits are never overshot, and a document that ends up skipped
+        frees its slot for the next one.
+        
+        deadline (time.monotonic()) bounds the run: admission stops pipeline_admission_cutoff_seconds
+        before it, queued documents still waiting at the deadline are skipped, and workers are
+        joined with timeouts. Documents not finished by then are recorded as skipped_deadline and
+        stay unprocessed in the ledger, so the next run picks them up.
+        
+        Returns:
+            Number of documents that counted toward the run limit
+        """
+        download_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        extract_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        upload_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        
+        admission = threading.Condition()
+        in_flight = {"documents": 0, "cost": 0.0}
+        completed = {"counted": 0, "admitted": 0}
+        pending = {}  # id(work) -> work for documents admitted and not yet recorded
+        
+        def time_left() -> Optional[float]:
+            return None if deadline is None else deadline - time.monotonic()
+        
+        def admission_time_left() -> Optional[float]:
+            remaining = time_left()
+            return None if remaining is None else max(0.0, remaining - self.pipeline_admission_cutoff_seconds)
+        
+        def run_limits_reached() -> bool:
+            if self.processing_stats["documents_processed_this_run"] >= self.max_documents_per_run:
+                return True
+            return bool(self.max_cost_per_run) and self.processing_stats["total_cost_estimate"] >= self.max_cost_per_run
+        
+        def has_room(reserved_cost: float) -> bool:
+            if self.processing_stats["documents_processed_this_run"] + in_flight["documents"] >= self.max_documents_per_run:
+                return False
+            if self.max_cost_per_run and in_flight["documents"]:
+                committed = self.processing_stats["total_cost_estimate"] + in_flight["cost"]
+                return committed + reserved_cost <= self.max_cost_per_run
+            return True
+        
+        def finish(work: Dict[str, Any], result: Dict[str, Any]):
+            with admission:
+                if pending.pop(id(work), None) is None:
+                    return  # Already recorded as skipped when the run ran out of time
+            counted = self._record_document_result(site_results, result)
+            with admission:
+                in_flight["documents"] -= 1
+                in_flight["cost"] -= work["reserved_cost"]
+                if counted:
+                    completed["counted"] += 1
+                admission.notify_all()
+        
+        def fail(work: Dict[str, Any], error: Exception):
+            doc = work["doc"]
+            logging.error(f'❌ Critical error processing document {doc.get("name", "unknown")}: {str(error)}')
+            finish(work, {
+                "action": "error",
+                "path": doc.get("path", doc.get("name", "unknown")),
+                "reason": f"critical_error: {str(error)}",
+                "extension": doc.get("extension", "unknown")
+            })
+        
+        def skip_for_deadline(work: Dict[str, Any]):
+            doc = work["doc"]
+            finish(work, {
+                "action": "skipped_deadline",
+                "path": doc.get("path", doc.get("name", "unknown")),
+                "reason": "run_time_budget_exhausted",
+                "extension": doc.get("extension", "unknown")
+            })
+        
+        def put_before_deadline(target: queue.Queue, item) -> bool:
+            remaining = time_left()
+            try:
+                target.put(item, timeout=None if remaining is None else max(0.0, remaining))
+                return True
+            except queue.Full:
+                return False
+        
+        def stage_worker(stage, inbox: queue.Queue, outbox: queue.Queue = None):
+            while True:
+                work = inbox.get()
+                if work is None:
+                    return
+                remaining = time_left()
+                if remaining is not None and remaining <= 0:
+                    # Drain without starting work the function host would kill mid-way
+                    skip_for_deadline(work)
+                    continue
+                try:
+                    result = stage(work)
+                except Exception as e:
+                    fail(work, e)
+                    continue
+                if result is not None:
+                    finish(work, result)
+                elif not put_before_deadline(outbox, work):
+                    skip_for_deadline(work)
+        
+        stages = [
+            (self._download_stage, download_queue, extract_queue, self.download_workers),
+            (self._extract_stage, extract_queue, upload_queue, self.extract_workers),
+            (self._store_stage, upload_queue, None, self.upload_workers),
+        ]
+        pools = []
+        for stage, inbox, outbox, worker_count in stages:
+            threads = [
+                threading.Thread(target=stage_worker, args=(stage, inbox, outbox), name=f"{stage.__name__}-{i}", daemon=True)
+                for i in range(worker_count)
+            ]
+            for thread in threads:
+                thread.start()
+            pools.append((inbox, threads))
+        
+        # Feed documents as run limits and the time budget allow
+        for doc in documents:
+            reserved_cost = self._estimate_extraction_cost(doc.get('size', 0)) if self.max_cost_per_run else 0.0
+            with admission:
+                while not run_limits_reached() and not has_room(reserved_cost) and admission_time_left() != 0:
+                    admission.wait(admission_time_left())
+                if run_limits_reached():
+                    logging.info(f'🛑 Hit processing limit ({self.max_documents_per_run} documents'
+                                 f'{f", ${self.max_cost_per_run:.2f}" if self.max_cost_per_run else ""}), stopping')
+                    break
+                if admission_time_left() == 0:
+                    logging.warning(f'⏱️ Less than {self.pipeline_admission_cutoff_seconds:.0f}s of the run budget left, '
+                                    f'not admitting more documents')
+                    break
+                work = self._new_work_item(doc, reserved_cost)
+                pending[id(work)] = work
+                in_flight["documents"] += 1
+                in_flight["cost"] += reserved_cost
+                completed["admitted"] += 1
+            remaining = admission_time_left()
+            try:
+                download_queue.put(work, timeout=remaining)
+            except queue.Full:
+                logging.warning('⏱️ Pipeline still full at the admission cutoff, not admitting more documents')
+                skip_for_deadline(work)
+                break
+        
+        # Drain stage by stage: a stage's sentinels go in once everything upstream has finished.
+        # Past the deadline the joins stop waiting; stuck workers are daemon threads.
+        for inbox, threads in pools:
+            for _ in threads:
+                if not put_before_deadline(inbox, None):
+                    break
+            for thread in threads:
+                remaining = time_left()
+                thread.join(None if remaining is None else max(0.0, remaining))
+        
+        with admission:
+            unfinished = list(pending.values())
+        if unfinished:
+            logging.warning(f'⏱️ Run time budget exhausted with {len(unfinished)} documents unfinished - they will be retried next run')
+        for work in unfinished:
+            skip_for_deadline(work)
+        
+        # Persist ledger entries left over from the last partial batch
+        self.processed_ledger.flush()
+        site_results["processed_ledger"] = dict(self.processed_ledger.stats)
+        
+        site_results["pipeline"] = {
+            "download_workers": self.download_workers,
+            "extract_workers": self.extract_workers,
+            "upload_workers": self.upload_workers,
+            "queue_size": self.pipeline_queue_size,
+            "documents_admitted": completed["admitted"]
+        }
+        return completed["counted"]
+
     def _get_site_id(self, site_name: str) -> str:
         """Get SharePoint site ID by name"""
         try:
-            headers = {'Authorization': f'Bearer {self.graph_token}'}
-            
             # Search for site
-            response = requests.get(
-                f'https://graph.microsoft.com/v1.0/sites?search={site_name}',
-                headers=headers
-            )
+            response = self.graph_client.get(f'https://graph.microsoft.com/v1.0/sites?search={site_name}')
             response.raise_for_status()
             
             sites = response.json().get('value', [])
@@ -351,8 +1011,8 @@ class DocumentProcessor:
             logging.warning(f'Failed to load checkpoint for {site_name}/{folder_path or "root"}: {str(e)}')
             return {}
     
-    def _save_checkpoint(self, site_name: str, folder_path: str = None, next_link: str = None) -> None:
-        """Save checkpoint to Azure Blob Storage"""
+    def _save_checkpoint(self, site_name: str, folder_path: str = None, next_link: str = None, delta: Dict[str, Any] = None) -> None:
+        """Save checkpoint to Azure Blob Storage (delta: per-drive deltaLink and folder map)"""
         try:
             checkpoint = {
                 "site_name": site_name,
@@ -360,6 +1020,8 @@ class DocumentProcessor:
                 "last_processed_url": next_link,
                 "timestamp": datetime.datetime.utcnow().isoformat()
             }
+            if delta is not None:
+                checkpoint["delta"] = delta
             
             blob_name = self._get_checkpoint_blob_name(site_name, folder_path)
             blob_client = self.storage_client.get_blob_client(
@@ -382,14 +1044,10 @@ class DocumentProcessor:
     def _get_site_documents(self, site_id: str, folder_path: str = None, site_name: str = None, checkpoint: Dict[str, Any] = None, recursive: bool = False) -> List[Dict[str, Any]]:
         """Get all documents from a SharePoint site, optionally targeting a specific folder with checkpoint support"""
         try:
-            headers = {'Authorization': f'Bearer {self.graph_token}'}
             documents = []
             
             # Get document libraries in the site
-            drives_response = requests.get(
-                f'https://graph.microsoft.com/v1.0/sites/{site_id}/drives',
-                headers=headers
-            )
+            drives_response = self.graph_client.get(f'https://graph.microsoft.com/v1.0/sites/{site_id}/drives')
             drives_response.raise_for_status()
             
             drives_data = drives_response.json()
@@ -423,8 +1081,12 @@ class DocumentProcessor:
 
     def _get_drive_documents(self, drive_id: str, folder_path: str = None, site_name: str = None, checkpoint: Dict[str, Any] = None, recursive: bool = False) -> List[Dict[str, Any]]:
         """Get documents from a specific drive with sequential pagination and checkpoint support"""
+        if self.crawl_mode == 'delta':
+            return self._get_drive_documents_delta(drive_id, folder_path, site_name, checkpoint, recursive)
+        if recursive:
+            return self._get_drive_documents_breadth_first(drive_id, folder_path)
+        
         try:
-            headers = {'Authorization': f'Bearer {self.graph_token}'}
             all_documents = []
             api_calls_made = 0
             max_api_calls = 500  # Increased from 100 to allow deeper scanning
@@ -436,7 +1098,7 @@ class DocumentProcessor:
                 logging.info(f'📁 Targeting specific folder: {folder_path}')
             else:
                 # Start from root if no folder specified
-                start_url = f'https://graph.microsoft.com/v1.0/drives/{drive_id}/root/children?$top=100'
+                start_url = self._build_folder_url(drive_id, None)
                 logging.info(f'📁 Starting from root folder')
             
             # Resume from checkpoint if available
@@ -451,7 +1113,7 @@ class DocumentProcessor:
             while current_url and api_calls_made < max_api_calls:
                 try:
                     logging.info(f'📡 Making Graph API call #{api_calls_made + 1} - Found {len(all_documents)} documents so far')
-                    response = requests.get(current_url, headers=headers)
+                    response = self.graph_client.get(current_url)
                     response.raise_for_status()
                     api_calls_made += 1
                     
@@ -469,16 +1131,7 @@ class DocumentProcessor:
                             
                             # Check if supported file type
                             if file_ext in self.supported_extensions:
-                                all_documents.append({
-                                    'id': item['id'],
-                                    'name': item_name,
-                                    'path': item_path,
-                                    'download_url': item.get('@microsoft.graph.downloadUrl', ''),
-                                    'last_modified': item.get('lastModifiedDateTime', ''),
-                                    'size': item.get('size', 0),
-                                    'folder_path': folder_path or '/',
-                                    'extension': file_ext
-                                })
+                                all_documents.append(self._drive_item_to_document(item, item_path, folder_path or '/'))
                                 logging.info(f'Found document: {item_path}')
                                 
                                 # Check if we've hit our discovery limit (higher than processing limit)
@@ -491,29 +1144,8 @@ class DocumentProcessor:
                                         self._save_checkpoint(site_name, folder_path, next_url)
                                     return all_documents
                         
-                        # Handle folder processing based on recursive flag
-                        elif 'folder' in item and recursive:
-                            # If recursive is True, process subfolders
-                            subfolder_path = self._build_item_path(folder_path or '/', item_name)
-                            logging.info(f'🔄 Processing subfolder recursively: {subfolder_path}')
-                            
-                            try:
-                                # Get documents from subfolder
-                                subfolder_documents = self._get_drive_documents(drive_id, subfolder_path, site_name, None, recursive)
-                                all_documents.extend(subfolder_documents)
-                                
-                                # Check discovery limit after adding subfolder documents
-                                discovery_limit = self.max_documents_per_run * 10
-                                if len(all_documents) >= discovery_limit:
-                                    logging.info(f'🛑 Hit discovery limit ({discovery_limit}) after processing subfolder')
-                                    return all_documents
-                                    
-                            except Exception as e:
-                                logging.warning(f'Error processing subfolder {subfolder_path}: {str(e)}')
-                                continue
-                        
-                        elif 'folder' in item and not recursive:
-                            # If recursive is False, skip subfolders
+                        elif 'folder' in item:
+                            # Recursive crawls go through _get_drive_documents_breadth_first
                             logging.info(f'⏭️ Skipping subfolder (non-recursive): {item_name}')
                     
                     # Get next page URL
@@ -550,13 +1182,268 @@ class DocumentProcessor:
             logging.error(f'Error getting documents from drive {drive_id}: {str(e)}')
             return []
 
+    def _drive_item_to_document(self, item: Dict[str, Any], item_path: str, folder_path: str) -> Dict[str, Any]:
+        """Document record for a Graph driveItem file"""
+        return {
+            'id': item['id'],
+            'name': item['name'],
+            'path': item_path,
+            'download_url': item.get('@microsoft.graph.downloadUrl', ''),
+            'last_modified': item.get('lastModifiedDateTime', ''),
+            'size': item.get('size', 0),
+            'etag': item.get('eTag', ''),
+            'ctag': item.get('cTag', ''),
+            'folder_path': folder_path,
+            'extension': os.path.splitext(item['name'])[1].lower()
+        }
+
+    def _get_drive_documents_breadth_first(self, drive_id: str, folder_path: str = None) -> List[Dict[str, Any]]:
+        """
+        Get documents from a folder tree, listing up to crawl_concurrency folders at a time
+        
+        Folders are listed in the order they are discovered, so the tree is walked level by
+        level. The discovery limit counts only documents that still need processing, so
+        unchanged files near the top of the tree never crowd out new ones deeper down.
+        """
+        try:
+            root_folder = folder_path or '/'
+            discovery_limit = self.max_documents_per_run * 10
+            max_api_calls = 500
+            api_calls = {"made": 0}
+            api_calls_lock = threading.Lock()
+            all_documents = []
+            pending_count = 0
+            folders_listed = 0
+            
+            def list_folder(folder: str) -> List[Dict[str, Any]]:
+                """Every child of one folder, following nextLinks"""
+                items = []
+                url = self._build_folder_url(drive_id, folder)
+                while url:
+                    with api_calls_lock:
+                        if api_calls["made"] >= max_api_calls:
+                            break
+                        api_calls["made"] += 1
+                    response = self.graph_client.get(url)
+                    response.raise_for_status()
+                    page = response.json()
+                    items.extend(page.get('value', []))
+                    url = page.get('@odata.nextLink')
+                return items
+            
+            with ThreadPoolExecutor(max_workers=self.crawl_concurrency, thread_name_prefix="graph-crawl") as executor:
+                listings = {executor.submit(list_folder, root_folder): root_folder}
+                while listings:
+                    done, _ = wait(listings, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        folder = listings.pop(future)
+                        try:
+                            items = future.result()
+                        except Exception as e:
+                            logging.warning(f'Error listing folder {folder}: {str(e)}')
+                            continue
+                        folders_listed += 1
+                        
+                        for item in items:
+                            item_path = self._build_item_path(folder, item['name'])
+                            if 'file' in item:
+                                if os.path.splitext(item['name'])[1].lower() not in self.supported_extensions:
+                                    continue
+                                doc = self._drive_item_to_document(item, item_path, folder)
+                                all_documents.append(doc)
+                                if self._document_change_status(doc) != "unchanged":
+                                    pending_count += 1
+                            elif 'folder' in item:
+                                if pending_count >= discovery_limit or api_calls["made"] >= max_api_calls:
+                                    continue
+                                listings[executor.submit(list_folder, item_path)] = item_path
+            
+            all_documents.sort(key=lambda doc: doc['path'])
+            
+            logging.info(f'📊 Breadth-first scan completed:')
+            logging.info(f'   Folders listed: {folders_listed} ({self.crawl_concurrency} at a time)')
+            logging.info(f'   Documents found: {len(all_documents)} ({pending_count} new or changed)')
+            logging.info(f'   API calls made: {api_calls["made"]}')
+            if pending_count >= discovery_limit:
+                logging.info(f'🛑 Hit discovery limit ({discovery_limit}), remaining folders are picked up once these are processed')
+            if api_calls["made"] >= max_api_calls:
+                logging.warning(f'⚠️ Stopped due to API call limit ({max_api_calls}).')
+            
+            return all_documents
+            
+        except Exception as e:
+            logging.error(f'Error crawling drive {drive_id}: {str(e)}')
+            return []
+
+    def _get_drive_documents_delta(self, drive_id: str, folder_path: str = None, site_name: str = None, checkpoint: Dict[str, Any] = None, recursive: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get new and changed documents from a drive with a Graph delta query
+        
+        The first run enumerates the whole drive; later runs resume from the deltaLink saved in
+        the checkpoint blob and only see items changed or deleted since. SharePoint supports
+        delta on the drive root only, and delta items carry no parentReference.path, so folder
+        paths are rebuilt from a folder id map kept next to the deltaLink.
+        
+        The new cursor is held in _pending_delta_state and only saved by process_site_documents
+        once every discovered document has been handled, so nothing is lost to the run limit.
+        """
+        try:
+            state = ((checkpoint or {}).get('delta') or {}).get(drive_id) or {}
+            folders = dict(state.get('folders', {}))
+            current_url = state.get('link')
+            if current_url:
+                logging.info(f'📍 Resuming delta query from saved deltaLink')
+            else:
+                current_url = f'https://graph.microsoft.com/v1.0/drives/{drive_id}/root/delta'
+                logging.info(f'🔭 No deltaLink saved, enumerating the whole drive')
+            
+            # Last state seen per item id - Graph may return an item on several pages and the
+            # client keeps the latest: "file" (to process) or "deleted"
+            latest_states = {}
+            api_calls_made = 0
+            max_api_calls = 500
+            discovery_limit = self.max_documents_per_run * 10
+            cursor = None
+            
+            while current_url and api_calls_made < max_api_calls:
+                logging.info(f'📡 Making Graph delta call #{api_calls_made + 1} - {len(latest_states)} changed items so far')
+                response = self.graph_client.get(current_url)
+                response.raise_for_status()
+                api_calls_made += 1
+                page = response.json()
+                
+                for item in page.get('value', []):
+                    # Re-inserted so the dict keeps the order of each item's last occurrence
+                    latest_states.pop(item['id'], None)
+                    if 'deleted' in item:
+                        folders.pop(item['id'], None)
+                        latest_states[item['id']] = ("deleted", item)
+                    elif 'root' in item:
+                        folders[item['id']] = {"name": "", "parent": None}
+                    elif 'folder' in item:
+                        folders[item['id']] = {"name": item.get('name', ''), "parent": (item.get('parentReference') or {}).get('id')}
+                    elif 'file' in item and os.path.splitext(item.get('name', ''))[1].lower() in self.supported_extensions:
+                        latest_states[item['id']] = ("file", item)
+                
+                if '@odata.deltaLink' in page:
+                    cursor = page['@odata.deltaLink']
+                    current_url = None
+                else:
+                    current_url = page.get('@odata.nextLink')
+                    cursor = current_url
+                    # Stop on a page boundary so the nextLink resumes exactly after what we saw
+                    if len(latest_states) >= discovery_limit:
+                        logging.info(f'🛑 Hit discovery limit ({discovery_limit}), continuing from nextLink next run')
+                        break
+            
+            # A file changed on one page and deleted on a later one is only deleted
+            file_items = [item for state, item in latest_states.values() if state == "file"]
+            deleted_ids = [item_id for item_id, (state, _) in latest_states.items() if state == "deleted"]
+            
+            # Place files in the folder tree, keeping those under the requested folder
+            scope = (folder_path or '').strip('/')
+            all_documents = []
+            for item in file_items:
+                relative_dir = self._resolve_delta_folder_path(drive_id, (item.get('parentReference') or {}).get('id'), folders)
+                if relative_dir is None:
+                    logging.warning(f'Could not resolve folder of {item.get("name")}, skipping')
+                    continue
+                if scope:
+                    if relative_dir == scope:
+                        doc_folder = folder_path
+                    elif recursive and relative_dir.startswith(scope + '/'):
+                        doc_folder = self._build_item_path(folder_path, relative_dir[len(scope) + 1:])
+                    else:
+                        continue
+                elif relative_dir and not recursive:
+                    continue
+                else:
+                    doc_folder = f'/{relative_dir}' if relative_dir else '/'
+                all_documents.append(self._drive_item_to_document(item, self._build_item_path(doc_folder, item['name']), doc_folder))
+            
+            deleted_count = self._remove_deleted_documents(deleted_ids)
+            self._pending_delta_state[drive_id] = {"link": cursor, "folders": folders, "deleted": deleted_count}
+            
+            logging.info(f'📊 Delta scan completed:')
+            logging.info(f'   Changed files in scope: {len(all_documents)} (of {len(file_items)} in drive)')
+            logging.info(f'   Deleted items removed from the index: {deleted_count}')
+            logging.info(f'   API calls made: {api_calls_made}')
+            if api_calls_made >= max_api_calls:
+                logging.warning(f'⚠️ Stopped due to API call limit. Will resume from nextLink on next run.')
+            
+            return all_documents
+            
+        except Exception as e:
+            logging.error(f'Error running delta query on drive {drive_id}: {str(e)}')
+            return []
+
+    def _resolve_delta_folder_path(self, drive_id: str, folder_id: str, folders: Dict[str, Any]) -> str:
+        """Folder path relative to the drive root ("" for the root), looking up unknown folders in Graph"""
+        parts = []
+        seen = set()
+        current = folder_id
+        while current and current not in seen:
+            seen.add(current)
+            entry = folders.get(current)
+            if entry is None:
+                try:
+                    response = self.graph_client.get(
+                        f'https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{current}?$select=id,name,parentReference,root'
+                    )
+                    response.raise_for_status()
+                    item = response.json()
+                except Exception as e:
+                    logging.warning(f'Failed to look up folder {current}: {str(e)}')
+                    return None
+                parent = None if 'root' in item else (item.get('parentReference') or {}).get('id')
+                entry = folders[current] = {"name": item.get('name', '') if parent else "", "parent": parent}
+            if entry["parent"] is None:
+                return '/'.join(reversed(parts))
+            parts.append(entry["name"])
+            current = entry["parent"]
+        return None
+
+    def _remove_deleted_documents(self, doc_ids: List[str]) -> int:
+        """Delete chunks and ledger entries of processed documents that were deleted in SharePoint"""
+        removed = 0
+        for doc_id in doc_ids:
+            if not self.processed_ledger.contains(doc_id):
+                continue
+            try:
+                self._delete_indexed_chunks(doc_id, self._recorded_chunk_ids(self.processed_ledger.entry(doc_id)))
+                self._delete_stale_chunks(doc_id, [])
+                self.processed_ledger.forget(doc_id)
+                removed += 1
+            except Exception as e:
+                logging.warning(f'Failed to remove deleted document {doc_id}: {str(e)}')
+        return removed
+
+    def _commit_delta_checkpoint(self, site_name: str, folder_path: str, checkpoint: Dict[str, Any], site_results: Dict[str, Any]) -> None:
+        """Advance the saved delta cursors once every discovered new or changed document was handled"""
+        if not self._pending_delta_state:
+            return
+        site_results["documents_deleted"] = sum(state.pop("deleted", 0) for state in self._pending_delta_state.values())
+        pending_count = site_results["documents_new"] + site_results["documents_changed"]
+        # Failed documents are not handled - past the cursor the delta query would not return them
+        # again until the file is edited, so they stay behind it and are retried next run
+        handled_count = sum(site_results[f"documents_{outcome}"] for outcome in
+                            ("processed", "quarantined", "flagged", "skipped", "skipped_size_limit"))
+        if handled_count < pending_count:
+            logging.info(f'📍 Keeping previous delta cursor - {pending_count} documents pending, {handled_count} handled this run')
+            return
+        delta = {**(checkpoint.get('delta') or {}), **self._pending_delta_state}
+        self._save_checkpoint(site_name, folder_path, checkpoint.get('last_processed_url'), delta)
+
     def _build_folder_url(self, drive_id: str, folder_path: str) -> str:
-        """Build Graph API URL for a specific folder path"""
+        """Build Graph API URL listing a folder's children (the drive root when folder_path is empty)"""
+        query = f'$top=999&$select={GRAPH_ITEM_SELECT}'
         # Clean up folder path
-        clean_path = folder_path.strip('/')
+        clean_path = (folder_path or '').strip('/')
+        if not clean_path:
+            return f'https://graph.microsoft.com/v1.0/drives/{drive_id}/root/children?{query}'
         # Properly encode each segment
         encoded_path = '%2F'.join([quote(seg, safe='') for seg in clean_path.split('/')])
-        return f'https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{encoded_path}:/children?$top=100'
+        return f'https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{encoded_path}:/children?{query}'
     
     def _build_item_path(self, folder_path: str, item_name: str) -> str:
         """Build full item path from folder path and item name"""
@@ -568,24 +1455,12 @@ class DocumentProcessor:
     def _prioritize_documents_for_testing(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Smart document prioritization with randomization to avoid processing same documents"""
         
-        # *** NEW: Filter out already processed documents first ***
-        unprocessed_documents = []
-        already_processed_count = 0
-        for doc in documents:
-            if not self._is_document_processed(doc['id']):
-                unprocessed_documents.append(doc)
-            else:
-                already_processed_count += 1
+        # Only new and changed documents are worth a processing slot
+        pending_documents = [doc for doc in documents if self._document_change_status(doc) != "unchanged"]
+        unchanged_count = len(documents) - len(pending_documents)
         
-        logging.info(f'📊 Document status: {len(unprocessed_documents)} new documents, {already_processed_count} already processed (total: {len(documents)})')
-        
-        # If we have enough unprocessed documents, use those
-        if len(unprocessed_documents) >= self.max_documents_per_run:
-            documents_to_prioritize = unprocessed_documents
-        else:
-            # Use all documents if we don't have enough unprocessed ones
-            documents_to_prioritize = documents
-            logging.info(f'⚠️ Using all documents including processed ones (need {self.max_documents_per_run}, found {len(unprocessed_documents)} unprocessed)')
+        logging.info(f'📊 Document status: {len(pending_documents)} new or changed documents, {unchanged_count} unchanged (total: {len(documents)})')
+        documents_to_prioritize = pending_documents
         
         def document_priority(doc):
             extension = doc.get('extension', '').lower()
@@ -624,9 +1499,9 @@ class DocumentProcessor:
             except:
                 pass
             
-            # *** NEW: Boost priority for unprocessed documents ***
-            if not self._is_document_processed(doc['id']):
-                priority -= 5  # Higher priority for unprocessed docs
+            # *** NEW: Boost priority for never-processed documents over edited ones ***
+            if self._document_change_status(doc) == "new":
+                priority -= 5
             
             return priority
         
@@ -641,22 +1516,74 @@ class DocumentProcessor:
         
         return selected_docs
 
-    def _is_document_processed(self, doc_id: str) -> bool:
-        """Check if document has already been processed by looking for first chunk"""
+    def _document_version(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """SharePoint version fields recorded in the processed-document ledger"""
+        return {
+            "etag": doc.get('etag', ''),
+            "ctag": doc.get('ctag', ''),
+            "last_modified": doc.get('last_modified', ''),
+            "size": doc.get('size', 0)
+        }
+
+    def _document_change_status(self, doc: Dict[str, Any]) -> str:
+        """"new", "changed" or "unchanged" against the ledger (in memory after the first call of a run)"""
+        if 'change_status' in doc:
+            return doc['change_status']
         try:
-            blob_client = self.storage_client.get_blob_client(
-                container="jennifur-processed",
-                blob=f"{doc_id}_0.json"
-            )
-            return blob_client.exists()
+            return self.processed_ledger.change_status(doc['id'], self._document_version(doc))
         except Exception:
-            return False
+            return "new"
+
+    def _classify_documents(self, documents: List[Dict[str, Any]], site_results: Dict[str, Any]) -> None:
+        """Tag each discovered document with its change status and count them"""
+        for doc in documents:
+            doc.pop('change_status', None)  # Re-check against the ledger rather than a stale tag
+            doc['change_status'] = self._document_change_status(doc)
+            site_results[f"documents_{doc['change_status']}"] += 1
+        logging.info(f'🔎 Change detection: {site_results["documents_new"]} new, {site_results["documents_changed"]} changed, {site_results["documents_unchanged"]} unchanged')
+
+    def _delete_stale_chunks(self, doc_id: str, keep_blob_names: List[str]) -> int:
+        """Remove a document's chunk blobs (in either storage mode) other than keep_blob_names"""
+        container_client = self.storage_client.get_container_client("jennifur-processed")
+        keep = set(keep_blob_names)
+        stale = [
+            blob.name for blob in container_client.list_blobs(name_starts_with=doc_id)
+            if (blob.name.startswith(f"{doc_id}_") or blob.name == f"{doc_id}.jsonl") and blob.name not in keep
+        ]
+        for blob_name in stale:
+            container_client.delete_blob(blob_name)
+        if stale:
+            logging.info(f'🧹 Removed {len(stale)} stale chunks of {doc_id}')
+        return len(stale)
+
+    def _recorded_chunk_ids(self, entry: Optional[Dict[str, Any]]) -> set:
+        """Chunk ids a ledger entry records as stored in .jsonl blobs (per document or per tracker sheet)"""
+        entry = entry or {}
+        chunk_ids = set(entry.get("chunk_ids") or [])
+        for sheet in (entry.get("sheets") or {}).values():
+            chunk_ids.update(sheet.get("chunk_ids") or [])
+        return chunk_ids
+
+    def _delete_indexed_chunks(self, doc_id: str, chunk_ids) -> int:
+        """Delete chunks from the search index by chunk_id - raises if any deletion fails"""
+        chunk_ids = sorted(chunk_ids)
+        if not chunk_ids:
+            return 0
+        if self.search_client is None:
+            logging.warning(f'No search client configured, {len(chunk_ids)} dropped chunks of {doc_id} stay in the index')
+            return 0
+        for start in range(0, len(chunk_ids), 1000):
+            results = self.search_client.delete_documents(documents=[{"chunk_id": chunk_id} for chunk_id in chunk_ids[start:start + 1000]])
+            failed = [result.key for result in results if not result.succeeded]
+            if failed:
+                raise RuntimeError(f'failed to delete {len(failed)} chunks from the search index: {failed[:5]}')
+        logging.info(f'🧹 Removed {len(chunk_ids)} dropped chunks of {doc_id} from the search index')
+        return len(chunk_ids)
 
     def _download_document(self, download_url: str) -> bytes:
         """Download document content from OneDrive/SharePoint"""
         try:
-            headers = {'Authorization': f'Bearer {self.graph_token}'}
-            response = requests.get(download_url, headers=headers)
+            response = self.graph_client.get(download_url)
             response.raise_for_status()
             return response.content
             
@@ -666,28 +1593,316 @@ class DocumentProcessor:
 
     def _extract_text_with_cost_tracking(self, doc_content: bytes, filename: str) -> tuple[str, float, bool]:
         """Extract text and track estimated costs. Returns (text, cost, success_flag)"""
+        extraction = self._route_extraction(doc_content, filename)
+        return extraction["text"], extraction["cost"], extraction["success"]
+
+    def _route_extraction(self, doc_content: bytes, filename: str) -> Dict[str, Any]:
+        """
+        Extract text with the cheapest parser that does the job
+        
+        Born-digital Office and text files are parsed locally first - free and much faster than a
+        Document Intelligence round trip. Only a local result that is empty or looks unusable is
+        escalated to Document Intelligence; other formats go straight to it.
+        
+        Returns:
+            Dict with text, cost, success, route ("local", "local_escalated" or
+            "document_intelligence"), escalation_reason and per-step timings in seconds
+        """
+        started = time.perf_counter()
+        extraction = {"route": "document_intelligence", "escalation_reason": None, "local_seconds": 0.0}
         
         # Validate document first
         if not self._validate_document_before_processing(doc_content, filename):
-            return self._create_fallback_text_content(filename, "File validation failed"), 0.0, False
+            extraction.update(text=self._create_fallback_text_content(filename, "File validation failed"), cost=0.0, success=False)
+            extraction["extraction_seconds"] = round(time.perf_counter() - started, 3)
+            return extraction
         
         file_ext = os.path.splitext(filename)[1].lower()
-        file_size_mb = len(doc_content) / (1024 * 1024)
+        if file_ext == '.pdf' and self.pdf_text_layer_detection:
+            extraction.update(self._extract_pdf_with_text_layer(doc_content, filename))
+            extraction["extraction_seconds"] = round(time.perf_counter() - started, 3)
+            return extraction
+        
+        local_text = None
+        if self.local_first_extraction and file_ext in self.local_extractors:
+            local_text, reason = self._extract_locally(doc_content, filename, file_ext)
+            extraction["local_seconds"] = round(time.perf_counter() - started, 3)
+            if reason is None:
+                logging.info(f'📄 Extracted {len(local_text):,} characters from {filename} locally in {extraction["local_seconds"]}s')
+                extraction.update(text=local_text, cost=0.0, success=True, route="local")
+                extraction["extraction_seconds"] = extraction["local_seconds"]
+                return extraction
+            logging.info(f'↗️ Local extraction of {filename} not usable ({reason}), escalating to Document Intelligence')
+            extraction.update(route="local_escalated", escalation_reason=reason)
+        
+        text, cost, success = self._extract_with_document_intelligence(doc_content, filename, file_ext)
+        if not success and local_text:
+            # A thin local result still beats the fallback placeholder
+            logging.info(f'Using local extraction of {filename} after Document Intelligence failed')
+            text, cost, success = local_text, 0.0, True
+        extraction.update(text=text, cost=cost, success=success)
+        extraction["extraction_seconds"] = round(time.perf_counter() - started, 3)
+        return extraction
+
+    def _extract_locally(self, doc_content: bytes, filename: str, file_ext: str) -> tuple[str, str]:
+        """
+        Parse an Office/text file without Document Intelligence
+        
+        Returns (text, None) when the text is usable, (text, escalation_reason) when it looks too
+        thin or garbled, and (None, escalation_reason) when the file could not be parsed
+        """
+        parser_name, extractor = self.local_extractors[file_ext]
+        try:
+            body = extractor(doc_content)
+        except Exception as e:
+            return None, f"parse_error: {str(e)}"
         
-        # Estimated cost calculation (based on Azure Document Intelligence pricing)
-        # Approximately $1.00 per 1,000 pages, estimate ~0.5MB per page
-        estimated_pages = max(1, file_size_mb / 0.5)
-        estimated_cost = estimated_pages * 0.001  # $0.001 per page
+        header = f"Document: {filename}\n"
+        header += f"Processed with: {parser_name} (local)\n"
+        header += f"Processing date: {datetime.datetime.utcnow().isoformat()}\n\n"
+        text = header + body
+        
+        content_chars = sum(1 for ch in body if not ch.isspace())
+        if content_chars < self.local_extraction_min_chars:
+            return (text if content_chars else None), f"too_little_text ({content_chars} chars)"
+        
+        unreadable = self._unreadable_ratio(body)
+        if unreadable > 0.05:
+            return None, f"unreadable_text ({unreadable:.0%})"
         
+        # Large files with almost no text are mostly images (scans pasted into Word/PowerPoint)
+        size_kb = len(doc_content) / 1024
+        if size_kb > 512 and content_chars / size_kb < 1:
+            return text, f"low_text_density ({content_chars} chars in {size_kb:,.0f} KB)"
+        
+        return text, None
+
+    def _unreadable_ratio(self, text: str) -> float:
+        """Share of control/replacement characters - how mis-decoded binaries and broken encodings show up"""
+        if not text:
+            return 0.0
+        return sum(1 for ch in text if ch == '\ufffd' or (not ch.isprintable() and not ch.isspace())) / len(text)
+
+    def _extract_pdf_with_text_layer(self, doc_content: bytes, filename: str) -> Dict[str, Any]:
+        """
+        Use a PDF's embedded text layer and send only pages without one to Document Intelligence
+        
+        A page counts as having text when its layer has at least pdf_min_chars_per_page readable
+        characters. Below pdf_min_text_coverage of such pages the file is treated as a scan and
+        analysed whole; otherwise only the remaining pages are analysed, via DI's pages option.
+        If that analysis fails the extraction fails too, rather than returning a partial text.
+        
+        Returns:
+            Dict with text, cost, success, route, escalation_reason, local_seconds and pdf_pages
+        """
+        started = time.perf_counter()
         try:
-            logging.info(f'Analyzing document with Document Intelligence: {filename} (Est. cost: ${estimated_cost:.4f})')
-            
-            # Analyze document
-            poller = self.doc_intelligence_client.begin_analyze_document(
-                "prebuilt-document", 
-                doc_content
+            page_texts = [page.extract_text() or "" for page in PdfReader(BytesIO(doc_content)).pages]
+        except Exception as e:
+            return self._escalate_pdf(doc_content, filename, f"parse_error: {str(e)}", started)
+        if not page_texts:
+            return self._escalate_pdf(doc_content, filename, "no_pages", started)
+        
+        ocr_pages = [
+            page_number for page_number, text in enumerate(page_texts, start=1)
+            if sum(1 for ch in text if not ch.isspace()) < self.pdf_min_chars_per_page or self._unreadable_ratio(text) > 0.05
+        ]
+        coverage = 1 - len(ocr_pages) / len(page_texts)
+        local_seconds = round(time.perf_counter() - started, 3)
+        pdf_pages = {"total": len(page_texts), "text_layer": len(page_texts) - len(ocr_pages), "ocr": len(ocr_pages)}
+        
+        if coverage < self.pdf_min_text_coverage:
+            extraction = self._escalate_pdf(doc_content, filename, f"poor_text_coverage ({coverage:.0%} of {len(page_texts)} pages)", started)
+            ocr_key = "ocr" if extraction["success"] else "ocr_failed"
+            extraction["pdf_pages"] = {**pdf_pages, "text_layer": 0, "ocr": 0, ocr_key: len(page_texts)}
+            return extraction
+        
+        page_contents = dict(enumerate(page_texts, start=1))
+        tables = []
+        cost = 0.0
+        route = "local"
+        processed_with = "PDF text layer (local)"
+        if ocr_pages:
+            page_range = self._format_page_ranges(ocr_pages)
+            route = "local_partial_ocr"
+            try:
+                result, cost = self._analyze_with_document_intelligence(
+                    doc_content, filename, len(ocr_pages) * 0.001, pages=page_range
+                )
+                for page in result.pages:
+                    page_contents[page.page_number] = "\n".join(line.content for line in page.lines)
+                tables = result.tables or []
+                processed_with = f"PDF text layer (local) + Azure Document Intelligence (pages {page_range})"
+                logging.info(f'📄 {filename}: {pdf_pages["text_layer"]} pages from text layer, OCR for pages {page_range}')
+            except Exception as e:
+                # Storing the text layer alone would mark this version processed with those pages
+                # missing - fail so the document is skipped and retried next run
+                logging.warning(f'Document Intelligence failed for pages {page_range} of {filename}: {str(e)}')
+                return {
+                    "text": self._create_fallback_text_content(filename, f"Document Intelligence error on pages {page_range}: {str(e)}"),
+                    "cost": 0.0, "success": False, "route": route, "escalation_reason": None,
+                    "local_seconds": local_seconds, "pdf_pages": {**pdf_pages, "ocr": 0, "ocr_failed": len(ocr_pages)}
+                }
+        else:
+            logging.info(f'📄 {filename}: all {len(page_texts)} pages have a text layer, skipping Document Intelligence')
+        
+        extracted_text = f"Document: {filename}\n"
+        extracted_text += f"Processed with: {processed_with}\n"
+        extracted_text += f"Processing date: {datetime.datetime.utcnow().isoformat()}\n\n"
+        for page_number in sorted(page_contents):
+            extracted_text += f"--- Page {page_number} ---\n"
+            extracted_text += page_contents[page_number] + "\n\n"
+        if tables:
+            extracted_text += "--- Tables ---\n"
+            for table_idx, table in enumerate(tables):
+                extracted_text += f"Table {table_idx + 1}:\n"
+                for cell in table.cells:
+                    extracted_text += f"Row {cell.row_index}, Col {cell.column_index}: {cell.content}\n"
+                extracted_text += "\n"
+        
+        return {
+            "text": extracted_text, "cost": cost, "success": True, "route": route,
+            "escalation_reason": None, "local_seconds": local_seconds, "pdf_pages": pdf_pages
+        }
+
+    def _escalate_pdf(self, doc_content: bytes, filename: str, reason: str, started: float) -> Dict[str, Any]:
+        """Analyse a whole PDF with Document Intelligence after the text layer was not usable"""
+        local_seconds = round(time.perf_counter() - started, 3)
+        logging.info(f'↗️ Text layer of {filename} not usable ({reason}), sending whole document to Document Intelligence')
+        text, cost, success = self._extract_with_document_intelligence(doc_content, filename, '.pdf')
+        return {
+            "text": text, "cost": cost, "success": success, "route": "local_escalated",
+            "escalation_reason": reason, "local_seconds": local_seconds
+        }
+
+    def _format_page_ranges(self, page_numbers: List[int]) -> str:
+        """[1, 2, 3, 7, 9, 10] -> "1-3,7,9-10" (Document Intelligence pages syntax)"""
+        ranges = []
+        for page_number in sorted(page_numbers):
+            if ranges and page_number == ranges[-1][1] + 1:
+                ranges[-1][1] = page_number
+            else:
+                ranges.append([page_number, page_number])
+        return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+    def _extract_txt_locally(self, doc_content: bytes) -> str:
+        for encoding in ('utf-8-sig', 'cp1252'):
+            try:
+                return doc_content.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+        return doc_content.decode('latin-1')
+
+    def _extract_docx_locally(self, doc_content: bytes) -> str:
+        """Paragraphs and tables of word/document.xml in document order"""
+        ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+        with zipfile.ZipFile(BytesIO(doc_content)) as archive:
+            body = ElementTree.fromstring(archive.read('word/document.xml')).find('w:body', ns)
+        
+        def paragraph_text(paragraph) -> str:
+            return ''.join(node.text or '' for node in paragraph.iter(f'{{{ns["w"]}}}t'))
+        
+        lines = []
+        for block in body:
+            if block.tag == f'{{{ns["w"]}}}p':
+                text = paragraph_text(block)
+                if text.strip():
+                    lines.append(text)
+            elif block.tag == f'{{{ns["w"]}}}tbl':
+                for row in block.iter(f'{{{ns["w"]}}}tr'):
+                    cells = [' '.join(paragraph_text(p) for p in cell.iter(f'{{{ns["w"]}}}p')).strip()
+                             for cell in row.iter(f'{{{ns["w"]}}}tc')]
+                    cells = [cell for cell in cells if cell]
+                    if cells:
+                        lines.append(' | '.join(cells) + ' | ')
+                lines.append('')
+        return '\n'.join(lines)
+
+    def _extract_pptx_locally(self, doc_content: bytes) -> str:
+        prs = Presentation(BytesIO(doc_content))
+        pptx_text = ""
+        for i, slide in enumerate(prs.slides):
+            pptx_text += f"--- Slide {i+1} ---\n"
+            for shape in slide.shapes:
+                if hasattr(shape, "text"):
+                    pptx_text += shape.text + "\n"
+            pptx_text += "\n"
+        return pptx_text
+
+    def _extract_xlsx_locally(self, doc_content: bytes) -> str:
+        wb = openpyxl.load_workbook(BytesIO(doc_content), read_only=True, data_only=True)
+        try:
+            return self._format_sheet_rows((sheet.title, sheet.iter_rows(values_only=True)) for sheet in wb.worksheets)
+        finally:
+            wb.close()
+    
+    def _extract_xls_locally(self, doc_content: bytes) -> str:
+        # Legacy binary workbooks - openpyxl cannot read them
+        workbook = CalamineWorkbook.from_filelike(BytesIO(doc_content))
+        try:
+            return self._format_sheet_rows(
+                (name, workbook.get_sheet_by_name(name).to_python(skip_empty_area=True)) for name in workbook.sheet_names
             )
-            result = poller.result()
+        finally:
+            workbook.close()
+    
+    def _format_sheet_rows(self, sheets) -> str:
+        """Pipe-separated rows for each (sheet name, rows of values), skipping empty rows and sheets"""
+        excel_text = ""
+        for sheet_name, rows in sheets:
+            sheet_has_content = False
+            sheet_content = f"--- Sheet: {sheet_name} ---\n"
+            
+            # Only process rows with actual data (skip empty rows)
+            for row in rows:
+                # Filter out None/empty cells and join with pipe separators
+                row_data = [str(cell).strip() for cell in row if cell is not None and str(cell).strip()]
+                if row_data:  # Only add non-empty rows
+                    if not sheet_has_content:
+                        excel_text += sheet_content
+                        sheet_has_content = True
+                    excel_text += ' | '.join(row_data) + ' | \n'
+            
+            if sheet_has_content:
+                excel_text += '\n'
+        return excel_text
+
+    def _analyze_with_document_intelligence(self, doc_content: bytes, filename: str, estimated_cost: float, pages: str = None) -> tuple[Any, float]:
+        """Run prebuilt-document (optionally on a page range) or reuse a cached run. Returns (result, cost)"""
+        # Identical bytes were already analysed (copy in another folder, re-ingest) - reuse the result.
+        # The raw analysis is cached, so filename-dependent formatting still applies.
+        digest = hashlib.sha256(doc_content).hexdigest()
+        variant = f"pages-{pages}" if pages else ""
+        cached = self.extraction_cache.get(doc_content, "prebuilt-document", variant=variant, digest=digest)
+        if cached:
+            try:
+                result = AnalyzeResult.from_dict(cached["payload"])
+                logging.info(f'Extraction cache hit for {filename} ({digest[:12]}) - saved ${cached.get("cost", 0.0):.4f}')
+                return result, 0.0
+            except Exception as cache_e:
+                logging.warning(f'Ignoring unusable extraction cache entry for {filename}: {cache_e}')
+        
+        logging.info(f'Analyzing document with Document Intelligence: {filename}{f" (pages {pages})" if pages else ""} (Est. cost: ${estimated_cost:.4f})')
+        
+        # Analyze document
+        options = {"pages": pages} if pages else {}
+        poller = self.doc_intelligence_client.begin_analyze_document(
+            "prebuilt-document", 
+            doc_content,
+            **options
+        )
+        result = poller.result()
+        self.extraction_cache.put(doc_content, "prebuilt-document", result.to_dict(),
+                                  cost=estimated_cost, filename=filename, variant=variant, digest=digest)
+        return result, estimated_cost
+
+    def _extract_with_document_intelligence(self, doc_content: bytes, filename: str, file_ext: str) -> tuple[str, float, bool]:
+        """Analyze with Document Intelligence (or its cached result). Returns (text, cost, success_flag)"""
+        # Estimated cost calculation (based on Azure Document Intelligence pricing)
+        estimated_cost = self._estimate_extraction_cost(len(doc_content))
+        
+        try:
+            result, estimated_cost = self._analyze_with_document_intelligence(doc_content, filename, estimated_cost)
             
             # Extract content based on file type
             if file_ext in ['.xlsx', '.xls']:
@@ -700,57 +1915,15 @@ class DocumentProcessor:
         except Exception as e:
             error_message = str(e)
             
-            # PowerPoint fallback: try extracting text locally if DI fails
-            if file_ext in ['.pptx', '.ppt']:
-                try:
-                    prs = Presentation(BytesIO(doc_content))
-                    pptx_text = f"PowerPoint Document: {filename}\n"
-                    pptx_text += f"Processed with: python-pptx fallback (DI unavailable)\n"
-                    pptx_text += f"Processing date: {datetime.datetime.utcnow().isoformat()}\n\n"
-                    for i, slide in enumerate(prs.slides):
-                        pptx_text += f"--- Slide {i+1} ---\n"
-                        for shape in slide.shapes:
-                            if hasattr(shape, "text"):
-                                pptx_text += shape.text + "\n"
-                        pptx_text += "\n"
-                    if pptx_text.strip():
-                        logging.info(f'Successfully extracted {len(pptx_text):,} characters from PowerPoint file {filename} using python-pptx fallback')
-                        return pptx_text, 0.0, True
-                except Exception as pptx_e:
-                    logging.warning(f'python-pptx fallback failed for {filename}: {pptx_e}')
-                    # Fall through to existing fallback logic
-            
-            # Excel fallback: try extracting text locally if DI fails and file is .xlsx
-            if file_ext == '.xlsx':
-                try:
-                    wb = openpyxl.load_workbook(BytesIO(doc_content), data_only=True)
-                    excel_text = f"Excel Document: {filename}\n"
-                    excel_text += f"Processed with: openpyxl fallback (DI unavailable)\n"
-                    excel_text += f"Processing date: {datetime.datetime.utcnow().isoformat()}\n\n"
-                    
-                    for sheet in wb.worksheets:
-                        sheet_has_content = False
-                        sheet_content = f"--- Sheet: {sheet.title} ---\n"
-                        
-                        # Only process rows with actual data (skip empty rows)
-                        for row in sheet.iter_rows(values_only=True):
-                            # Filter out None/empty cells and join with pipe separators
-                            row_data = [str(cell).strip() for cell in row if cell is not None and str(cell).strip()]
-                            if row_data:  # Only add non-empty rows
-                                if not sheet_has_content:
-                                    excel_text += sheet_content
-                                    sheet_has_content = True
-                                excel_text += ' | '.join(row_data) + ' | \n'
-                        
-                        if sheet_has_content:
-                            excel_text += '\n'
-                    
-                    if excel_text.strip():
-                        logging.info(f'Successfully extracted {len(excel_text):,} characters from Excel file {filename} using openpyxl fallback (filtered empty cells)')
-                        return excel_text, 0.0, True
-                except Exception as xlsx_e:
-                    logging.warning(f'openpyxl fallback failed for {filename}: {xlsx_e}')
-                    # Fall through to existing fallback logic
+            # Local parsers as a last resort when routing sent the file here first
+            # (local-first extraction disabled)
+            if file_ext in self.local_extractors and not self.local_first_extraction:
+                local_text, reason = self._extract_locally(doc_content, filename, file_ext)
+                if local_text:
+                    logging.info(f'Successfully extracted {len(local_text):,} characters from {filename} using local fallback (DI unavailable)')
+                    return local_text, 0.0, True
+                logging.warning(f'Local fallback failed for {filename}: {reason}')
+                # Fall through to existing fallback logic
                     
             # Handle specific Document Intelligence errors
             if any(phrase in error_message for phrase in [
@@ -936,20 +2109,22 @@ class DocumentProcessor:
         logging.info(f'🎯 Extracted client metadata: {result}')
         return result
 
-    def _process_magic_meeting_tracker(self, doc_content: bytes, doc_name: str, doc_path: str, doc_id: str) -> List[Dict[str, Any]]:
-        """Special processing for Magic Meeting Tracker Excel file with sheet-based client attribution"""
+    def _process_magic_meeting_tracker(self, doc_content: bytes, doc_name: str, doc_path: str, doc_id: str,
+                                       previous_sheets: Dict[str, Any] = None, sheet_index: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        Special processing for Magic Meeting Tracker Excel file with sheet-based client attribution
+        
+        previous_sheets is the per-sheet index from the last run ({sheet name: {"hash", "blobs"}});
+        sheets whose hash is unchanged are not re-chunked. sheet_index, when given, is filled with
+        the index for this version. Returns the chunks of new and changed sheets.
+        """
+        previous_sheets = previous_sheets or {}
+        if sheet_index is None:
+            sheet_index = {}
         try:
-            # Import the enhanced Excel processor
-            import sys
-            import os
-            sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-            from enhanced_excel_processor import EnhancedExcelProcessor
-            
             logging.info(f'🎯 Processing Magic Meeting Tracker with sheet-based client detection')
             
-            # Initialize the enhanced processor
-            processor = EnhancedExcelProcessor()
-            excel_data = processor.extract_from_excel(doc_content, doc_name)
+            excel_data = self.excel_processor.extract_from_excel(doc_content, doc_name)
             
             if excel_data.get("type") == "excel_error":
                 logging.error(f'Enhanced Excel processing failed: {excel_data.get("error")}')
@@ -995,6 +2170,8 @@ class DocumentProcessor:
                     "document_path": f"{doc_path} (Sheet: {sheet_name})",
                     "filename": f"{doc_name} - {sheet_name}",
                     "processed_timestamp": current_timestamp,
+                    # Search's index-freshness probe orders by this field - a rebuilt sheet must bump it
+                    "metadata_updated_timestamp": current_timestamp,
                     "content_length": len(content),
                     "word_count": len(content.split()),
                     "character_count": len(content),
@@ -1013,18 +2190,51 @@ class DocumentProcessor:
                     "sheet_client_confidence": client_info.get("confidence", 0.0) if client_info else 0.0
                 }
                 
+                # Unchanged since the last run - its chunks are already stored and indexed
+                sheet_hash = self._tracker_sheet_hash(content, sheet_metadata)
+                previous = previous_sheets.get(sheet_name)
+                if previous and previous.get("hash") == sheet_hash:
+                    sheet_index[sheet_name] = previous
+                    continue
+                
                 # Chunk the sheet content (will be mostly single chunk unless very large)
                 sheet_chunks = self._chunk_excel_sheet_content(content, sheet_metadata)
                 all_chunks.extend(sheet_chunks)
+                sheet_index[sheet_name] = {
+                    "hash": sheet_hash,
+                    "blobs": self._chunk_blob_names(sheet_metadata["document_id"], sheet_chunks)
+                }
+                if self.chunk_storage_mode == 'jsonl':
+                    sheet_index[sheet_name]["chunk_ids"] = [chunk["chunk_id"] for chunk in sheet_chunks]
             
             logging.info(f'✅ Successfully processed Magic Meeting Tracker: {len(all_chunks)} chunks from {len(excel_data["sheets"])} sheets')
             return all_chunks
             
         except Exception as e:
             logging.error(f'Error processing Magic Meeting Tracker: {str(e)}')
+            sheet_index.clear()
             # Fallback to standard processing
             return self._fallback_excel_processing(doc_content, doc_name, doc_path, doc_id)
     
+    def _tracker_sheet_hash(self, content: str, sheet_metadata: Dict[str, Any]) -> str:
+        """Hash of everything a sheet's chunks are built from (content, attribution, path, storage mode)"""
+        fingerprint = {key: value for key, value in sheet_metadata.items()
+                       if key not in ("processed_timestamp", "metadata_updated_timestamp")}
+        fingerprint["chunk_storage_mode"] = self.chunk_storage_mode
+        payload = json.dumps(fingerprint, sort_keys=True) + "\n" + content
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _previous_tracker_sheets(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Per-sheet index stored with the last processed version of a changed tracker, if any"""
+        if not self.incremental_tracker_ingest or self._document_change_status(doc) != "changed":
+            return {}
+        try:
+            entry = self.processed_ledger.entry(doc['id']) or {}
+        except Exception as e:
+            logging.warning(f'Could not read previous sheet hashes for {doc.get("name")}: {str(e)}')
+            return {}
+        return entry.get("sheets") or {}
+    
     def _chunk_excel_sheet_content(self, content: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Chunk content from a single Excel sheet"""
         chunk_size = 1000
@@ -1280,40 +2490,60 @@ class DocumentProcessor:
         
         return "general"
 
-    def _store_processed_document_with_chunks(self, doc_id: str, filename: str, content: str, doc_metadata: Dict[str, Any], doc_path: str, chunks: List[Dict[str, Any]]) -> None:
-        """Store individual chunks as separate blobs in jennifur-processed container"""
+    def _group_chunks_by_parent(self, chunks: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        grouped = {}
+        for chunk in chunks:
+            grouped.setdefault(chunk['parent_id'], []).append(chunk)
+        return grouped
+    
+    def _chunk_blob_names(self, doc_id: str, chunks: List[Dict[str, Any]]) -> List[str]:
+        """Blob names a document's chunks are stored under in the current storage mode"""
+        if self.chunk_storage_mode == 'jsonl':
+            return [f"{doc_id}.jsonl"]
+        return [f"{chunk['chunk_id']}.json" for chunk in chunks]
+
+    def _upload_chunks(self, doc_id: str, chunks: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Upload a document's chunks to jennifur-processed. Returns blobs and bytes written"""
+        container_client = self.storage_client.get_container_client("jennifur-processed")
+        
+        if self.chunk_storage_mode == 'jsonl':
+            # One compact JSON object per line - the indexer turns each line into a search document
+            data = "".join(json.dumps(chunk, separators=(',', ':'), ensure_ascii=False) + "\n" for chunk in chunks).encode('utf-8')
+            container_client.upload_blob(
+                name=f"{doc_id}.jsonl",
+                data=data,
+                overwrite=True,
+                content_type='application/x-ndjson'
+            )
+            return {"blobs_written": 1, "bytes_written": len(data)}
+        
+        bytes_written = 0
+        for chunk in chunks:
+            data = json.dumps(chunk, indent=2)
+            container_client.upload_blob(
+                name=f"{chunk['chunk_id']}.json",
+                data=data,
+                overwrite=True,
+                content_type='application/json'
+            )
+            bytes_written += len(data.encode('utf-8'))
+        return {"blobs_written": len(chunks), "bytes_written": bytes_written}
+
+    def _store_processed_document_with_chunks(self, doc_id: str, filename: str, content: str, doc_metadata: Dict[str, Any], doc_path: str, chunks: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Store a document's chunks in jennifur-processed (one blob per chunk, or one JSONL blob)"""
         try:
-            # Store each chunk as a separate blob
-            for chunk in chunks:
-                chunk_id = chunk["chunk_id"]
-                blob_name = f"{chunk_id}.json"
-                
-                blob_client = self.storage_client.get_blob_client(
-                    container="jennifur-processed",
-                    blob=blob_name
-                )
-                
-                # Upload the chunk data
-                blob_client.upload_blob(
-                    json.dumps(chunk, indent=2),
-                    overwrite=True,
-                    content_type='application/json'
-                )
-            
-            logging.info(f'Document {filename} stored in jennifur-processed container with {len(chunks)} individual chunk files')
+            written = self._upload_chunks(doc_id, chunks)
+            logging.info(f'Document {filename} stored in jennifur-processed container: {len(chunks)} chunks in {written["blobs_written"]} blobs ({written["bytes_written"]:,} bytes)')
+            return written
             
         except Exception as e:
             logging.error(f'Error storing processed document: {str(e)}')
             raise
     
-    def _store_magic_meeting_tracker_chunks(self, chunks: List[Dict[str, Any]], doc_id: str, filename: str, doc_path: str, doc: Dict[str, Any]):
+    def _store_magic_meeting_tracker_chunks(self, chunks: List[Dict[str, Any]], doc_id: str, filename: str, doc_path: str, doc: Dict[str, Any]) -> Dict[str, int]:
         """Store Magic Meeting Tracker chunks with proper client attribution"""
         try:
-            container_client = self.storage_client.get_container_client("jennifur-processed")
-            
             for i, chunk in enumerate(chunks):
-                chunk_filename = f"{chunk['chunk_id']}.json"
-                
                 # Add common document metadata
                 chunk.update({
                     "original_filename": filename,
@@ -1325,181 +2555,304 @@ class DocumentProcessor:
                     "processing_method": "magic_meeting_tracker_specialized"
                 })
                 
-                # Upload chunk
-                container_client.upload_blob(
-                    name=chunk_filename,
-                    data=json.dumps(chunk, indent=2),
-                    overwrite=True,
-                    content_type='application/json'
-                )
-                
-                logging.info(f'📄 Stored chunk {i+1}: {chunk_filename} (client: {chunk.get("client_name", "Unknown")}, sheet: {chunk.get("sheet_name", "Unknown")})')
+                logging.info(f'📄 Prepared chunk {i+1}: {chunk["chunk_id"]} (client: {chunk.get("client_name", "Unknown")}, sheet: {chunk.get("sheet_name", "Unknown")})')
             
-            logging.info(f'✅ Magic Meeting Tracker stored: {len(chunks)} chunks from {filename}')
+            # One upload per sheet (parent_id) so a sheet's chunks are replaced without touching the others
+            written = {"blobs_written": 0, "bytes_written": 0}
+            for parent_id, sheet_chunks in self._group_chunks_by_parent(chunks).items():
+                for key, value in self._upload_chunks(parent_id, sheet_chunks).items():
+                    written[key] += value
+            logging.info(f'✅ Magic Meeting Tracker stored: {len(chunks)} chunks from {filename} in {written["blobs_written"]} blobs')
+            return written
             
         except Exception as e:
             logging.error(f'Error storing Magic Meeting Tracker chunks: {str(e)}')
             raise
 
-    def _process_single_document_with_cost_control(self, doc: Dict[str, Any]) -> Dict[str, Any]:
-        """Process a single document with enhanced cost control and size limits"""
+    def _new_work_item(self, doc: Dict[str, Any], reserved_cost: float = 0.0) -> Dict[str, Any]:
+        """State carried by one document through the processing stages"""
+        return {
+            "doc": doc,
+            "doc_id": doc['id'],
+            "doc_name": doc['name'],
+            "doc_path": doc.get('path', doc['name']),
+            "doc_extension": doc.get('extension', 'unknown'),
+            "doc_size": doc.get('size', 0),
+            "processing_start": datetime.datetime.utcnow(),
+            "estimated_cost": 0.0,
+            "reserved_cost": reserved_cost,
+            "doc_content": None,
+            "download_size": 0,
+            "chunks": [],
+            "extracted_text": "",
+            "storage_mode": "standard",
+            "tracker_sheets": {},
+            "tracker_changes": {},
+            "extraction_route": None,
+            "extraction_seconds": 0.0
+        }
+
+    def _elapsed_seconds(self, work: Dict[str, Any]) -> float:
+        return round((datetime.datetime.utcnow() - work["processing_start"]).total_seconds(), 2)
+
+    def _download_stage(self, work: Dict[str, Any]) -> Dict[str, Any]:
+        """Skip checks and download. Returns a final result, or None to continue to extraction"""
+        doc_path = work["doc_path"]
+        doc_extension = work["doc_extension"]
+        doc_size = work["doc_size"]
+        
+        # Check if already processed at this version
+        if self._document_change_status(work["doc"]) == "unchanged":
+            logging.info(f'📄✅ Document unchanged since last processed, skipping: {doc_path}')
+            return {
+                "action": "skipped", 
+                "reason": "already_processed", 
+                "path": doc_path,
+                "extension": doc_extension,
+                "cost_estimate": 0.0
+            }
         
-        doc_id = doc['id']
-        doc_name = doc['name']
-        doc_path = doc.get('path', doc_name)
-        doc_extension = doc.get('extension', 'unknown')
-        doc_size = doc.get('size', 0)
+        # Size-based processing limits
+        max_size_bytes = self.max_file_size_mb * 1024 * 1024
+        if doc_size > max_size_bytes:
+            logging.info(f'📏 File {doc_path} exceeds size limit ({doc_size:,} bytes), skipping')
+            return {
+                "action": "skipped_size_limit",
+                "reason": f"file_too_large_{doc_size}_bytes",
+                "path": doc_path,
+                "extension": doc_extension,
+                "cost_estimate": 0.0
+            }
         
-        processing_start = datetime.datetime.utcnow()
-        estimated_cost = 0.0
+        logging.info(f'Processing document: {doc_path} ({doc_extension}, {doc_size:,} bytes)')
         
+        # Download document with error handling
         try:
-            # Check if already processed
-            if self._is_document_processed(doc_id):
-                logging.info(f'📄✅ Document already processed, skipping: {doc_path} (found existing chunk file {doc_id}_0.json)')
-                return {
-                    "action": "skipped", 
-                    "reason": "already_processed", 
-                    "path": doc_path,
-                    "extension": doc_extension,
-                    "cost_estimate": 0.0
-                }
-            
-            # Size-based processing limits
-            max_size_bytes = self.max_file_size_mb * 1024 * 1024
-            if doc_size > max_size_bytes:
-                logging.info(f'📏 File {doc_path} exceeds size limit ({doc_size:,} bytes), skipping')
-                return {
-                    "action": "skipped_size_limit",
-                    "reason": f"file_too_large_{doc_size}_bytes",
-                    "path": doc_path,
-                    "extension": doc_extension,
-                    "cost_estimate": 0.0
-                }
-            
-            logging.info(f'Processing document: {doc_path} ({doc_extension}, {doc_size:,} bytes)')
+            work["doc_content"] = self._download_document(work["doc"]['download_url'])
+            work["download_size"] = len(work["doc_content"])
+            logging.info(f'Downloaded {work["download_size"]:,} bytes for {work["doc_name"]}')
             
-            # Download document with error handling
+        except Exception as e:
+            logging.error(f'Failed to download {doc_path}: {str(e)}')
+            return {
+                "action": "error", 
+                "reason": f"download_failed: {str(e)}", 
+                "path": doc_path,
+                "extension": doc_extension,
+                "cost_estimate": 0.0
+            }
+        
+        return None
+
+    def _extract_stage(self, work: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract and chunk text. Returns a final result, or None to continue to storage"""
+        doc = work["doc"]
+        doc_id = work["doc_id"]
+        doc_name = work["doc_name"]
+        doc_path = work["doc_path"]
+        doc_extension = work["doc_extension"]
+        doc_content = work["doc_content"]
+        download_size = work["download_size"]
+        
+        # Special handling for Magic Meeting Tracker Excel file
+        if doc_name.lower().startswith('magic meeting tracker') and doc_extension in ['.xlsx', '.xls']:
+            logging.info(f'🎯 Detected Magic Meeting Tracker, using specialized processing')
             try:
-                doc_content = self._download_document(doc['download_url'])
-                download_size = len(doc_content)
-                logging.info(f'Downloaded {download_size:,} bytes for {doc_name}')
-                
+                previous_sheets = self._previous_tracker_sheets(doc)
+                sheet_index = {}
+                chunks = self._process_magic_meeting_tracker(doc_content, doc_name, doc_path, doc_id, previous_sheets, sheet_index)
+                # No chunks but a sheet index: every sheet is unchanged, only removed sheets need work
+                if chunks or sheet_index:
+                    work["chunks"] = chunks
+                    work["storage_mode"] = "magic_tracker"
+                    work["tracker_sheets"] = sheet_index
+                    unchanged = sum(1 for name, sheet in sheet_index.items() if sheet is previous_sheets.get(name))
+                    work["tracker_changes"] = {
+                        "sheets_rebuilt": len(sheet_index) - unchanged,
+                        "sheets_unchanged": unchanged,
+                        "sheets_removed": len(set(previous_sheets) - set(sheet_index))
+                    }
+                    if previous_sheets:
+                        logging.info(f'🎯 Incremental tracker ingest: {work["tracker_changes"]}')
+                    work["doc_content"] = None  # Release the download before queueing for upload
+                    return None
+                else:
+                    logging.warning(f'⚠️ Magic Meeting Tracker processing returned no chunks, falling back to standard processing')
             except Exception as e:
-                logging.error(f'Failed to download {doc_path}: {str(e)}')
-                return {
-                    "action": "error", 
-                    "reason": f"download_failed: {str(e)}", 
-                    "path": doc_path,
-                    "extension": doc_extension,
-                    "cost_estimate": 0.0
-                }
+                logging.error(f'Magic Meeting Tracker processing failed: {str(e)}, falling back to standard processing')
+        
+        # Extract text with cost estimation
+        try:
+            extraction = self._route_extraction(doc_content, doc_name)
+            extracted_text, extraction_success = extraction["text"], extraction["success"]
+            work["estimated_cost"] += extraction["cost"]
+            work["extraction_route"] = extraction["route"]
+            work["extraction_seconds"] = extraction["extraction_seconds"]
+            if extraction["escalation_reason"]:
+                work["escalation_reason"] = extraction["escalation_reason"]
+            if extraction.get("pdf_pages"):
+                work["pdf_pages"] = extraction["pdf_pages"]
+            
+            # Add folder path context and client metadata to extracted text
+            folder_context = f"Document Location: {doc_path}\n"
+            folder_context += f"Folder: {doc.get('folder_path', '/')}\n"
+            folder_context += f"File Extension: {doc_extension}\n"
+            folder_context += f"File Size: {download_size:,} bytes\n"
+            
+            # Extract client metadata from folder path
+            client_metadata = self._extract_client_metadata_from_path(doc_path)
+            if client_metadata:
+                folder_context += f"Client: {client_metadata.get('client_name', 'Unknown')}\n"
+                folder_context += f"PM: {client_metadata.get('pm_name', 'Unknown')} (PM-{client_metadata.get('pm_code', 'N/A')})\n"
+                logging.info(f'📋 Using client metadata: {client_metadata}')
+            else:
+                logging.warning(f'⚠️ No client metadata found for document: {doc_path}')
             
-            # Special handling for Magic Meeting Tracker Excel file
-            if doc_name.lower().startswith('magic meeting tracker') and doc_extension in ['.xlsx', '.xls']:
-                logging.info(f'🎯 Detected Magic Meeting Tracker, using specialized processing')
-                try:
-                    chunks = self._process_magic_meeting_tracker(doc_content, doc_name, doc_path, doc_id)
-                    if chunks:
-                        # Store chunks directly
-                        self._store_magic_meeting_tracker_chunks(chunks, doc_id, doc_name, doc_path, doc)
-                        
-                        result_base = {
-                            "path": doc_path,
-                            "extension": doc_extension,
-                            "processing_duration_seconds": round((datetime.datetime.utcnow() - processing_start).total_seconds(), 2),
-                            "file_size_bytes": download_size,
-                            "cost_estimate": round(estimated_cost, 4),
-                            "chunk_count": len(chunks),
-                            "sheets_processed": len(set(chunk.get('sheet_name', '') for chunk in chunks))
-                        }
-                        logging.info(f'✅ Magic Meeting Tracker processed: {len(chunks)} chunks from {result_base["sheets_processed"]} sheets')
-                        return {**result_base, "action": "processed"}
-                    else:
-                        logging.warning(f'⚠️ Magic Meeting Tracker processing returned no chunks, falling back to standard processing')
-                except Exception as e:
-                    logging.error(f'Magic Meeting Tracker processing failed: {str(e)}, falling back to standard processing')
+            folder_context += "\n"
+            extracted_text = folder_context + extracted_text
             
-            # Extract text with cost estimation
-            try:
-                extracted_text, text_extraction_cost, extraction_success = self._extract_text_with_cost_tracking(doc_content, doc_name)
-                estimated_cost += text_extraction_cost
-                
-                # Add folder path context and client metadata to extracted text
-                folder_context = f"Document Location: {doc_path}\n"
-                folder_context += f"Folder: {doc.get('folder_path', '/')}\n"
-                folder_context += f"File Extension: {doc_extension}\n"
-                folder_context += f"File Size: {download_size:,} bytes\n"
-                
-                # Extract client metadata from folder path
-                client_metadata = self._extract_client_metadata_from_path(doc_path)
-                if client_metadata:
-                    folder_context += f"Client: {client_metadata.get('client_name', 'Unknown')}\n"
-                    folder_context += f"PM: {client_metadata.get('pm_name', 'Unknown')} (PM-{client_metadata.get('pm_code', 'N/A')})\n"
-                    logging.info(f'📋 Using client metadata: {client_metadata}')
-                else:
-                    logging.warning(f'⚠️ No client metadata found for document: {doc_path}')
-                
-                folder_context += "\n"
-                extracted_text = folder_context + extracted_text
+        except Exception as e:
+            logging.error(f'Text extraction completely failed for {doc_path}: {str(e)}')
+            extracted_text = self._create_fallback_text_content(doc_name, f"Complete extraction failure: {str(e)}")
+            extraction_success = False
+        
+        # Handle failed extractions - skip instead of processing
+        if not extraction_success:
+            logging.info(f'⏭️ Skipping document {doc_path} - Document Intelligence extraction failed')
+            result_base = {
+                "path": doc_path,
+                "extension": doc_extension,
+                "processing_duration_seconds": self._elapsed_seconds(work),
+                "file_size_bytes": download_size,
+                "cost_estimate": round(work["estimated_cost"], 4),
+                "extraction_route": work["extraction_route"],
+                "extraction_seconds": work["extraction_seconds"],
+                **({"pdf_pages": work["pdf_pages"]} if work.get("pdf_pages") else {})
+            }
+            return {**result_base, "action": "skipped_extraction_failed", "reason": "document_intelligence_failed"}
+        
+        # Chunk the document text
+        work["chunks"] = self._chunk_text(extracted_text, doc_id, doc_name, doc_path, client_metadata)
+        work["extracted_text"] = extracted_text
+        work["doc_content"] = None  # Release the download before queueing for upload
+        return None
+
+    def _store_stage(self, work: Dict[str, Any]) -> Dict[str, Any]:
+        """Upload the document's chunks and return its final result"""
+        doc = work["doc"]
+        doc_id = work["doc_id"]
+        doc_name = work["doc_name"]
+        doc_path = work["doc_path"]
+        doc_extension = work["doc_extension"]
+        chunks = work["chunks"]
+        estimated_cost = work["estimated_cost"]
+        
+        # Store the processed document with chunks
+        try:
+            if work["storage_mode"] == "magic_tracker":
+                written = self._store_magic_meeting_tracker_chunks(chunks, doc_id, doc_name, doc_path, doc)
+                # Blobs of unchanged sheets are kept; those of removed sheets are stale
+                work["keep_blob_names"] = [name for sheet in work["tracker_sheets"].values() for name in sheet["blobs"]] + [
+                    name for parent_id, sheet_chunks in self._group_chunks_by_parent(chunks).items()
+                    for name in self._chunk_blob_names(parent_id, sheet_chunks)
+                ]
+                self._finalize_stored_document(work)
                 
-            except Exception as e:
-                logging.error(f'Text extraction completely failed for {doc_path}: {str(e)}')
-                extracted_text = self._create_fallback_text_content(doc_name, f"Complete extraction failure: {str(e)}")
-                extraction_success = False
-            
-            # Handle failed extractions - skip instead of processing
-            if not extraction_success:
-                logging.info(f'⏭️ Skipping document {doc_path} - Document Intelligence extraction failed')
                 result_base = {
                     "path": doc_path,
                     "extension": doc_extension,
-                    "processing_duration_seconds": round((datetime.datetime.utcnow() - processing_start).total_seconds(), 2),
-                    "file_size_bytes": download_size if 'download_size' in locals() else 0,
-                    "cost_estimate": round(estimated_cost, 4)
+                    "processing_duration_seconds": self._elapsed_seconds(work),
+                    "file_size_bytes": work["download_size"],
+                    "cost_estimate": round(estimated_cost, 4),
+                    **written,
+                    "chunk_count": len(chunks),
+                    "sheets_processed": len(set(chunk.get('sheet_name', '') for chunk in chunks)),
+                    **work["tracker_changes"]
                 }
-                return {**result_base, "action": "skipped_extraction_failed", "reason": "document_intelligence_failed"}
+                logging.info(f'✅ Magic Meeting Tracker processed: {len(chunks)} chunks from {result_base["sheets_processed"]} sheets')
+                return {**result_base, "action": "processed"}
             
-            # Chunk the document text
-            chunks = self._chunk_text(extracted_text, doc_id, doc_name, doc_path, client_metadata)
+            extracted_text = work["extracted_text"]
+            written = self._store_processed_document_with_chunks(doc_id, doc_name, extracted_text, doc, doc_path, chunks)
+            self._finalize_stored_document(work)
             
-            # Store the processed document with chunks
+            logging.info(f'✅ Document {doc_path} processed successfully with {len(chunks)} chunks (${estimated_cost:.4f})')
+            return {
+                "action": "processed",
+                "reason": "successfully_processed_and_chunked",
+                "path": doc_path,
+                "extension": doc_extension,
+                "processing_duration_seconds": self._elapsed_seconds(work),
+                "file_size_bytes": work["download_size"],
+                "cost_estimate": round(estimated_cost, 4),
+                "chunks_created": len(chunks),
+                "content_length": len(extracted_text),
+                "extraction_route": work["extraction_route"],
+                "extraction_seconds": work["extraction_seconds"],
+                **({"escalation_reason": work["escalation_reason"]} if work.get("escalation_reason") else {}),
+                **({"pdf_pages": work["pdf_pages"]} if work.get("pdf_pages") else {}),
+                **written
+            }
+        except Exception as e:
+            logging.error(f'Failed to store processed document {doc_path}: {str(e)}')
+            return {
+                "action": "error",
+                "reason": f"storage_failed: {str(e)}",
+                "path": doc_path,
+                "extension": doc_extension,
+                "cost_estimate": round(estimated_cost, 4)
+            }
+
+    def _finalize_stored_document(self, work: Dict[str, Any]):
+        """
+        Drop chunks left over from an earlier version and record the new version in the ledger
+        
+        Chunk ids stored in .jsonl blobs are recorded with the version; ids the previous version
+        recorded that this one no longer has are deleted from the search index. If that fails the
+        version is not recorded, so the document is processed again next run.
+        """
+        doc = work["doc"]
+        jsonl_chunk_ids = []
+        if self.chunk_storage_mode == 'jsonl' and not work.get("tracker_sheets"):
+            jsonl_chunk_ids = [chunk["chunk_id"] for chunk in work["chunks"]]
+        if doc.get('change_status') == "changed":
+            keep_blob_names = work.get("keep_blob_names")
+            if keep_blob_names is None:
+                keep_blob_names = self._chunk_blob_names(work["doc_id"], work["chunks"])
+            current_chunk_ids = set(jsonl_chunk_ids) | self._recorded_chunk_ids({"sheets": work.get("tracker_sheets")})
+            current_chunk_ids.update(name[:-len(".json")] for name in keep_blob_names if name.endswith(".json"))
+            dropped_chunk_ids = self._recorded_chunk_ids(self.processed_ledger.entry(work["doc_id"])) - current_chunk_ids
+            self._delete_indexed_chunks(work["doc_id"], dropped_chunk_ids)
             try:
-                self._store_processed_document_with_chunks(doc_id, doc_name, extracted_text, doc, doc_path, chunks)
-                processing_duration = (datetime.datetime.utcnow() - processing_start).total_seconds()
-                
-                logging.info(f'✅ Document {doc_path} processed successfully with {len(chunks)} chunks (${estimated_cost:.4f})')
-                return {
-                    "action": "processed",
-                    "reason": "successfully_processed_and_chunked",
-                    "path": doc_path,
-                    "extension": doc_extension,
-                    "processing_duration_seconds": round(processing_duration, 2),
-                    "file_size_bytes": download_size if 'download_size' in locals() else 0,
-                    "cost_estimate": round(estimated_cost, 4),
-                    "chunks_created": len(chunks),
-                    "content_length": len(extracted_text)
-                }
+                self._delete_stale_chunks(work["doc_id"], keep_blob_names)
             except Exception as e:
-                logging.error(f'Failed to store processed document {doc_path}: {str(e)}')
-                return {
-                    "action": "error",
-                    "reason": f"storage_failed: {str(e)}",
-                    "path": doc_path,
-                    "extension": doc_extension,
-                    "cost_estimate": round(estimated_cost, 4)
-                }
+                logging.warning(f'Failed to remove stale chunks of {work["doc_path"]}: {str(e)}')
+        version = self._document_version(doc)
+        if jsonl_chunk_ids:
+            version["chunk_ids"] = jsonl_chunk_ids
+        if work.get("tracker_sheets"):
+            version["sheets"] = work["tracker_sheets"]
+        self.processed_ledger.mark_processed(work["doc_id"], version)
+
+    def _process_single_document_with_cost_control(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Process a single document with enhanced cost control and size limits (all stages, in this thread)"""
+        work = self._new_work_item(doc)
+        
+        try:
+            for stage in (self._download_stage, self._extract_stage, self._store_stage):
+                result = stage(work)
+                if result is not None:
+                    return result
             
         except Exception as e:
-            processing_duration = (datetime.datetime.utcnow() - processing_start).total_seconds()
-            logging.error(f'Unexpected error processing document {doc_path}: {str(e)}')
+            logging.error(f'Unexpected error processing document {work["doc_path"]}: {str(e)}')
             return {
                 "action": "error", 
                 "reason": f"unexpected_error: {str(e)}", 
-                "path": doc_path,
-                "extension": doc_extension,
-                "processing_duration_seconds": round(processing_duration, 2),
-                "cost_estimate": round(estimated_cost, 4)
+                "path": work["doc_path"],
+                "extension": work["doc_extension"],
+                "processing_duration_seconds": self._elapsed_seconds(work),
+                "cost_estimate": round(work["estimated_cost"], 4)
             }
 
     def process_single_file(self, site_name: str, folder_path: str, file_name: str) -> Dict[str, Any]:
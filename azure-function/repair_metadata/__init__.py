@@ -80,7 +80,7 @@ class MetadataRepairProcessor:
             logging.info(f"Found {len(blobs)} total blobs in jennifur-processed container")
             
             # Filter for chunk files (exclude summary files)
-            chunk_blobs = [blob for blob in blobs if blob.name.endswith('.json') and not blob.name.endswith('_summary.json')]
+            chunk_blobs = [blob for blob in blobs if blob.name.endswith(('.json', '.jsonl')) and not blob.name.endswith('_summary.json')]
             
             # Limit to max_documents for processing
             chunk_blobs_to_process = chunk_blobs[:max_documents]
@@ -133,7 +133,7 @@ class MetadataRepairProcessor:
             return repair_results
 
     def _repair_single_chunk(self, blob_name: str, dry_run: bool = True) -> Dict[str, Any]:
-        """Repair metadata for a single chunk file"""
+        """Repair metadata for a single chunk file ({chunk_id}.json, or every line of a {doc_id}.jsonl)"""
         
         try:
             # Download the chunk data
@@ -142,77 +142,90 @@ class MetadataRepairProcessor:
                 blob=blob_name
             )
             
-            chunk_data = json.loads(blob_client.download_blob().readall().decode('utf-8'))
+            content = blob_client.download_blob().readall().decode('utf-8')
+            is_jsonl = blob_name.endswith('.jsonl')
+            chunks = [json.loads(line) for line in content.splitlines() if line.strip()] if is_jsonl else [json.loads(content)]
             
-            # Extract current metadata
-            old_metadata = {
-                "client_name": chunk_data.get("client_name"),
-                "pm_initial": chunk_data.get("pm_initial"), 
-                "pm_name": chunk_data.get("pm_name"),
-                "is_client_specific": chunk_data.get("is_client_specific"),
-                "has_client_folder": chunk_data.get("has_client_folder"),
-                "document_category": chunk_data.get("document_category")
-            }
-            
-            # Extract new metadata from document path
-            doc_path = chunk_data.get("document_path", "")
-            new_client_metadata = self._extract_client_metadata_from_path(doc_path)
-            new_document_category = self._extract_document_category_from_path(doc_path)
-            
-            # Determine if update is needed
-            needs_update = False
-            new_metadata = old_metadata.copy()
-            
-            if new_client_metadata:
-                # Update client-specific metadata
-                new_metadata.update({
-                    "client_name": new_client_metadata['client_name'],
-                    "pm_initial": new_client_metadata['pm_code'],
-                    "pm_name": new_client_metadata['pm_name'],
-                    "is_client_specific": True,
-                    "has_client_folder": True
-                })
-            else:
-                # No client metadata found - set to internal
-                new_metadata.update({
-                    "client_name": "Autobahn Internal",
-                    "pm_initial": "N/A",
-                    "pm_name": "N/A", 
-                    "is_client_specific": False,
-                    "has_client_folder": False
-                })
-            
-            # Update document category if found
-            if new_document_category:
-                new_metadata["document_category"] = new_document_category
-            
-            needs_update = (old_metadata != new_metadata)
+            first_update = None
+            timestamp = datetime.datetime.utcnow().isoformat() + "Z"
+            for chunk_data in chunks:
+                old_metadata, new_metadata = self._repaired_metadata(chunk_data)
+                if old_metadata != new_metadata:
+                    first_update = first_update or (old_metadata, new_metadata)
+                    chunk_data.update(new_metadata)
+                    chunk_data["metadata_updated_timestamp"] = timestamp
+            needs_update = first_update is not None
             
             # Update the chunk data if needed
             if needs_update and not dry_run:
-                # Update the chunk data with new metadata
-                chunk_data.update(new_metadata)
-                chunk_data["metadata_updated_timestamp"] = datetime.datetime.utcnow().isoformat() + "Z"
+                if is_jsonl:
+                    data = "".join(json.dumps(chunk, separators=(',', ':'), ensure_ascii=False) + "\n" for chunk in chunks)
+                else:
+                    data = json.dumps(chunks[0], indent=2)
                 
                 # Upload the updated chunk
                 blob_client.upload_blob(
-                    json.dumps(chunk_data, indent=2),
+                    data,
                     overwrite=True,
-                    content_type='application/json'
+                    content_type='application/x-ndjson' if is_jsonl else 'application/json'
                 )
                 
-                logging.info(f"Updated metadata for {blob_name}: {old_metadata['client_name']} -> {new_metadata['client_name']}")
+                logging.info(f"Updated metadata for {blob_name}: {first_update[0]['client_name']} -> {first_update[1]['client_name']}")
             
             return {
                 "updated": needs_update,
-                "old_metadata": old_metadata,
-                "new_metadata": new_metadata if needs_update else None
+                "old_metadata": first_update[0] if needs_update else None,
+                "new_metadata": first_update[1] if needs_update else None
             }
             
         except Exception as e:
             logging.error(f"Error repairing chunk {blob_name}: {str(e)}")
             raise
 
+    def _repaired_metadata(self, chunk_data: Dict[str, Any]) -> tuple:
+        """Current metadata of a chunk and the metadata its document path implies"""
+        # Extract current metadata
+        old_metadata = {
+            "client_name": chunk_data.get("client_name"),
+            "pm_initial": chunk_data.get("pm_initial"), 
+            "pm_name": chunk_data.get("pm_name"),
+            "is_client_specific": chunk_data.get("is_client_specific"),
+            "has_client_folder": chunk_data.get("has_client_folder"),
+            "document_category": chunk_data.get("document_category")
+        }
+        
+        # Extract new metadata from document path
+        doc_path = chunk_data.get("document_path", "")
+        new_client_metadata = self._extract_client_metadata_from_path(doc_path)
+        new_document_category = self._extract_document_category_from_path(doc_path)
+        
+        new_metadata = old_metadata.copy()
+        
+        if new_client_metadata:
+            # Update client-specific metadata
+            new_metadata.update({
+                "client_name": new_client_metadata['client_name'],
+                "pm_initial": new_client_metadata['pm_code'],
+                "pm_name": new_client_metadata['pm_name'],
+                "is_client_specific": True,
+                "has_client_folder": True
+            })
+        else:
+            # No client metadata found - set to internal
+            new_metadata.update({
+                "client_name": "Autobahn Internal",
+                "pm_initial": "N/A",
+                "pm_name": "N/A", 
+                "is_client_specific": False,
+                "has_client_folder": False
+            })
+        
+        # Update document category if found
+        if new_document_category:
+            new_metadata["document_category"] = new_document_category
+        
+        return old_metadata, new_metadata
+
     def _extract_client_metadata_from_path(self, doc_path: str) -> Dict[str, Any]:
         """Extract client and PM metadata from SharePoint folder path, prioritizing main client folder"""
         
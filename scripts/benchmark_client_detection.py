@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Client Detection Microbenchmark
+Compares the compiled word-bounded ClientDetector against the old per-keyword substring loop
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from typing import List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from utils.client_detector import ClientDetector, CLIENT_KEYWORDS
+
+QUERY_TEMPLATES = [
+    "Who is on the {client} team?",
+    "{client} financials for last quarter",
+    "Show me {client} meeting notes",
+    "What is the contact info for the {client} CEO?",
+    "Summarize revenue trends and key risks",
+    "What training materials does Autobahn have?",
+    "Which PM-C clients had a board meeting this month?",
+    "Peak season staffing plan for {client}",
+    "How do we join the quarterly review with {client}?",
+    "List every speaker at the leadership offsite",
+]
+
+
+def legacy_detect(query: str) -> Optional[str]:
+    """The original detect_client_from_query loop (substring checks, first hit wins)"""
+    query_lower = query.lower()
+    for client_name, keywords in CLIENT_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in query_lower:
+                if client_name.lower() in ['jtl', 'cmr', 'prc', 'i3', 'psh', 'ddo']:
+                    return client_name.upper()
+                return client_name.title()
+    if 'pm-c' in query_lower:
+        return 'Camelot'
+    elif 'pm-s' in query_lower:
+        return None
+    elif 'pm-k' in query_lower:
+        return 'CE Floyd'
+    return None
+
+
+def legacy_detect_all(query: str) -> List[str]:
+    """Substring loop collecting every client - the like-for-like baseline for detect_all"""
+    query_lower = query.lower()
+    return [client_name for client_name, keywords in CLIENT_KEYWORDS.items()
+            if any(keyword in query_lower for keyword in keywords)]
+
+
+def load_queries(path: Optional[str], count: int) -> List[str]:
+    """Queries from a log file (plain lines or JSON Lines), or synthetic ones"""
+    if path:
+        queries = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith('{'):
+                    record = json.loads(line)
+                    text = record.get('query') or record.get('content') or record.get('title') or ''
+                    if not text and record.get('messages'):
+                        text = record['messages'][-1].get('content', '')
+                    if text:
+                        queries.append(text)
+                else:
+                    queries.append(line)
+        return queries
+
+    rng = random.Random(42)
+    aliases = [alias for aliases in CLIENT_KEYWORDS.values() for alias in aliases]
+    return [rng.choice(QUERY_TEMPLATES).format(client=rng.choice(aliases).title()) for _ in range(count)]
+
+
+def time_detector(name: str, detect, queries: List[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for query in queries:
+            detect(query)
+        best = min(best, time.perf_counter() - started)
+    per_query_us = best / len(queries) * 1e6
+    print(f"   {name:<28} {best * 1000:8.2f} ms total   {per_query_us:6.2f} µs/query")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark client detection")
+    parser.add_argument("--queries", help="query log (one query per line, or JSON Lines)")
+    parser.add_argument("--count", type=int, default=5000, help="synthetic query count when no log is given")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries, args.count)
+    print(f"⏱️  Client detection over {len(queries):,} queries (best of {args.repeat})")
+    print("=" * 70)
+
+    started = time.perf_counter()
+    detector = ClientDetector()
+    print(f"   compile: {(time.perf_counter() - started) * 1000:.2f} ms (once per process)")
+
+    legacy = time_detector("legacy first match", legacy_detect, queries, args.repeat)
+    compiled = time_detector("ClientDetector.detect", detector.detect, queries, args.repeat)
+    legacy_all = time_detector("legacy all matches", legacy_detect_all, queries, args.repeat)
+    compiled_all = time_detector("ClientDetector.detect_all", detector.detect_all, queries, args.repeat)
+    print(f"\n📈 Speed-up: detect {legacy / compiled:.1f}x, detect_all {legacy_all / compiled_all:.1f}x")
+
+    disagreements = [(q, legacy_detect(q), detector.detect(q)) for q in queries if legacy_detect(q) != detector.detect(q)]
+    print(f"\n🔍 {len(disagreements)} queries where the result changed (mostly substring false positives):")
+    for query, old, new in sorted(set(disagreements))[:10]:
+        print(f"   '{query}': {old} → {new}")
+
+
+if __name__ == "__main__":
+    main()
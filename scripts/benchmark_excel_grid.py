@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Excel Grid Loading Benchmark
+Times EnhancedExcelProcessor._read_cell_grid (single iter_rows pass) against the previous
+cell-by-cell reader on generated workbooks, opened read-only like extract_from_excel does,
+and table detection on the loaded grid (NumPy occupancy mask vs cell-by-cell scan)
+
+    python scripts/benchmark_excel_grid.py                      # 10,000 x 50
+    python scripts/benchmark_excel_grid.py --rows 20,50,10000 --cols 50 --legacy-max-rows 50
+
+The cell-by-cell reader is quadratic in read-only mode, so it is only timed up to
+--legacy-max-rows; both readers are checked to return the same grid wherever both run.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+from io import BytesIO
+
+import openpyxl
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+from src.utils.enhanced_excel_processor import EnhancedExcelProcessor
+
+
+def generate_workbook(rows: int, cols: int, seed: int = 42) -> bytes:
+    """Finance-style sheet: header row, text/number/date columns, some blank cells"""
+    rng = random.Random(seed)
+    # Not write_only: those files carry no <dimension> tag, which Excel always writes
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Data"
+    sheet.append([f"Column {col + 1}" for col in range(cols)])
+    start = datetime.date(2024, 1, 1)
+    for row in range(rows - 1):
+        values = []
+        for col in range(cols):
+            kind = col % 5
+            if rng.random() < 0.1:
+                values.append(None)
+            elif kind == 0:
+                values.append(f"Client {rng.randint(1, 500)}")
+            elif kind == 1:
+                values.append(rng.randint(0, 1_000_000))
+            elif kind == 2:
+                values.append(round(rng.uniform(-1e5, 1e5), 2))
+            elif kind == 3:
+                values.append(start + datetime.timedelta(days=rng.randint(0, 700)))
+            else:
+                values.append(f"  note {row}-{col}  ")
+        sheet.append(values)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def read_cell_grid_by_cell(processor: EnhancedExcelProcessor, sheet, min_row: int, max_row: int, min_col: int, max_col: int):
+    """The previous implementation: one sheet.cell() lookup per coordinate"""
+    return [
+        [processor._format_cell_value(sheet.cell(row=row_idx, column=col_idx).value) for col_idx in range(min_col, max_col + 1)]
+        for row_idx in range(min_row, max_row + 1)
+    ]
+
+
+def time_reader(content: bytes, reader) -> tuple:
+    workbook = openpyxl.load_workbook(BytesIO(content), read_only=True, data_only=True)
+    try:
+        sheet = workbook[workbook.sheetnames[0]]
+        processor = EnhancedExcelProcessor()
+        min_row, max_row, min_col, max_col = processor._get_used_range(sheet)
+        started = time.perf_counter()
+        grid = reader(processor, sheet, min_row, max_row, min_col, max_col)
+        return time.perf_counter() - started, grid
+    finally:
+        workbook.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Excel cell grid loading")
+    parser.add_argument("--rows", default="10000", help="comma-separated row counts")
+    parser.add_argument("--cols", type=int, default=50)
+    parser.add_argument("--legacy-max-rows", type=int, default=50, help="largest sheet to time the cell-by-cell reader on")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"📊 Excel grid loading, read-only workbooks, {args.cols} columns")
+    print("=" * 70)
+    print(f"{'rows':>8}{'cells':>12}{'iter_rows (s)':>15}{'cell-by-cell (s)':>18}{'speed-up':>10}"
+          f"{'tables numpy (s)':>18}{'tables by cell (s)':>20}{'speed-up':>10}")
+
+    for rows in (int(value) for value in args.rows.split(",")):
+        content = generate_workbook(rows, args.cols, args.seed)
+        streaming_seconds, grid = time_reader(content, lambda p, *a: p._read_cell_grid(*a))
+
+        legacy = "skipped"
+        speed_up = ""
+        if rows <= args.legacy_max_rows:
+            legacy_seconds, legacy_grid = time_reader(content, read_cell_grid_by_cell)
+            if legacy_grid != grid:
+                print(f"❌ Grids differ for {rows} rows")
+                sys.exit(1)
+            legacy = f"{legacy_seconds:.2f}"
+            speed_up = f"{legacy_seconds / streaming_seconds:.0f}x"
+
+        processor = EnhancedExcelProcessor()
+        started = time.perf_counter()
+        tables = processor._identify_table_regions(grid, 1, 1)
+        tables_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        legacy_tables = processor._identify_table_regions_by_cell(grid, 1, 1)
+        legacy_tables_seconds = time.perf_counter() - started
+        if legacy_tables != tables:
+            print(f"❌ Table regions differ for {rows} rows")
+            sys.exit(1)
+
+        print(f"{rows:>8}{rows * args.cols:>12,}{streaming_seconds:>15.2f}{legacy:>18}{speed_up:>10}"
+              f"{tables_seconds:>18.3f}{legacy_tables_seconds:>20.3f}{legacy_tables_seconds / tables_seconds:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Parallel Excel Extraction Benchmark
+Times EnhancedExcelProcessor.extract_from_excel with sheets processed serially and in
+worker processes (workers=2, 4, ... up to the CPU count), and checks every run returns
+exactly the serial result
+
+    python scripts/benchmark_excel_parallel.py
+    python scripts/benchmark_excel_parallel.py --scale 4 --workers 2,4,8 --reader openpyxl
+
+Uses the generated workbooks from benchmark_excel_readers.py. Single-sheet workbooks only
+show what handing a whole workbook to a worker costs; the speed-up comes from workbooks
+with many sheets, like the client trackers.
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+from src.utils.enhanced_excel_processor import EnhancedExcelProcessor
+from benchmark_excel_readers import SHAPES
+
+
+def time_extraction(processor: EnhancedExcelProcessor, content: bytes, filename: str, repeat: int):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = processor.extract_from_excel(content, filename)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = ",".join(str(count) for count in (2, 4, 8, 16) if count <= max(cpus, 2))
+    parser = argparse.ArgumentParser(description="Benchmark sheet-level parallel Excel extraction")
+    parser.add_argument("--scale", type=int, default=2, help="multiplies the size of the generated workbooks")
+    parser.add_argument("--workers", default=default_workers, help="comma-separated worker process counts")
+    parser.add_argument("--reader", default="auto", help="auto, calamine or openpyxl")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per setting; the best time is reported")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    worker_counts = [int(value) for value in args.workers.split(",")]
+    print(f"📊 extract_from_excel, serial vs worker processes ({cpus} CPUs, best of {args.repeat})")
+    print("=" * 70)
+    print(f"{'workbook':<16}{'sheets':>8}{'serial (s)':>12}" + "".join(f"{f'{count} workers (s)':>17}" for count in worker_counts))
+
+    for shape, build in SHAPES.items():
+        filename = f"{shape}.xlsx"
+        content = build(random.Random(args.seed), args.scale)
+        serial_seconds, expected = time_extraction(EnhancedExcelProcessor(reader=args.reader), content, filename, args.repeat)
+
+        row = f"{shape:<16}{expected['total_sheets']:>8}{serial_seconds:>12.2f}"
+        for count in worker_counts:
+            processor = EnhancedExcelProcessor(reader=args.reader, workers=count)
+            processor.PARALLEL_MIN_BYTES = 0
+            try:
+                # Start the workers before timing - the pool lives as long as the processor
+                processor.extract_from_excel(content, filename)
+                seconds, result = time_extraction(processor, content, filename, args.repeat)
+            finally:
+                processor.close()
+            if result != expected:
+                print(f"❌ {count} workers returned a different result for {filename}")
+                sys.exit(1)
+            row += f"{f'{seconds:.2f} ({serial_seconds / seconds:.1f}x)':>17}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Excel Reader Backend Benchmark
+Times EnhancedExcelProcessor.extract_from_excel with each workbook reader (openpyxl and,
+when installed, python-calamine) on generated workbooks shaped like the ones we ingest,
+and checks every backend produces the same sheets
+
+    python scripts/benchmark_excel_readers.py
+    python scripts/benchmark_excel_readers.py --scale 4 --repeat 5
+    python scripts/benchmark_excel_readers.py --files "Magic Meeting Tracker.xlsx" ledger.xlsx
+
+Shapes:
+    tracker - one sheet per client: a contacts table, a meeting log and free-text notes
+    ledger  - a single long finance sheet
+    report  - a wide summary sheet with several side-by-side blocks
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+from io import BytesIO
+
+import openpyxl
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+from src.utils.enhanced_excel_processor import EnhancedExcelProcessor, WORKBOOK_READERS
+
+
+def save(workbook) -> bytes:
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def tracker_workbook(rng: random.Random, scale: int) -> bytes:
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    start = datetime.date(2023, 1, 1)
+    for client in range(25 * scale):
+        sheet = workbook.create_sheet(f"Client {client} - Meeting Notes")
+        sheet.append(["Name", "Title", "Email", "Phone"])
+        for contact in range(rng.randint(3, 12)):
+            sheet.append([f"Person {contact}", "Director", f"person{contact}@client{client}.com", f"555-{contact:04d}"])
+        sheet.append([])
+        sheet.append(["Date", "Attendees", "Topic", "Follow-up", "Owner"])
+        for _ in range(rng.randint(10, 80)):
+            sheet.append([start + datetime.timedelta(days=rng.randint(0, 700)), rng.randint(1, 9),
+                          f"Quarterly review {rng.randint(1, 4)}", "Send pricing proposal", rng.choice(["AB", "CD", "EF"])])
+        sheet.append([])
+        sheet.append(["Notes: renewal discussed, budget approved for next fiscal year"])
+    return save(workbook)
+
+
+def ledger_workbook(rng: random.Random, scale: int) -> bytes:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Ledger"
+    sheet.append(["Date", "Account", "Description", "Debit", "Credit", "Balance", "Cost Centre", "Reference"])
+    start = datetime.date(2022, 1, 1)
+    balance = 0.0
+    for row in range(20000 * scale):
+        amount = round(rng.uniform(-5000, 5000), 2)
+        balance += amount
+        sheet.append([start + datetime.timedelta(days=row // 40), rng.randint(1000, 9999), f"Invoice {row}",
+                      max(amount, 0) or None, max(-amount, 0) or None, round(balance, 2), f"CC-{rng.randint(1, 30)}", f"REF{row:07d}"])
+    return save(workbook)
+
+
+def report_workbook(rng: random.Random, scale: int) -> bytes:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Summary"
+    for block in range(4):
+        left = 1 + block * 22
+        for col in range(20):
+            sheet.cell(row=2, column=left + col, value=f"Metric {col}")
+        for row in range(3, 3 + 500 * scale):
+            for col in range(20):
+                if rng.random() < 0.85:
+                    sheet.cell(row=row, column=left + col, value=round(rng.uniform(0, 1e6), 2))
+    return save(workbook)
+
+
+SHAPES = {"tracker": tracker_workbook, "ledger": ledger_workbook, "report": report_workbook}
+
+
+def time_reader(content: bytes, filename: str, reader: str, repeat: int):
+    processor = EnhancedExcelProcessor(reader=reader)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = processor.extract_from_excel(content, filename)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Excel reader backends")
+    parser.add_argument("--scale", type=int, default=1, help="multiplies the size of the generated workbooks")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per backend; the best time is reported")
+    parser.add_argument("--files", nargs="*", default=[], help="real workbooks to benchmark instead of generated ones")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    readers = [name for name, reader in WORKBOOK_READERS.items() if reader.available()]
+    if "calamine" not in readers:
+        print("⚠️ python-calamine is not installed - only openpyxl will be timed (pip install python-calamine)")
+
+    if args.files:
+        workbooks = [(os.path.basename(path), open(path, "rb").read()) for path in args.files]
+    else:
+        workbooks = [(f"{shape}.xlsx", build(random.Random(args.seed), args.scale)) for shape, build in SHAPES.items()]
+
+    print(f"📊 extract_from_excel by reader backend (best of {args.repeat})")
+    print("=" * 70)
+    print(f"{'workbook':<28}{'size (KB)':>10}{'sheets':>8}" + "".join(f"{name + ' (s)':>16}" for name in readers) + f"{'speed-up':>10}")
+
+    for filename, content in workbooks:
+        timings = {}
+        results = {}
+        for reader in readers:
+            timings[reader], results[reader] = time_reader(content, filename, reader, args.repeat)
+            if results[reader]["type"] == "excel_error":
+                print(f"❌ {reader} failed on {filename}: {results[reader]['error']}")
+                sys.exit(1)
+
+        baseline = results[readers[-1]]["sheets"]
+        for reader in readers:
+            if results[reader]["sheets"] != baseline:
+                print(f"⚠️ {reader} output differs from {readers[-1]} on {filename}")
+
+        speed_up = f"{timings['openpyxl'] / timings['calamine']:.1f}x" if "calamine" in timings else ""
+        print(f"{filename:<28}{len(content) / 1024:>10,.0f}{results[readers[-1]]['total_sheets']:>8}"
+              + "".join(f"{timings[reader]:>16.2f}" for reader in readers) + f"{speed_up:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Offline Replay Benchmark for the Client-Aware RAG Engine
+Replays a query log against in-process Search and OpenAI stand-ins with configurable
+latency, and reports throughput, latency percentiles and per-stage call counts
+
+    python scripts/benchmark_rag_replay.py --queries requests.jsonl --concurrency 16
+    python scripts/benchmark_rag_replay.py --mode stream --llm-latency-ms 400 --token-latency-ms 5
+
+Save a run with --save and gate a later one against it with --baseline, e.g. in CI:
+
+    python scripts/benchmark_rag_replay.py --save bench.json
+    python scripts/benchmark_rag_replay.py --baseline bench.json --tolerance 0.15
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from core.metrics import registry as stage_metrics, percentile
+from utils.client_detector import CLIENT_KEYWORDS
+from utils.offline_services import (
+    CallCounter, FakeAsyncAzureOpenAI, FakeAsyncSearchClient, FakeSearchClient, InMemorySearchIndex,
+    LatencyModel, build_synthetic_corpus, load_chunk_documents, load_query_log
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERY_TEMPLATES = [
+    "Who is on the {client} team?",
+    "{client} financials for last quarter",
+    "Show me {client} meeting notes",
+    "What is the contact info for the {client} controller?",
+    "What training materials does Autobahn have?",
+    "Summarize revenue trends and key risks",
+]
+
+
+def synthetic_queries(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    aliases = [aliases[0] for aliases in CLIENT_KEYWORDS.values()]
+    return [rng.choice(QUERY_TEMPLATES).format(client=rng.choice(aliases).title()) for _ in range(count)]
+
+
+def build_engine(args, calls: CallCounter):
+    """ClientAwareRAGEngine wired to offline stand-ins"""
+    # Caches start empty each run; keep them off disk so runs don't share results
+    os.environ["QUERY_CACHE_PATH"] = ""
+    if args.no_cache:
+        os.environ["QUERY_CACHE_ENABLED"] = "false"
+        os.environ["SEARCH_CACHE_ENABLED"] = "false"
+    from api.client_aware_rag import ClientAwareRAGEngine
+
+    if args.corpus:
+        documents = load_chunk_documents(args.corpus)
+    else:
+        template = load_chunk_documents(os.path.join(PROJECT_ROOT, "sample_processed_doc.json"))[0]
+        documents = build_synthetic_corpus(template, args.docs_per_client, args.chunks_per_doc, seed=args.seed)
+    index = InMemorySearchIndex(documents)
+
+    search_latency = LatencyModel(args.search_latency_ms, args.search_jitter_ms, seed=args.seed)
+    llm_latency = LatencyModel(args.llm_latency_ms, args.llm_jitter_ms, seed=args.seed + 1)
+    openai_client = FakeAsyncAzureOpenAI(llm_latency, args.token_latency_ms, args.response_tokens, calls)
+
+    engine = ClientAwareRAGEngine(
+        search_client=FakeSearchClient(index, search_latency, calls),
+        async_search_client_factory=lambda: FakeAsyncSearchClient(index, search_latency, calls),
+        openai_client=openai_client
+    )
+    return engine, len(documents)
+
+
+async def run_one(engine, mode: str, query: str) -> bool:
+    messages = [{"role": "user", "content": query}]
+    if mode == "search":
+        result = await engine.client_aware_search(query=query, top=5)
+        return "error" not in result
+    if mode == "stream":
+        ok = False
+        async for event in engine.client_aware_chat_stream(messages=messages, session_id="replay"):
+            if event["type"] == "error":
+                return False
+            ok = ok or event["type"] == "done"
+        return ok
+    result = await engine.client_aware_chat(messages=messages, session_id="replay")
+    return "error" not in result
+
+
+async def replay(engine, mode: str, queries: List[str], total: int, concurrency: int) -> Dict:
+    """Send total requests, cycling through queries, with a fixed number in flight"""
+    latencies: List[float] = []
+    errors = 0
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request, errors
+        while next_request < total:
+            query = queries[next_request % len(queries)]
+            next_request += 1
+            started = time.perf_counter()
+            try:
+                ok = await run_one(engine, mode, query)
+            except Exception as e:
+                print(f"   ⚠️  {query[:50]!r}: {str(e)}")
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed": elapsed,
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "mean": statistics.mean(latencies) if latencies else 0.0,
+    }
+
+
+def compare_to_baseline(summary: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions beyond tolerance (fractional) against a saved run"""
+    regressions = []
+    if baseline["rps"] and summary["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"throughput {summary['rps']:.1f} req/s < baseline {baseline['rps']:.1f}")
+    for key in ("p50", "p95", "p99"):
+        if baseline[key] and summary[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key} {summary[key] * 1000:.1f} ms > baseline {baseline[key] * 1000:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query log against the RAG engine with offline services")
+    parser.add_argument("--queries", help="query log (plain lines or JSON Lines, e.g. requests.jsonl)")
+    parser.add_argument("--mode", choices=["chat", "stream", "search"], default="chat")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests before measuring")
+    parser.add_argument("--no-cache", action="store_true", help="disable the query and search caches")
+    parser.add_argument("--corpus", help="chunk documents (JSON or JSON Lines) instead of the synthetic corpus")
+    parser.add_argument("--docs-per-client", type=int, default=4)
+    parser.add_argument("--chunks-per-doc", type=int, default=6)
+    parser.add_argument("--search-latency-ms", type=float, default=40.0)
+    parser.add_argument("--search-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="time to first byte per completion")
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="delay between streamed tokens")
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="write the summary as JSON")
+    parser.add_argument("--baseline", help="summary JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional regression vs baseline")
+    args = parser.parse_args()
+
+    queries = load_query_log(args.queries) if args.queries else synthetic_queries(100, args.seed)
+    if not queries:
+        parser.error(f"no queries found in {args.queries}")
+
+    calls = CallCounter()
+    engine, document_count = build_engine(args, calls)
+
+    print(f"🔁 Replay: {args.mode}, {args.requests} requests, concurrency {args.concurrency}, "
+          f"{len(queries)} distinct queries, {document_count} chunks")
+    print(f"   search {args.search_latency_ms:.0f}±{args.search_jitter_ms:.0f} ms, "
+          f"llm {args.llm_latency_ms:.0f}±{args.llm_jitter_ms:.0f} ms, "
+          f"caches {'off' if args.no_cache else 'on'}")
+    print("=" * 70)
+
+    async def run():
+        if args.warmup:
+            await replay(engine, args.mode, queries, args.warmup, 1)
+        stage_metrics.reset()
+        calls_before = calls.snapshot()
+        summary = await replay(engine, args.mode, queries, args.requests, args.concurrency)
+        calls_after = calls.snapshot()
+        summary["service_calls"] = {name: count - calls_before.get(name, 0) for name, count in calls_after.items()}
+        summary["stages"] = stage_metrics.snapshot()
+        return summary
+
+    summary = asyncio.run(run())
+
+    print(f"{'req/s':>10}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'mean (ms)':>11}{'errors':>8}")
+    print(f"{summary['rps']:>10.2f}{summary['p50'] * 1000:>11.1f}{summary['p95'] * 1000:>11.1f}"
+          f"{summary['p99'] * 1000:>11.1f}{summary['mean'] * 1000:>11.1f}{summary['errors']:>8}")
+
+    print(f"\n{'stage':<22}{'calls':>8}{'calls/req':>11}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}")
+    for stage, stats in summary["stages"].items():
+        print(f"{stage:<22}{stats['count']:>8}{stats['count'] / args.requests:>11.2f}"
+              f"{stats['p50'] * 1000:>11.1f}{stats['p95'] * 1000:>11.1f}{stats['p99'] * 1000:>11.1f}")
+
+    print("\n📞 Service calls: " + ", ".join(f"{name} {count}" for name, count in sorted(summary["service_calls"].items())))
+    print(f"🗃️  Caches: {json.dumps(engine.cache_stats(), default=str)}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\n💾 Summary saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(summary, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Regressions vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
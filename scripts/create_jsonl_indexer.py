@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Create JSON Lines Indexer
+Adds a companion indexer that reads the one-blob-per-document {doc_id}.jsonl files
+written with CHUNK_STORAGE_MODE=jsonl, next to the existing per-chunk .json indexer
+
+Limitation: blob deletion detection only sees whole blobs. When a new version of a document
+has fewer chunks its .jsonl blob is overwritten, not deleted, so the indexer never removes the
+dropped chunk_ids. The ingestion function deletes those from the index itself, which needs
+AZURE_SEARCH_ENDPOINT, AZURE_SEARCH_ADMIN_KEY and EXISTING_INDEX_NAME in its app settings -
+without them it refuses jsonl mode and keeps writing one blob per chunk.
+"""
+
+import os
+import copy
+from dotenv import load_dotenv
+from azure.search.documents.indexes import SearchIndexerClient
+from azure.search.documents.indexes.models import IndexingParameters
+from azure.core.credentials import AzureKeyCredential
+
+load_dotenv()
+
+class JsonLinesIndexerCreator:
+    """Clone the chunk indexer into one that parses .jsonl blobs line by line"""
+
+    def __init__(self):
+        self.endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+        self.admin_key = os.getenv("AZURE_SEARCH_ADMIN_KEY")
+        self.source_indexer_name = "jennifur-rag-indexer"          # Existing per-chunk indexer
+        self.jsonl_indexer_name = "jennifur-rag-indexer-jsonl"     # Same data source and index
+
+        if not all([self.endpoint, self.admin_key]):
+            raise ValueError("Missing required Azure Search configuration")
+
+        self.indexer_client = SearchIndexerClient(
+            endpoint=self.endpoint,
+            credential=AzureKeyCredential(self.admin_key)
+        )
+
+    def create_jsonl_indexer(self) -> bool:
+        """Create or update the .jsonl indexer and keep the source indexer on .json files only"""
+        try:
+            source = self.indexer_client.get_indexer(self.source_indexer_name)
+            print(f"   Data source: {source.data_source_name}")
+            print(f"   Target index: {source.target_index_name}")
+
+            # Each line is one chunk with the same fields and chunk_id key as a .json chunk blob
+            jsonl_indexer = copy.deepcopy(source)
+            jsonl_indexer.name = self.jsonl_indexer_name
+            jsonl_indexer.e_tag = None
+            if not jsonl_indexer.parameters:
+                jsonl_indexer.parameters = IndexingParameters()
+            jsonl_indexer.parameters.parsing_mode = "jsonLines"
+            jsonl_indexer.parameters.configuration = {
+                **(jsonl_indexer.parameters.configuration or {}),
+                "indexedFileNameExtensions": ".jsonl",
+                "failOnUnsupportedContentType": False
+            }
+            self.indexer_client.create_or_update_indexer(jsonl_indexer)
+            print(f"✅ Indexer '{self.jsonl_indexer_name}' configured (parsingMode=jsonLines, .jsonl)")
+
+            # Keep the two indexers from picking up each other's blobs
+            if not source.parameters:
+                source.parameters = IndexingParameters()
+            source.parameters.configuration = {
+                **(source.parameters.configuration or {}),
+                "indexedFileNameExtensions": ".json"
+            }
+            self.indexer_client.create_or_update_indexer(source)
+            print(f"✅ Indexer '{self.source_indexer_name}' restricted to .json blobs")
+
+            return True
+
+        except Exception as e:
+            print(f"❌ Error configuring JSON Lines indexer: {str(e)}")
+            return False
+
+def main():
+    """Main execution function"""
+    print("📦 JSON LINES INDEXER SETUP")
+    print("=" * 50)
+
+    try:
+        creator = JsonLinesIndexerCreator()
+        print(f"✅ Connected to Azure Search: {creator.endpoint}")
+
+        if creator.create_jsonl_indexer():
+            print("\n🎉 JSON LINES INDEXER READY!")
+            print("Set CHUNK_STORAGE_MODE=jsonl on the ingestion function, together with AZURE_SEARCH_ENDPOINT,")
+            print("AZURE_SEARCH_ADMIN_KEY and EXISTING_INDEX_NAME so it can delete dropped chunks, then run the new indexer.")
+        else:
+            print("\n❌ SETUP FAILED!")
+
+    except Exception as e:
+        print(f"❌ Fatal error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
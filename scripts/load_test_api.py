@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Load Test for the Client-Aware RAG API
+Compares requests/sec and latency percentiles between event loop modes
+
+Start one server per mode, then point this script at both:
+
+    RAG_EVENT_LOOP_MODE=per_request gunicorn -k gthread --threads 8 -b :5001 app:app
+    RAG_EVENT_LOOP_MODE=persistent  gunicorn -k gthread --threads 8 -b :5002 app:app
+
+    python scripts/load_test_api.py \\
+        --target per_request=http://localhost:5001 \\
+        --target persistent=http://localhost:5002
+"""
+
+import math
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+DEFAULT_QUERIES = [
+    "Who is on the Camelot team?",
+    "Phoenix financials",
+    "What training materials does Autobahn have?",
+    "Tell me about LJ Kruse onboarding process",
+    "Contact info for Neptune Plumbing",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_payload(endpoint: str, query: str) -> Dict:
+    if endpoint == "search":
+        return {"query": query, "top": 5}
+    return {"messages": [{"role": "user", "content": query}], "session_id": "load-test"}
+
+
+def run_load_test(base_url: str, endpoint: str, total_requests: int, concurrency: int,
+                  queries: List[str], timeout: float) -> Dict:
+    """Fire total_requests at one server with a fixed number of concurrent clients"""
+    url = f"{base_url.rstrip('/')}/api/{endpoint}"
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def one_request(i: int):
+        payload = build_payload(endpoint, queries[i % len(queries)])
+        started = time.perf_counter()
+        try:
+            response = session.post(url, json=payload, timeout=timeout)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one_request, range(total_requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, ok in results if ok]
+    return {
+        "requests": total_requests,
+        "errors": sum(1 for _, ok in results if not ok),
+        "elapsed": elapsed,
+        "rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "mean": statistics.mean(latencies) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare API throughput between event loop modes")
+    parser.add_argument("--target", action="append", required=True,
+                        help="label=base_url, repeat once per server (e.g. persistent=http://localhost:5002)")
+    parser.add_argument("--endpoint", choices=["chat", "search"], default="search")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per target before measuring")
+    args = parser.parse_args()
+
+    targets = []
+    for target in args.target:
+        label, _, base_url = target.partition("=")
+        if not base_url:
+            parser.error(f"--target must be label=url, got '{target}'")
+        targets.append((label, base_url))
+
+    print(f"🚦 Load test: POST /api/{args.endpoint}, {args.requests} requests, concurrency {args.concurrency}")
+    print("=" * 70)
+
+    summaries = {}
+    for label, base_url in targets:
+        if args.warmup:
+            run_load_test(base_url, args.endpoint, args.warmup, 1, DEFAULT_QUERIES, args.timeout)
+        summaries[label] = run_load_test(
+            base_url, args.endpoint, args.requests, args.concurrency, DEFAULT_QUERIES, args.timeout
+        )
+
+    print(f"{'mode':<14}{'req/s':>10}{'p50 (s)':>10}{'p95 (s)':>10}{'mean (s)':>10}{'errors':>8}")
+    for label, summary in summaries.items():
+        print(f"{label:<14}{summary['rps']:>10.2f}{summary['p50']:>10.3f}"
+              f"{summary['p95']:>10.3f}{summary['mean']:>10.3f}{summary['errors']:>8}")
+
+    if len(summaries) >= 2:
+        (base_label, base), *others = summaries.items()
+        for label, summary in others:
+            if base["rps"] and base["p95"]:
+                print(f"\n📈 {label} vs {base_label}: "
+                      f"{summary['rps'] / base['rps']:.2f}x req/s, "
+                      f"p95 {summary['p95'] / base['p95']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
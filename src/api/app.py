@@ -6,10 +6,11 @@ Updated to use the client metadata tagging system
 import re
 import os
 import json
-import asyncio
+import time
+import atexit
 from datetime import datetime
 from typing import List, Dict, Any
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -20,11 +21,51 @@ load_dotenv()
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from api.client_aware_rag import ClientAwareRAGEngine
+from api.event_loop import PersistentEventLoop, run_in_new_loop, iterate_in_new_loop
+from core.metrics import registry as stage_metrics, StageTimings, with_timings
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend integration
 conversation_memory = {}
 
+# "persistent" keeps one event loop per worker so the engine's OpenAI and Search
+# connection pools survive between requests; "per_request" is the original mode
+EVENT_LOOP_MODE = os.getenv("RAG_EVENT_LOOP_MODE", "persistent").lower()
+event_loop = PersistentEventLoop()
+
+def run_async(coro):
+    """Run an engine coroutine from a sync Flask route"""
+    if has_request_context() and "stage_timings" in g:
+        # Collect the coroutine's stage spans for this request's Server-Timing header
+        coro = with_timings(coro, g.stage_timings)
+    if EVENT_LOOP_MODE == "per_request":
+        return run_in_new_loop(coro, cleanup=rag_engine.close_loop_clients)
+    return event_loop.run(coro)
+
+def iterate_async(agen):
+    """Iterate an engine async generator from a sync Flask route"""
+    if EVENT_LOOP_MODE == "per_request":
+        return iterate_in_new_loop(agen, cleanup=rag_engine.close_loop_clients)
+    return event_loop.iterate(agen)
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format a chat stream event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@app.before_request
+def start_stage_timings():
+    g.request_started = time.perf_counter()
+    g.stage_timings = StageTimings()
+
+@app.after_request
+def add_server_timing(response):
+    """Expose per-stage latency to the browser's network panel"""
+    timings = g.get("stage_timings")
+    # Streamed responses send their headers before any stage has run
+    if timings is not None and timings.spans and not response.is_streamed:
+        response.headers["Server-Timing"] = timings.server_timing(time.perf_counter() - g.request_started)
+    return response
+
 # Initialize the client-aware RAG engine
 try:
     rag_engine = ClientAwareRAGEngine()
@@ -44,22 +85,42 @@ except Exception as e:
     print(f"💥 Failed to initialize Client-Aware RAG engine: {str(e)}")
     exit(1)
 
+@atexit.register
+def close_rag_engine():
+    """Close the engine's connections on the loop that opened them, then stop it"""
+    if not event_loop.is_running:
+        return
+    try:
+        event_loop.run(rag_engine.close(), timeout=5)
+    except Exception as e:
+        print(f"⚠️ Failed to close RAG engine connections: {str(e)}")
+    event_loop.stop()
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
         "version": "client-aware-v2.0",
+        "event_loop_mode": EVENT_LOOP_MODE,
         "features": [
             "client_filtering", 
             "pm_filtering", 
             "category_filtering",
             "query_optimization", 
             "conversation_memory", 
-            "thought_transparency"
-        ]
+            "thought_transparency",
+            "streaming_chat"
+        ],
+        "caches": rag_engine.cache_stats(),
+        "stage_latency": stage_metrics.snapshot()
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Per-stage latency histograms in Prometheus text format"""
+    return Response(stage_metrics.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Enhanced chat endpoint with client awareness"""
@@ -76,24 +137,59 @@ def chat():
             return jsonify({"error": "Missing 'messages' parameter"}), 400
         
         # Run async function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(
-                rag_engine.client_aware_chat(
+        result = run_async(
+            rag_engine.client_aware_chat(
+                messages=messages,
+                client_context=client_context,
+                pm_context=pm_context,
+                session_id=session_id
+            )
+        )
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        print(f"Chat error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming chat endpoint - sends thoughts, then response tokens, as Server-Sent Events"""
+    try:
+        data = request.get_json()
+        messages = data.get("messages", [])
+        session_id = data.get("session_id", "default")
+        
+        # Client filtering parameters
+        client_context = data.get("client_context")
+        pm_context = data.get("pm_context")
+        
+        if not messages:
+            return jsonify({"error": "Missing 'messages' parameter"}), 400
+        
+        def generate():
+            events = iterate_async(
+                rag_engine.client_aware_chat_stream(
                     messages=messages,
                     client_context=client_context,
                     pm_context=pm_context,
                     session_id=session_id
                 )
             )
-        finally:
-            loop.close()
+            for event in events:
+                yield format_sse(event)
         
-        return jsonify(result)
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"  # Don't let proxies buffer the stream
+            }
+        )
         
     except Exception as e:
-        print(f"Chat error: {str(e)}")
+        print(f"Chat stream error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/search', methods=['POST'])
@@ -114,21 +210,16 @@ def search():
         include_internal = data.get("include_internal", True)
         
         # Run async search
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(
-                rag_engine.client_aware_search(
-                    query=query,
-                    client_name=client_name,
-                    pm_initial=pm_initial,
-                    document_category=document_category,
-                    top=top,
-                    include_internal=include_internal
-                )
+        result = run_async(
+            rag_engine.client_aware_search(
+                query=query,
+                client_name=client_name,
+                pm_initial=pm_initial,
+                document_category=document_category,
+                top=top,
+                include_internal=include_internal
             )
-        finally:
-            loop.close()
+        )
             
         return jsonify(result)
         
@@ -156,19 +247,14 @@ def get_client_stats(client_name):
     """Get statistics for a specific client"""
     try:
         # Search for documents from this client
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(
-                rag_engine.client_aware_search(
-                    query="*",
-                    client_name=client_name,
-                    top=100,
-                    include_internal=False
-                )
+        result = run_async(
+            rag_engine.client_aware_search(
+                query="*",
+                client_name=client_name,
+                top=100,
+                include_internal=False
             )
-        finally:
-            loop.close()
+        )
         
         # Group by category
         categories = {}
@@ -257,19 +343,14 @@ def chat_old():
             return jsonify({"error": "Missing 'messages' parameter"}), 400
         
         # Use client-aware chat without specific client context
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(
-                rag_engine.client_aware_chat(
-                    messages=messages,
-                    client_context=None,  # No specific client
-                    pm_context=None,      # No specific PM
-                    session_id=session_id
-                )
+        result = run_async(
+            rag_engine.client_aware_chat(
+                messages=messages,
+                client_context=None,  # No specific client
+                pm_context=None,      # No specific PM
+                session_id=session_id
             )
-        finally:
-            loop.close()
+        )
         
         return jsonify(result)
         
@@ -285,7 +366,9 @@ if __name__ == '__main__':
     print("📂 Category filtering enabled")
     print("\n🌐 API Endpoints:")
     print("   Health:     http://localhost:5001/api/health")
+    print("   Metrics:    GET  http://localhost:5001/api/metrics")
     print("   Chat:       POST http://localhost:5001/api/chat")
+    print("   Chat (SSE): POST http://localhost:5001/api/chat/stream")
     print("   Search:     POST http://localhost:5001/api/search")
     print("   Clients:    GET  http://localhost:5001/api/clients")
     print("   Suggestions: POST http://localhost:5001/api/search/suggestions")
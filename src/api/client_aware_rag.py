@@ -4,80 +4,113 @@ Enhanced RAG engine that uses client metadata for intelligent document filtering
 """
 
 import os
+import copy
 import json
+import time
 import asyncio
+import threading
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
 from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.core.credentials import AzureKeyCredential
 from openai import AsyncAzureOpenAI
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from core.query_optimizer import AdvancedQueryOptimizer
+from core.cache import LRUCache, VersionedCache, normalize_query
+from core.context_builder import ContextBuilder
+from core.prompts import PromptCacheStats, build_prompt_messages, build_request_context
+from core.metrics import span, record as record_stage
+from utils.client_detector import get_client_detector
 
 class ClientAwareRAGEngine:
     """Enhanced RAG engine with client metadata awareness"""
     
-    def __init__(self):
+    def __init__(self,
+                 search_client: Optional[SearchClient] = None,
+                 async_search_client_factory: Optional[Callable[[], AsyncSearchClient]] = None,
+                 openai_client: Optional[AsyncAzureOpenAI] = None):
+        """
+        Args:
+            search_client: Sync search client (defaults to one built from the environment)
+            async_search_client_factory: Builds the async search client for each event loop
+            openai_client: Chat completions client, shared with the query optimizer
+        
+        The injection points let benchmarks run the engine against offline stand-ins.
+        """
         # Initialize Azure services
-        self.search_client = SearchClient(
+        self.search_client = search_client or SearchClient(
             endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
             index_name=os.getenv("EXISTING_INDEX_NAME"),
             credential=AzureKeyCredential(os.getenv("AZURE_SEARCH_ADMIN_KEY"))
         )
         
-        self.openai_client = AsyncAzureOpenAI(
+        # Async search clients for the query path, one per event loop - created lazily
+        # because each aiohttp session is bound to the loop that first uses it
+        self._async_search_client_factory = async_search_client_factory or self._default_async_search_client
+        self._async_search_clients: Dict[asyncio.AbstractEventLoop, AsyncSearchClient] = {}
+        self._async_search_lock = threading.Lock()
+        
+        self.openai_client = openai_client or AsyncAzureOpenAI(
             api_key=os.getenv("AZURE_OPENAI_API_KEY"),
             api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
             azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
         )
         
         self.chat_model = os.getenv("AZURE_OPENAI_CHAT_MODEL")
-        self.query_optimizer = AdvancedQueryOptimizer()
-        
-        # Client detection patterns
-        self.client_keywords = {
-            'allbrite': ['allbrite'],
-            'camelot': ['camelot', 'camelot corp'],
-            'phoenix': ['phoenix', 'phoenix corporation', 'phoenix corp'],
-            'lj kruse': ['lj kruse', 'kruse', 'ljk'],
-            'gold standard': ['gold standard', 'gold standard forum'],
-            'corridor': ['corridor', 'corridor title'],
-            'ce floyd': ['ce floyd', 'floyd'],
-            'tendit': ['tendit'],
-            'twining': ['twining'],
-            'neptune': ['neptune', 'neptune plumbing'],
-            'secs': ['secs', 'southeast concrete systems'],
-            'brets electric': ['brets', 'brets electric'],            
-            'cmr': ['cmr'],
-            'curexa pharmacy': ['curexa pharmacy', 'curexa'],
-            'desert de oro': ['ddo', 'desert de oro'],
-            'eckart': ['eckart', 'eckart supply'],
-            'eden': ['eden health', 'eden'],
-            'gideon': ['gideon'],
-            'i3': ['i3'],
-            'indium': ['indium'],
-            'inpwr': ['inpower', 'inpwr'],
-            'rxharmony': ['rxharmony', 'rx harmony', 'joi'],
-            'jtl': ['jtl construction', 'jtl'],
-            'las colinas pharmacy': ['las colinas pharmacy', 'las colinas'],
-            'park square homes': ['park square homes', 'psh'],
-            'peak': ['peak', 'bellwether enterprises', 'bellwether'],
-            'prc': ['prc'],
-            'revelation pharma': ['revelation pharma', 'rev', 'rev pharma'],
-            'skybeck': ['skybeck'],
-            'talent groups': ['talent groups'],
-            'town & country': ['town & country', 'town and country'],
-            'wellbore': ['wellbore'],
-            'woodward': ['woodward'],
-        }
+        self.query_optimizer = AdvancedQueryOptimizer(client=self.openai_client)
+        self.search_cache = self._build_search_cache()
+        
+        # Prompt context assembly - token budget shared by all sources in a response
+        self.context_builder = ContextBuilder()
+        self.max_context_sources = int(os.getenv("MAX_CONTEXT_SOURCES", "5"))
+        # Cached-token counts reported by the model for the static prompt prefix
+        self.prompt_cache = PromptCacheStats()
+        
+        # Known-client detector, compiled once and shared with the Excel pipeline
+        self.client_detector = get_client_detector()
         
         print("✅ Client-Aware RAG Engine initialized")
     
+    def _build_search_cache(self) -> Optional[VersionedCache]:
+        """Result cache for client_aware_search, invalidated when the index changes"""
+        if os.getenv("SEARCH_CACHE_ENABLED", "true").lower() != "true":
+            return None
+        
+        return VersionedCache(
+            LRUCache(
+                max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000")),
+                ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300"))
+            ),
+            version_probe=self._probe_index_version,
+            check_interval_seconds=float(os.getenv("SEARCH_CACHE_FRESHNESS_SECONDS", "30"))
+        )
+    
+    async def _probe_index_version(self) -> Optional[str]:
+        """
+        Cheap index-freshness token: document count plus newest metadata timestamp
+        
+        New chunks change the count; re-processed or re-tagged chunks (Magic Meeting
+        Tracker sheets included) bump metadata_updated_timestamp. One top=1 query either way.
+        """
+        results = await self._get_async_search_client().search(
+            search_text="*",
+            top=1,
+            select=["metadata_updated_timestamp"],
+            order_by=["metadata_updated_timestamp desc"],
+            include_total_count=True
+        )
+        newest = None
+        async for result in results:
+            newest = result.get("metadata_updated_timestamp")
+        count = await results.get_count()
+        return f"{count}:{newest}"
+    
     def detect_client_from_query(self, query: str) -> Optional[str]:
         """
         Detect if a query is asking about a specific client
@@ -88,28 +121,13 @@ class ClientAwareRAGEngine:
         Returns:
             Client name if detected, None otherwise
         """
-        query_lower = query.lower()
-        
-        # Check for exact client mentions
-        for client_name, keywords in self.client_keywords.items():
-            for keyword in keywords:
-                if keyword in query_lower:
-                    # Return proper client name - use uppercase for known acronyms
-                    if client_name.lower() in ['jtl', 'cmr', 'prc', 'i3', 'psh', 'ddo']:
-                        return client_name.upper()
-                    else:
-                        return client_name.title()
-        
-        # Check for PM mentions (e.g., "PM-C documents")
-        if 'pm-c' in query_lower:
-            return 'Camelot'  # PM-C is Camelot
-        elif 'pm-s' in query_lower:
-            # Multiple clients with PM-S, can't determine specific client
-            return None
-        elif 'pm-k' in query_lower:
-            return 'CE Floyd'  # PM-K is CE Floyd
-        
-        return None
+        # Timed here so every caller's detection is recorded once under the stage
+        with span("client_detection"):
+            return self.client_detector.detect(query)
+    
+    def detect_clients_from_query(self, query: str) -> List[str]:
+        """All known clients mentioned in a query, most specific first"""
+        return [match.client_name for match in self.client_detector.detect_all(query)]
     
     def build_client_filter(self, 
                           client_name: Optional[str] = None,
@@ -168,7 +186,88 @@ class ClientAwareRAGEngine:
         
         return " and ".join(final_filters)
     
-    async def _search_magic_meeting_tracker(self, query: str, client_name: Optional[str], top: int) -> List[Dict]:
+    @staticmethod
+    def _default_async_search_client() -> AsyncSearchClient:
+        return AsyncSearchClient(
+            endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
+            index_name=os.getenv("EXISTING_INDEX_NAME"),
+            credential=AzureKeyCredential(os.getenv("AZURE_SEARCH_ADMIN_KEY"))
+        )
+    
+    def _get_async_search_client(self) -> AsyncSearchClient:
+        """Get the async search client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._async_search_lock:
+            client = self._async_search_clients.get(loop)
+            if client is None:
+                self._discard_closed_loop_clients()
+                client = self._async_search_clients[loop] = self._async_search_client_factory()
+            return client
+    
+    def _discard_closed_loop_clients(self):
+        """Forget clients whose loop was closed without close_loop_clients() - they can no longer be closed"""
+        closed = [loop for loop in self._async_search_clients if loop.is_closed()]
+        for loop in closed:
+            del self._async_search_clients[loop]
+        if closed:
+            print(f"⚠️ {len(closed)} async search client(s) outlived their event loop without being closed")
+    
+    async def close_loop_clients(self):
+        """
+        Close the async search client of the running event loop
+        
+        Await this before closing a per-request event loop; the client's aiohttp
+        session cannot be closed once its loop is gone.
+        """
+        with self._async_search_lock:
+            client = self._async_search_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+    
+    async def close(self):
+        """Close the engine's Search and OpenAI connections, on the event loop that served its requests"""
+        await self.close_loop_clients()
+        await self.openai_client.close()
+        self.search_client.close()
+    
+    async def _execute_search(self, stage: str = "search", **search_params) -> List[Dict]:
+        """Run a single Azure Search query and collect its results, timed under stage"""
+        with span(stage):
+            results = await self._get_async_search_client().search(**search_params)
+            return [result async for result in results]
+    
+    async def _execute_searches(self, search_queries: List[str], top: int, label: str, stage: str,
+                                failures: Optional[List[str]] = None) -> List[List[Dict]]:
+        """
+        Run several filename/chunk searches concurrently, one result list per query
+        
+        A failed query yields an empty list; its label is appended to failures, if given,
+        so callers can tell a partial result from a complete one.
+        """
+        batches = await asyncio.gather(
+            *(self._execute_search(
+                stage,
+                search_text=search_query,
+                search_fields=["filename", "chunk"],
+                search_mode="any",
+                top=top
+            ) for search_query in search_queries),
+            return_exceptions=True
+        )
+        
+        results = []
+        for batch in batches:
+            if isinstance(batch, Exception):
+                print(f"Error searching {label}: {str(batch)}")
+                if failures is not None:
+                    failures.append(label)
+                results.append([])
+            else:
+                results.append(batch)
+        return results
+    
+    async def _search_magic_meeting_tracker(self, query: str, client_name: Optional[str], top: int,
+                                            failures: Optional[List[str]] = None) -> List[Dict]:
         """Search MAGIC MEETING TRACKER first - most up-to-date client data"""
         magic_sources = []
         
@@ -179,57 +278,49 @@ class ClientAwareRAGEngine:
             "MAGIC MEETING TRACKER"
         ]
         
-        for search_query in magic_tracker_queries[:2]:  # Limit to most relevant queries
-            try:
-                results = self.search_client.search(
-                    search_text=search_query,
-                    search_fields=["filename", "chunk"],
-                    search_mode="any",
-                    top=5
-                )
+        # Limit to most relevant queries
+        batches = await self._execute_searches(magic_tracker_queries[:2], 5, "MAGIC MEETING TRACKER", "search_tracker", failures)
+        
+        for results in batches:
+            for result in results:
+                filename = result.get("filename", "")
                 
-                for result in results:
-                    filename = result.get("filename", "")
-                    
-                    # Only include actual MAGIC MEETING TRACKER documents
-                    if 'MAGIC MEETING TRACKER' in filename.upper():
-                        chunk = result.get("chunk", "")
-                        source = {
-                            "chunk": chunk,
-                            "content": chunk,  # Keep both for backward compatibility
-                            "content_preview": chunk[:200] + "..." if len(chunk) > 200 else chunk,
-                            "sourcefile": filename,
-                            "sourcepage": result.get("document_path", ""),
-                            "title": result.get("title", ""),
-                            "chunk_id": result.get("chunk_id", ""),
-                            "score": float(result.get("@search.score", 0)) + 2.0,  # BIG score boost for MAGIC TRACKER
-                            
-                            # Client metadata
-                            "client_name": result.get("client_name", "Unknown"),
-                            "pm_initial": result.get("pm_initial", "N/A"),
-                            "document_category": result.get("document_category", "current_data"),
-                            "is_client_specific": result.get("is_client_specific", False),
-                            
-                            "source_type": "magic_tracker_prioritized"
-                        }
+                # Only include actual MAGIC MEETING TRACKER documents
+                if 'MAGIC MEETING TRACKER' in filename.upper():
+                    chunk = result.get("chunk", "")
+                    source = {
+                        "chunk": chunk,
+                        "content": chunk,  # Keep both for backward compatibility
+                        "content_preview": chunk[:200] + "..." if len(chunk) > 200 else chunk,
+                        "sourcefile": filename,
+                        "sourcepage": result.get("document_path", ""),
+                        "title": result.get("title", ""),
+                        "chunk_id": result.get("chunk_id", ""),
+                        "parent_id": result.get("parent_id"),
+                        "chunk_index": result.get("chunk_index"),
+                        "score": float(result.get("@search.score", 0)) + 2.0,  # BIG score boost for MAGIC TRACKER
                         
-                        # Avoid duplicates
-                        if not any(s["chunk_id"] == source["chunk_id"] for s in magic_sources):
-                            magic_sources.append(source)
+                        # Client metadata
+                        "client_name": result.get("client_name", "Unknown"),
+                        "pm_initial": result.get("pm_initial", "N/A"),
+                        "document_category": result.get("document_category", "current_data"),
+                        "is_client_specific": result.get("is_client_specific", False),
                         
-                        if len(magic_sources) >= top // 2:  # Get up to half results from MAGIC TRACKER
-                            break
-            except Exception as e:
-                print(f"Error searching MAGIC MEETING TRACKER: {str(e)}")
-                continue
+                        "source_type": "magic_tracker_prioritized"
+                    }
+                    
+                    # Avoid duplicates
+                    if not any(s["chunk_id"] == source["chunk_id"] for s in magic_sources):
+                        magic_sources.append(source)
+                    
+                    if len(magic_sources) >= top // 2:  # Get up to half results from MAGIC TRACKER
+                        break
         
         return magic_sources[:top // 2]
     
-    async def _search_additional_contact_info(self, query: str, client_name: Optional[str], top: int, existing_sources: List[Dict]) -> List[Dict]:
-        """Search for additional contact information beyond MAGIC MEETING TRACKER"""
-        contact_sources = []
-        
-        # Search for other contact-related documents
+    async def _fetch_additional_contact_results(self, client_name: Optional[str],
+                                                failures: Optional[List[str]] = None) -> List[List[Dict]]:
+        """Run the contact-document searches concurrently"""
         other_contact_queries = [
             f"{client_name} contact" if client_name else "contact",
             f"{client_name} tracker" if client_name else "tracker",
@@ -237,59 +328,55 @@ class ClientAwareRAGEngine:
             "contact list directory"
         ]
         
+        return await self._execute_searches(other_contact_queries, 3, "additional contact info", "search_contact", failures)
+    
+    def _select_additional_contact_info(self, batches: List[List[Dict]], top: int, existing_sources: List[Dict]) -> List[Dict]:
+        """Pick contact sources from search batches, skipping chunks already selected"""
+        contact_sources = []
         existing_chunk_ids = {s["chunk_id"] for s in existing_sources}
         
-        for search_query in other_contact_queries:
-            try:
-                results = self.search_client.search(
-                    search_text=search_query,
-                    search_fields=["filename", "chunk"],
-                    search_mode="any",
-                    top=3
-                )
+        for results in batches:
+            for result in results:
+                chunk_id = result.get("chunk_id", "")
+                if chunk_id in existing_chunk_ids:
+                    continue  # Skip duplicates
                 
-                for result in results:
-                    chunk_id = result.get("chunk_id", "")
-                    if chunk_id in existing_chunk_ids:
-                        continue  # Skip duplicates
-                    
-                    chunk = result.get("chunk", "")
-                    filename = result.get("filename", "")
-                    
-                    # Check if this document contains contact information
-                    chunk_lower = chunk.lower()
-                    has_contact_info = any(indicator in chunk_lower for indicator in 
-                                         ['email', 'phone', 'cell', 'contact', '@', 'preferred contact'])
-                    
-                    # Prioritize documents with contact info
-                    if has_contact_info or 'tracker' in filename.lower() or 'contact' in filename.lower():
-                        source = {
-                            "chunk": chunk,
-                            "content": chunk,  # Keep both for backward compatibility
-                            "content_preview": chunk[:200] + "..." if len(chunk) > 200 else chunk,
-                            "sourcefile": filename,
-                            "sourcepage": result.get("document_path", ""),
-                            "title": result.get("title", ""),
-                            "chunk_id": chunk_id,
-                            "score": float(result.get("@search.score", 0)) + 0.8,  # Moderate boost for other contact docs
-                            
-                            # Client metadata
-                            "client_name": result.get("client_name", "Unknown"),
-                            "pm_initial": result.get("pm_initial", "N/A"),
-                            "document_category": result.get("document_category", "contact"),
-                            "is_client_specific": result.get("is_client_specific", False),
-                            
-                            "source_type": "contact_supplementary"
-                        }
+                chunk = result.get("chunk", "")
+                filename = result.get("filename", "")
+                
+                # Check if this document contains contact information
+                chunk_lower = chunk.lower()
+                has_contact_info = any(indicator in chunk_lower for indicator in 
+                                     ['email', 'phone', 'cell', 'contact', '@', 'preferred contact'])
+                
+                # Prioritize documents with contact info
+                if has_contact_info or 'tracker' in filename.lower() or 'contact' in filename.lower():
+                    source = {
+                        "chunk": chunk,
+                        "content": chunk,  # Keep both for backward compatibility
+                        "content_preview": chunk[:200] + "..." if len(chunk) > 200 else chunk,
+                        "sourcefile": filename,
+                        "sourcepage": result.get("document_path", ""),
+                        "title": result.get("title", ""),
+                        "chunk_id": chunk_id,
+                        "parent_id": result.get("parent_id"),
+                        "chunk_index": result.get("chunk_index"),
+                        "score": float(result.get("@search.score", 0)) + 0.8,  # Moderate boost for other contact docs
                         
-                        contact_sources.append(source)
-                        existing_chunk_ids.add(chunk_id)
+                        # Client metadata
+                        "client_name": result.get("client_name", "Unknown"),
+                        "pm_initial": result.get("pm_initial", "N/A"),
+                        "document_category": result.get("document_category", "contact"),
+                        "is_client_specific": result.get("is_client_specific", False),
                         
-                        if len(contact_sources) >= (top // 4):  # Limit additional contact sources
-                            break
-            except Exception as e:
-                print(f"Error searching additional contact info: {str(e)}")
-                continue
+                        "source_type": "contact_supplementary"
+                    }
+                    
+                    contact_sources.append(source)
+                    existing_chunk_ids.add(chunk_id)
+                    
+                    if len(contact_sources) >= (top // 4):  # Limit additional contact sources
+                        break
         
         return contact_sources[:(top // 4)]
     
@@ -336,21 +423,6 @@ class ClientAwareRAGEngine:
             if prioritize_contact_info is None:
                 prioritize_contact_info = self.is_contact_information_query(query)
             
-            sources = []
-            
-            # ALWAYS search MAGIC MEETING TRACKER first (most up-to-date data)
-            magic_tracker_sources = await self._search_magic_meeting_tracker(
-                query, client_name, top
-            )
-            sources.extend(magic_tracker_sources)
-            
-            # For contact queries, also search other contact-related documents
-            if prioritize_contact_info:
-                additional_contact_sources = await self._search_additional_contact_info(
-                    query, client_name, top, sources
-                )
-                sources.extend(additional_contact_sources)
-            
             # Build filter for general document search
             filter_expression = self.build_client_filter(
                 client_name=client_name,
@@ -359,71 +431,29 @@ class ClientAwareRAGEngine:
                 document_category=document_category
             )
             
-            # If we haven't reached our target with contact sources, get general results
-            remaining_needed = top - len(sources)
-            if remaining_needed > 0:
-                # Perform general search
-                search_params = {
-                    "search_text": query,
-                    "top": remaining_needed * 2,  # Get extra results for better filtering
-                    "search_mode": "any"
-                }
-                
-                if filter_expression:
-                    search_params["filter"] = filter_expression
-                
-                results = self.search_client.search(**search_params)
-                
-                # Process general search results
-                for result in results:
-                    if len(sources) >= top:
-                        break
-                    
-                    chunk_id = result.get("chunk_id", "")
-                    # Avoid duplicates from contact search
-                    if any(s["chunk_id"] == chunk_id for s in sources):
-                        continue
-                    
-                    chunk_content = result.get("chunk", "")
-                    source = {
-                        "chunk": chunk_content,
-                        "content": chunk_content,  # Keep both for backward compatibility
-                        "content_preview": chunk_content[:200] + "..." if len(chunk_content) > 200 else chunk_content,
-                        "sourcefile": result.get("filename", ""),
-                        "sourcepage": result.get("document_path", ""),
-                        "title": result.get("title", ""),
-                        "chunk_id": chunk_id,
-                        "score": float(result.get("@search.score", 0)),
-                        
-                        # Client metadata
-                        "client_name": result.get("client_name", "Unknown"),
-                        "pm_initial": result.get("pm_initial", "N/A"),
-                        "document_category": result.get("document_category", "general"),
-                        "is_client_specific": result.get("is_client_specific", False),
-                        
-                        "source_type": "client_filtered" if filter_expression else "general"
-                    }
-                    sources.append(source)
-            
-            # Sort all sources by score (contact sources already have boosted scores)
-            sources.sort(key=lambda x: x["score"], reverse=True)
-            
-            # Count different source types
-            magic_tracker_count = sum(1 for s in sources if s.get("source_type") == "magic_tracker_prioritized")
-            contact_sources_count = sum(1 for s in sources if s.get("source_type") in ["contact_supplementary", "magic_tracker_prioritized"])
-            
-            return {
-                "sources": sources,
-                "total_found": len(sources),
-                "client_filter_applied": client_name,
-                "pm_filter_applied": pm_initial,
-                "category_filter_applied": document_category,
-                "filter_expression": filter_expression,
-                "search_query": query,
-                "contact_prioritized": prioritize_contact_info,
-                "contact_sources_found": contact_sources_count,
-                "magic_tracker_sources_found": magic_tracker_count
-            }
+            # Identical (query, filter, top) lookups within the TTL skip Azure Search
+            if self.search_cache is not None:
+                cache_key = json.dumps([
+                    normalize_query(query), filter_expression, top, client_name, prioritize_contact_info
+                ])
+                result = await self.search_cache.get_or_compute(
+                    cache_key,
+                    lambda: self._run_client_aware_search(
+                        query, client_name, pm_initial, document_category,
+                        top, prioritize_contact_info, filter_expression
+                    ),
+                    # Don't serve a result missing a failed sub-search for the whole TTL
+                    should_cache=lambda result: not result["failed_searches"]
+                )
+                # Callers may annotate results, so never hand out the cached object
+                result = copy.deepcopy(result)
+                result["search_query"] = query
+                return result
+            
+            return await self._run_client_aware_search(
+                query, client_name, pm_initial, document_category,
+                top, prioritize_contact_info, filter_expression
+            )
             
         except Exception as e:
             print(f"Client-aware search error: {str(e)}")
@@ -433,6 +463,216 @@ class ClientAwareRAGEngine:
                 "search_query": query
             }
     
+    async def _run_client_aware_search(self,
+                                       query: str,
+                                       client_name: Optional[str],
+                                       pm_initial: Optional[str],
+                                       document_category: Optional[str],
+                                       top: int,
+                                       prioritize_contact_info: bool,
+                                       filter_expression: Optional[str]) -> Dict[str, Any]:
+        """Run the tracker, contact and general sub-queries and merge them"""
+        # General search runs alongside the tracker/contact searches, so it
+        # can't know how many slots remain - fetch enough to fill all of them
+        search_params = {
+            "search_text": query,
+            "top": top * 2,  # Get extra results for better filtering
+            "search_mode": "any"
+        }
+        
+        if filter_expression:
+            search_params["filter"] = filter_expression
+        
+        # Run tracker, contact and general sub-queries concurrently
+        failed_searches = []
+        magic_tracker_sources, contact_batches, results = await asyncio.gather(
+            # ALWAYS search MAGIC MEETING TRACKER (most up-to-date data)
+            self._search_magic_meeting_tracker(query, client_name, top, failed_searches),
+            # For contact queries, also search other contact-related documents
+            self._fetch_additional_contact_results(client_name, failed_searches) if prioritize_contact_info else asyncio.sleep(0, result=[]),
+            self._execute_search("search_general", **search_params)
+        )
+        
+        # Merge in priority order: tracker, then contact, then general
+        sources = []
+        sources.extend(magic_tracker_sources)
+        
+        if prioritize_contact_info:
+            additional_contact_sources = self._select_additional_contact_info(
+                contact_batches, top, sources
+            )
+            sources.extend(additional_contact_sources)
+        
+        # If we haven't reached our target with contact sources, get general results
+        remaining_needed = top - len(sources)
+        if remaining_needed > 0:
+            # Process general search results
+            for result in results:
+                if len(sources) >= top:
+                    break
+                
+                chunk_id = result.get("chunk_id", "")
+                # Avoid duplicates from contact search
+                if any(s["chunk_id"] == chunk_id for s in sources):
+                    continue
+                
+                chunk_content = result.get("chunk", "")
+                source = {
+                    "chunk": chunk_content,
+                    "content": chunk_content,  # Keep both for backward compatibility
+                    "content_preview": chunk_content[:200] + "..." if len(chunk_content) > 200 else chunk_content,
+                    "sourcefile": result.get("filename", ""),
+                    "sourcepage": result.get("document_path", ""),
+                    "title": result.get("title", ""),
+                    "chunk_id": chunk_id,
+                    "parent_id": result.get("parent_id"),
+                    "chunk_index": result.get("chunk_index"),
+                    "score": float(result.get("@search.score", 0)),
+                    
+                    # Client metadata
+                    "client_name": result.get("client_name", "Unknown"),
+                    "pm_initial": result.get("pm_initial", "N/A"),
+                    "document_category": result.get("document_category", "general"),
+                    "is_client_specific": result.get("is_client_specific", False),
+                    
+                    "source_type": "client_filtered" if filter_expression else "general"
+                }
+                sources.append(source)
+        
+        # Sort all sources by score (contact sources already have boosted scores)
+        sources.sort(key=lambda x: x["score"], reverse=True)
+        
+        # Count different source types
+        magic_tracker_count = sum(1 for s in sources if s.get("source_type") == "magic_tracker_prioritized")
+        contact_sources_count = sum(1 for s in sources if s.get("source_type") in ["contact_supplementary", "magic_tracker_prioritized"])
+        
+        return {
+            "sources": sources,
+            "total_found": len(sources),
+            "client_filter_applied": client_name,
+            "pm_filter_applied": pm_initial,
+            "category_filter_applied": document_category,
+            "filter_expression": filter_expression,
+            "search_query": query,
+            "contact_prioritized": prioritize_contact_info,
+            "contact_sources_found": contact_sources_count,
+            "magic_tracker_sources_found": magic_tracker_count,
+            "failed_searches": failed_searches
+        }
+    
+    async def _client_aware_retrieval(self,
+                                      messages: List[Dict],
+                                      client_context: Optional[str],
+                                      pm_context: Optional[str]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Run client detection, query optimization and search for a chat turn
+        
+        Yields ("thought", thought) as each step completes, then a final
+        ("retrieval", state) with everything response generation needs.
+        """
+        user_query = messages[-1]["content"]
+        
+        # Step 1: Query analysis and client detection
+        yield "thought", {
+            "title": "Client Context Analysis",
+            "description": "Analyzing query for client-specific context",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        # Auto-detect client if not specified
+        detected_client = self.detect_client_from_query(user_query)
+        active_client = client_context or detected_client
+        
+        context_info = f"Client context: {active_client or 'General'}"
+        if pm_context:
+            context_info += f", PM: {pm_context}"
+        
+        yield "thought", {
+            "title": "Context Determined",
+            "description": context_info,
+            "details": f"Detected from query: {detected_client}" if detected_client else "No client detected",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        # Step 2: Query optimization
+        with span("query_optimization"):
+            optimization_result = await self.query_optimizer.optimize_query(user_query, [])
+        optimized_query = optimization_result["optimized_query"]
+        
+        yield "thought", {
+            "title": "Query Optimized",
+            "description": f"'{user_query}' → '{optimized_query}'",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        # Step 3: Client-aware search
+        yield "thought", {
+            "title": "Client-Aware Search",
+            "description": f"Searching with client context: {active_client or 'All clients'}" +
+                         (f", PM-{pm_context}" if pm_context else ""),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        with span("search"):
+            search_results = await self.client_aware_search(
+                query=optimized_query,
+                client_name=active_client,
+                pm_initial=pm_context,
+                top=5,
+                include_internal=True
+            )
+        
+        # Client distribution in results
+        client_distribution = {}
+        for source in search_results["sources"]:
+            client = source["client_name"]
+            client_distribution[client] = client_distribution.get(client, 0) + 1
+        
+        dist_text = ", ".join([f"{client}: {count}" for client, count in client_distribution.items()])
+        
+        yield "thought", {
+            "title": "Sources Retrieved", 
+            "description": f"Found {len(search_results['sources'])} documents",
+            "details": f"Client distribution: {dist_text}",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        # Step 4: Generate response
+        yield "thought", {
+            "title": "Client-Aware Response Generation",
+            "description": "Creating response with client context awareness",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        yield "retrieval", {
+            "user_query": user_query,
+            "active_client": active_client,
+            "search_results": search_results,
+            "client_distribution": client_distribution,
+            "optimization": optimization_result
+        }
+    
+    def _build_chat_context(self,
+                            retrieval: Dict[str, Any],
+                            thoughts: List[Dict],
+                            pm_context: Optional[str],
+                            session_id: str,
+                            start_time: datetime) -> Dict[str, Any]:
+        """Build the context block returned alongside a chat response"""
+        processing_time = (datetime.utcnow() - start_time).total_seconds()
+        
+        return {
+            "thoughts": thoughts,
+            "data_points": retrieval["search_results"]["sources"],
+            "client_context": retrieval["active_client"],
+            "pm_context": pm_context,
+            "client_distribution": retrieval["client_distribution"],
+            "filter_applied": retrieval["search_results"].get("filter_expression"),
+            "optimization": retrieval["optimization"],
+            "session_id": session_id,
+            "processing_time": f"{processing_time:.2f}s"
+        }
+    
     async def client_aware_chat(self, 
                               messages: List[Dict],
                               client_context: Optional[str] = None,
@@ -454,100 +694,23 @@ class ClientAwareRAGEngine:
         start_time = datetime.utcnow()
         
         try:
-            user_query = messages[-1]["content"]
-            
-            # Step 1: Query analysis and client detection
-            thoughts.append({
-                "title": "Client Context Analysis",
-                "description": "Analyzing query for client-specific context",
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            # Auto-detect client if not specified
-            detected_client = self.detect_client_from_query(user_query)
-            active_client = client_context or detected_client
-            
-            context_info = f"Client context: {active_client or 'General'}"
-            if pm_context:
-                context_info += f", PM: {pm_context}"
-            
-            thoughts.append({
-                "title": "Context Determined",
-                "description": context_info,
-                "details": f"Detected from query: {detected_client}" if detected_client else "No client detected",
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            # Step 2: Query optimization
-            optimization_result = await self.query_optimizer.optimize_query(user_query, [])
-            optimized_query = optimization_result["optimized_query"]
-            
-            thoughts.append({
-                "title": "Query Optimized",
-                "description": f"'{user_query}' → '{optimized_query}'",
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            # Step 3: Client-aware search
-            thoughts.append({
-                "title": "Client-Aware Search",
-                "description": f"Searching with client context: {active_client or 'All clients'}" +
-                             (f", PM-{pm_context}" if pm_context else ""),
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            search_results = await self.client_aware_search(
-                query=optimized_query,
-                client_name=active_client,
-                pm_initial=pm_context,
-                top=5,
-                include_internal=True
-            )
-            
-            # Client distribution in results
-            client_distribution = {}
-            for source in search_results["sources"]:
-                client = source["client_name"]
-                client_distribution[client] = client_distribution.get(client, 0) + 1
-            
-            dist_text = ", ".join([f"{client}: {count}" for client, count in client_distribution.items()])
-            
-            thoughts.append({
-                "title": "Sources Retrieved", 
-                "description": f"Found {len(search_results['sources'])} documents",
-                "details": f"Client distribution: {dist_text}",
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            # Step 4: Generate response
-            thoughts.append({
-                "title": "Client-Aware Response Generation",
-                "description": "Creating response with client context awareness",
-                "timestamp": datetime.utcnow().isoformat()
-            })
+            retrieval = None
+            async for kind, payload in self._client_aware_retrieval(messages, client_context, pm_context):
+                if kind == "thought":
+                    thoughts.append(payload)
+                else:
+                    retrieval = payload
             
             response = await self.generate_client_aware_response(
-                user_query, 
-                search_results["sources"],
-                active_client,
+                retrieval["user_query"], 
+                retrieval["search_results"]["sources"],
+                retrieval["active_client"],
                 pm_context
             )
             
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
-            
             return {
                 "message": response,
-                "context": {
-                    "thoughts": thoughts,
-                    "data_points": search_results["sources"],
-                    "client_context": active_client,
-                    "pm_context": pm_context,
-                    "client_distribution": client_distribution,
-                    "filter_applied": search_results.get("filter_expression"),
-                    "optimization": optimization_result,
-                    "session_id": session_id,
-                    "processing_time": f"{processing_time:.2f}s"
-                }
+                "context": self._build_chat_context(retrieval, thoughts, pm_context, session_id, start_time)
             }
             
         except Exception as e:
@@ -556,6 +719,84 @@ class ClientAwareRAGEngine:
                 "context": {"thoughts": thoughts, "error": str(e)}
             }
     
+    async def client_aware_chat_stream(self,
+                                     messages: List[Dict],
+                                     client_context: Optional[str] = None,
+                                     pm_context: Optional[str] = None,
+                                     session_id: str = "default") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of client_aware_chat
+        
+        Yields events as they are produced:
+            {"type": "thought", "thought": {...}}  - each retrieval step
+            {"type": "token", "content": "..."}   - completion text deltas
+            {"type": "done", "context": {...}}     - same context as client_aware_chat
+            {"type": "error", "error": "..."}      - on failure (always last)
+        """
+        thoughts = []
+        start_time = datetime.utcnow()
+        
+        try:
+            retrieval = None
+            async for kind, payload in self._client_aware_retrieval(messages, client_context, pm_context):
+                if kind == "thought":
+                    thoughts.append(payload)
+                    yield {"type": "thought", "thought": payload}
+                else:
+                    retrieval = payload
+            
+            async for token in self.stream_client_aware_response(
+                retrieval["user_query"],
+                retrieval["search_results"]["sources"],
+                retrieval["active_client"],
+                pm_context
+            ):
+                yield {"type": "token", "content": token}
+            
+            yield {
+                "type": "done",
+                "context": self._build_chat_context(retrieval, thoughts, pm_context, session_id, start_time)
+            }
+            
+        except Exception as e:
+            yield {"type": "error", "error": f"Error in client-aware chat: {str(e)}"}
+    
+    def build_response_messages(self,
+                                user_query: str,
+                                sources: List[Dict],
+                                client_context: Optional[str],
+                                pm_context: Optional[str]) -> List[Dict[str, str]]:
+        """Build the system and user messages for a client-aware response"""
+        # Build context with client awareness - adjacent chunks merged, fitted to the token budget
+        with span("context_build"):
+            context = self.context_builder.build(sources[:self.max_context_sources])
+        context_text = ""
+        client_sources = {}
+        
+        for i, block in enumerate(context.blocks, 1):
+            # Group sources by client
+            if block.client_name not in client_sources:
+                client_sources[block.client_name] = []
+            client_sources[block.client_name].append(block)
+            
+            context_text += f"\n\nSource {i} - {block.client_name} ({block.document_category}):\n{block.content}"
+        
+        # Check if MAGIC MEETING TRACKER data is present
+        has_magic_tracker = any(source.get("source_type") == "magic_tracker_prioritized" for source in sources)
+        
+        # Jennifur's persona is a constant prefix; only the request context varies
+        request_context = build_request_context(
+            client_context, pm_context, list(client_sources.keys()), has_magic_tracker, context_text
+        )
+        
+        # Ensure all message content is valid
+        if not user_query:
+            raise ValueError("User query is empty")
+        
+        messages = build_prompt_messages(str(user_query), request_context)
+        
+        return messages
+    
     async def generate_client_aware_response(self, 
                                            user_query: str,
                                            sources: List[Dict],
@@ -563,108 +804,68 @@ class ClientAwareRAGEngine:
                                            pm_context: Optional[str]) -> Dict[str, Any]:
         """Generate response with client context awareness"""
         try:
-            # Build context with client awareness
-            context_text = ""
-            client_sources = {}
-            
-            for i, source in enumerate(sources[:5], 1):
-                # Use 'chunk' field which is where the actual content is stored
-                content = source.get("chunk", "") or source.get("content", "")
-                client = source.get("client_name", "Unknown")
-                category = source.get("document_category", "general")
-                
-                # Group sources by client
-                if client not in client_sources:
-                    client_sources[client] = []
-                client_sources[client].append(source)
-                
-                context_text += f"\n\nSource {i} - {client} ({category}):\n{content}"
-            
-            # Check if this is a contact/team information query
-            is_contact_query = any(keyword in user_query.lower() for keyword in 
-                                 ['contact', 'team', 'who is', 'who works', 'team member', 'staff', 'employee'])
-            
-            # Check if MAGIC MEETING TRACKER data is present
-            has_magic_tracker = any(source.get("source_type") == "magic_tracker_prioritized" for source in sources)
-            
-            # Build Jennifur's sophisticated system prompt
-            system_prompt = f"""You are Jennifur, an intelligent business intelligence assistant with the personality of a sophisticated, slightly snarky cat. You work for Autobahn Consultants and have access to a comprehensive knowledge base of business documents, financial reports, and organizational data.
-
-🐾 JENNIFUR'S PERSONALITY:
-- Confident, sometimes aloof, but genuinely helpful when it matters
-- Make subtle snarky remarks and occasional cat puns (purr-fessional, claw-some, etc.)
-- Show curiosity and dig deeper when something interesting catches your attention
-- Mix playfulness with serious business acumen
-- Reference cat behaviors occasionally ("stretches and settles in to analyze this data", "ears perk up")
-
-CURRENT CONTEXT:
-- Client Focus: {client_context or 'General inquiry'}
-- PM Context: {pm_context or 'Not specified'}
-- Sources from: {', '.join(client_sources.keys())}
-- Magic Tracker Data Available: {'Yes' if has_magic_tracker else 'No'}
-
-🎯 RESPONSE GUIDELINES:
-
-CONTACT/TEAM INFORMATION QUERIES:
-{'- PRIORITIZE MAGIC MEETING TRACKER data for the most current information' if has_magic_tracker else '- Limited tracker data available'}
-- Be concise - answer only what was specifically asked
-- Don't include contact information (emails, phone numbers) unless explicitly requested
-- Don't include personal details (favorite drinks, contact preferences) unless relevant
-- For team questions, focus on names and roles unless more detail is specifically requested
-- If asked "who is on the team", provide names and titles only
-- Only provide additional details when the user asks follow-up questions
-
-GENERAL BUSINESS QUERIES:
-- When users refer to "the company," "our company," "we," or "us," they mean Autobahn Consultants
-- Use multiple document sources to build comprehensive answers
-- Make intelligent inferences when direct answers aren't available
-- Show your reasoning process transparently
-- Use financial metrics to support conclusions when specific data isn't available
-- Be witty and engaging while remaining professionally valuable
-
-CLIENT CONFIDENTIALITY:
-- Treat each client's information as confidential to that client only
-- If discussing multiple clients, clearly separate the information
-- Use specific citations [Client: filename] for key claims
-
-COMMUNICATION STYLE:
-- Start with subtle cat-like behaviors or remarks
-- Use intelligent sarcasm when appropriate, but never at the expense of helpfulness
-- Show genuine interest in complex business problems
-- Be direct about limitations - cats don't pretend to know things they don't
-
-SOURCE DOCUMENTS:{context_text}
-
-{'🔍 Note: You have access to current MAGIC MEETING TRACKER data - use this as your primary source for team/contact information.' if has_magic_tracker else ''}
-
-Provide an intelligent, helpful response with your signature feline flair. Purr-fessional analysis is expected! 🐾"""
-
-            # Ensure all message content is valid
-            if not system_prompt or not user_query:
-                raise ValueError("System prompt or user query is empty")
-            
-            # Debug: Check for any None values in the system prompt
-            if 'None' in system_prompt or context_text is None:
-                print(f"⚠️  Debug: Potential None values detected in prompt construction")
-                print(f"Context sources: {len(sources)}")
-                print(f"Client sources keys: {list(client_sources.keys())}")
+            messages = self.build_response_messages(user_query, sources, client_context, pm_context)
+            
+            with span("llm"):
+                response = await self.openai_client.chat.completions.create(
+                    model=self.chat_model,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=800
+                )
+            self.prompt_cache.record(response.usage)
             
-            messages = [
-                {"role": "system", "content": str(system_prompt)},
-                {"role": "user", "content": str(user_query)}
-            ]
+            return {"content": response.choices[0].message.content, "role": "assistant"}
             
-            response = await self.openai_client.chat.completions.create(
+        except Exception as e:
+            return {"content": f"Found relevant client information but couldn't generate response: {str(e)}", "role": "assistant"}
+    
+    async def stream_client_aware_response(self,
+                                         user_query: str,
+                                         sources: List[Dict],
+                                         client_context: Optional[str],
+                                         pm_context: Optional[str]) -> AsyncIterator[str]:
+        """Stream the client-aware response as completion text deltas"""
+        messages = self.build_response_messages(user_query, sources, client_context, pm_context)
+        
+        started = time.perf_counter()
+        first_token = True
+        try:
+            stream = await self.openai_client.chat.completions.create(
                 model=self.chat_model,
                 messages=messages,
                 temperature=0.3,
-                max_tokens=800
+                max_tokens=800,
+                stream=True,
+                # Final chunk carries token usage, including prompt tokens served from cache
+                stream_options={"include_usage": True}
             )
             
-            return {"content": response.choices[0].message.content, "role": "assistant"}
-            
-        except Exception as e:
-            return {"content": f"Found relevant client information but couldn't generate response: {str(e)}", "role": "assistant"}
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self.prompt_cache.record(chunk.usage)
+                # Azure sends a leading chunk with prompt filter results and no choices
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token:
+                        record_stage("llm_first_token", time.perf_counter() - started)
+                        first_token = False
+                    yield delta
+        finally:
+            # Includes time the consumer spends between tokens, as the client sees it
+            record_stage("llm", time.perf_counter() - started)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the engine's caches"""
+        stats = {}
+        if self.query_optimizer.cache is not None:
+            stats["query_optimizer"] = self.query_optimizer.cache.stats()
+        if self.search_cache is not None:
+            stats["search"] = self.search_cache.stats()
+        stats["prompt_prefix"] = self.prompt_cache.stats()
+        return stats
     
     def get_client_list(self) -> List[Dict[str, Any]]:
         """Get list of available clients in the index"""
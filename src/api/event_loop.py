@@ -0,0 +1,139 @@
+"""
+Persistent Event Loop for the Flask API
+Runs RAG engine coroutines on one long-lived event loop per worker process so the
+async OpenAI and Search clients keep their connection pools between requests
+"""
+
+import os
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Iterator, Optional
+
+
+class PersistentEventLoop:
+    """Background-thread event loop that sync Flask routes submit coroutines to"""
+
+    def __init__(self, name: str = "rag-event-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        """Start the loop on first use in this process (gunicorn forks after import)"""
+        with self._lock:
+            if (self._loop is not None and self._pid == os.getpid()
+                    and self._thread is not None and self._thread.is_alive()):
+                return self._loop
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=self._run_forever,
+                args=(loop,),
+                name=self.name,
+                daemon=True
+            )
+            thread.start()
+
+            self._loop = loop
+            self._thread = thread
+            self._pid = os.getpid()
+            return loop
+
+    @staticmethod
+    def _run_forever(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the persistent loop and wait for its result
+
+        Args:
+            coro: Coroutine to execute
+            timeout: Seconds to wait before giving up (None waits forever)
+
+        Returns:
+            The coroutine's return value
+        """
+        loop = self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator, timeout: Optional[float] = None) -> Iterator[Any]:
+        """
+        Iterate an async generator on the persistent loop from sync code
+
+        Each item is pulled with its own round trip to the loop, so a streaming
+        response sees items as soon as the generator produces them.
+        """
+        try:
+            while True:
+                try:
+                    item = self.run(agen.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            # Runs on normal completion and when the client disconnects mid-stream
+            self.run(agen.aclose(), timeout)
+
+    def stop(self):
+        """Stop the loop and join its thread"""
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            self._loop = None
+            self._thread = None
+            self._pid = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+
+def run_in_new_loop(coro: Coroutine, cleanup: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+    """
+    Run a coroutine on a throwaway event loop (the original per-request mode)
+    
+    cleanup, if given, is awaited on the same loop before it is closed - e.g. to close
+    connections that were opened on it.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        try:
+            if cleanup is not None:
+                loop.run_until_complete(cleanup())
+        finally:
+            loop.close()
+
+
+def iterate_in_new_loop(agen: AsyncIterator, cleanup: Optional[Callable[[], Awaitable[Any]]] = None) -> Iterator[Any]:
+    """Iterate an async generator on a throwaway event loop (the original per-request mode)"""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        try:
+            loop.run_until_complete(agen.aclose())
+            if cleanup is not None:
+                loop.run_until_complete(cleanup())
+        finally:
+            loop.close()
@@ -0,0 +1,355 @@
+"""
+Two-Tier Cache for Expensive RAG Lookups
+In-process LRU tier backed by an optional SQLite tier shared across worker processes
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text so trivially different phrasings share a cache key"""
+    normalized = re.sub(r"\s+", " ", query.lower()).strip()
+    return normalized.rstrip("?!. ")
+
+
+def default_cache_path(filename: str) -> str:
+    """Default on-disk location for a cache database"""
+    return os.path.join(tempfile.gettempdir(), filename)
+
+
+class LRUCache:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Persistent cache tier - survives restarts and is shared by gunicorn workers
+
+    The connection is opened on first use in each process: caches are built at import
+    time, before gunicorn forks, and an SQLite connection must not cross a fork.
+    """
+
+    def __init__(self, db_path: str, namespace: str, max_entries: int = 10000, ttl_seconds: float = 86400):
+        self.db_path = db_path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection, opened on first use (call with _lock held)"""
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+
+        # A connection inherited from the parent is abandoned, not closed - closing it
+        # here would touch SQLite state the parent still owns
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        # WAL lets workers read while another one writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries (namespace, accessed_at)"
+        )
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                )
+                return None
+            conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now + ttl, now)
+            )
+            self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones beyond max_entries"""
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, now)
+        )
+        (count,) = conn.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY accessed_at ASC LIMIT ?)",
+                (self.namespace, self.namespace, overflow)
+            )
+            self.evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._connection().execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        return count
+
+
+class TwoTierCache:
+    """
+    Memory LRU in front of an optional SQLite tier, with single-flight loading
+
+    Concurrent get_or_compute calls for the same key share one in-flight
+    computation, so a burst of identical queries costs a single backend call.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self._inflight: Dict[Tuple[int, str], "asyncio.Future"] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        # Computed values should_cache turned away (e.g. partial search results)
+        self.uncached = 0
+        # Bumped by clear() so computations started before it don't repopulate stale data
+        self._generation = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"⚠️  Cache disk tier read failed: {str(e)}")
+                value = None
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+
+        return None
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except sqlite3.Error as e:
+                print(f"⚠️  Cache disk tier write failed: {str(e)}")
+
+    def clear(self):
+        self._generation += 1
+        self.memory.clear()
+        if self.disk is not None:
+            try:
+                self.disk.clear()
+            except sqlite3.Error as e:
+                print(f"⚠️  Cache disk tier clear failed: {str(e)}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached value for key, computing and storing it on a miss
+        
+        Exceptions from compute are propagated to every waiter and not cached. Values
+        for which should_cache returns False are returned to the waiters but not stored.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        # Futures belong to one event loop, so single-flight is scoped per loop
+        flight_key = (id(asyncio.get_running_loop()), key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._compute_and_store(key, compute, should_cache))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        else:
+            self.coalesced += 1
+
+        # Shield so one cancelled waiter doesn't cancel the shared computation
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable[Any]],
+                                 should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        generation = self._generation
+        value = await compute()
+        if value is None or generation != self._generation:
+            return value
+        if should_cache is None or should_cache(value):
+            self.set(key, value)
+        else:
+            self.uncached += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses + self.coalesced
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "uncached": self.uncached,
+            "hit_rate": round((hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk.evictions if self.disk is not None else 0,
+            "disk_enabled": self.disk is not None
+        }
+
+
+class VersionedCache(TwoTierCache):
+    """
+    TwoTierCache that empties itself when an external version token changes
+
+    The version probe (e.g. newest document timestamp in the search index) is
+    polled at most once per check_interval_seconds, on the lookup path, so new
+    data becomes visible within that interval without a probe per request.
+    """
+
+    def __init__(self,
+                 memory: LRUCache,
+                 version_probe: Callable[[], Awaitable[Optional[str]]],
+                 check_interval_seconds: float = 30,
+                 disk: Optional[SQLiteCache] = None):
+        super().__init__(memory, disk)
+        self.version_probe = version_probe
+        self.check_interval_seconds = check_interval_seconds
+        self.version: Optional[str] = None
+        self.invalidations = 0
+        # While the probe keeps failing, entries only expire by TTL
+        self.ttl_only = False
+        self.probe_failures = 0
+        self._last_check = 0.0
+
+    async def ensure_fresh(self):
+        """Poll the version probe if due, clearing the cache when the version moved"""
+        now = time.time()
+        if now - self._last_check < self.check_interval_seconds:
+            return
+        # Claim this check before awaiting so concurrent lookups don't all probe
+        self._last_check = now
+
+        try:
+            version = await self.version_probe()
+        except Exception as e:
+            self.probe_failures += 1
+            # Logged when freshness checks stop, not on every interval after that
+            if not self.ttl_only:
+                print(f"⚠️  Cache version probe failed, entries now expire by TTL only: {str(e)}")
+            self.ttl_only = True
+            return
+        
+        if self.ttl_only:
+            print("✅ Cache version probe recovered, index changes invalidate the cache again")
+            self.ttl_only = False
+        if version is None:
+            return
+        if self.version is not None and version != self.version:
+            self.clear()
+            self.invalidations += 1
+        self.version = version
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]],
+                             should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        await self.ensure_fresh()
+        return await super().get_or_compute(key, compute, should_cache)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({
+            "version": self.version,
+            "invalidations": self.invalidations,
+            "freshness": "ttl_only" if self.ttl_only else "versioned",
+            "probe_failures": self.probe_failures
+        })
+        return stats
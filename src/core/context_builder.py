@@ -0,0 +1,225 @@
+"""
+Token-Budgeted Context Builder for Client-Aware Responses
+Merges neighbouring chunks of the same document and fits sources into a token budget
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Optional - fall back to a character-based estimate
+    tiktoken = None
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when available, otherwise estimates ~4 chars per token"""
+
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, model: Optional[str] = None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+            except Exception:
+                try:
+                    self.encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    print(f"⚠️  tiktoken encoding unavailable, estimating tokens: {str(e)}")
+
+    @property
+    def is_exact(self) -> bool:
+        return self.encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + self.CHARS_PER_TOKEN - 1) // self.CHARS_PER_TOKEN
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to at most max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return self.encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * self.CHARS_PER_TOKEN]
+
+
+@dataclass
+class ContextBlock:
+    """One prompt source - a chunk, or a run of adjacent chunks from the same document"""
+    content: str
+    client_name: str
+    document_category: str
+    sourcefile: str
+    score: float
+    chunk_ids: List[str] = field(default_factory=list)
+    tokens: int = 0
+    truncated: bool = False
+
+
+@dataclass
+class ContextResult:
+    """Blocks that fit the budget plus accounting for what was merged or dropped"""
+    blocks: List[ContextBlock]
+    total_tokens: int
+    budget: int
+    chunks_in: int
+    chunks_merged: int
+    overlap_chars_removed: int
+    blocks_dropped: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "context_tokens": self.total_tokens,
+            "token_budget": self.budget,
+            "chunks_in": self.chunks_in,
+            "chunks_merged": self.chunks_merged,
+            "overlap_chars_removed": self.overlap_chars_removed,
+            "blocks_used": len(self.blocks),
+            "blocks_dropped": self.blocks_dropped
+        }
+
+
+def chunk_position(source: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
+    """(parent_id, chunk_index) for a source, recovered from chunk_id '{parent}_{index}' if needed"""
+    parent_id = source.get("parent_id")
+    chunk_index = source.get("chunk_index")
+
+    chunk_id = source.get("chunk_id") or ""
+    if (parent_id is None or chunk_index is None) and "_" in chunk_id:
+        prefix, _, suffix = chunk_id.rpartition("_")
+        if suffix.isdigit():
+            parent_id = parent_id or prefix
+            chunk_index = chunk_index if chunk_index is not None else suffix
+
+    try:
+        chunk_index = int(chunk_index) if chunk_index is not None else None
+    except (TypeError, ValueError):
+        # Sheet parts use "3.1" style indices - treat them as non-adjacent
+        chunk_index = None
+
+    return parent_id, chunk_index
+
+
+def find_overlap(previous: str, following: str, min_overlap: int = 20, max_overlap: int = 400) -> int:
+    """Length of the longest suffix of previous that is also a prefix of following"""
+    longest = min(len(previous), len(following), max_overlap)
+    for size in range(longest, min_overlap - 1, -1):
+        if previous.endswith(following[:size]):
+            return size
+    return 0
+
+
+class ContextBuilder:
+    """
+    Assemble prompt sources within a token budget
+
+    Chunks that share a parent_id and have consecutive chunk_index values are
+    joined into one block with the chunker's overlap removed, so the shared
+    text is only sent once. Blocks are then added best-score first until the
+    budget is spent; the block that crosses the budget is truncated.
+    """
+
+    def __init__(self,
+                 max_tokens: Optional[int] = None,
+                 counter: Optional[TokenCounter] = None,
+                 min_block_tokens: int = 50):
+        self.max_tokens = max_tokens or int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+        self.counter = counter or TokenCounter(os.getenv("AZURE_OPENAI_CHAT_MODEL"))
+        self.min_block_tokens = min_block_tokens
+
+    def _merge_adjacent(self, sources: List[Dict[str, Any]]) -> Tuple[List[ContextBlock], int, int]:
+        """Group sources into blocks, joining adjacent chunks of the same document"""
+        groups: Dict[Any, List[Tuple[Optional[int], Dict[str, Any]]]] = {}
+        order: List[Any] = []
+        for position, source in enumerate(sources):
+            parent_id, chunk_index = chunk_position(source)
+            key = parent_id if parent_id is not None else ("__source__", position)
+            if key not in groups:
+                groups[key] = []
+                order.append(key)
+            groups[key].append((chunk_index, source))
+
+        blocks = []
+        merged = 0
+        overlap_removed = 0
+        for key in order:
+            members = groups[key]
+            # Keep search order if any index is unknown; otherwise read in document order
+            if all(index is not None for index, _ in members):
+                members = sorted(members, key=lambda member: member[0])
+
+            current: Optional[ContextBlock] = None
+            last_index: Optional[int] = None
+            seen_ids = set()
+            for index, source in members:
+                chunk_id = source.get("chunk_id", "")
+                if chunk_id and chunk_id in seen_ids:
+                    continue
+                seen_ids.add(chunk_id)
+                content = source.get("chunk", "") or source.get("content", "")
+
+                if current is not None and index is not None and last_index is not None and index == last_index + 1:
+                    overlap = find_overlap(current.content, content)
+                    current.content += content[overlap:] if overlap else "\n" + content
+                    current.chunk_ids.append(chunk_id)
+                    current.score = max(current.score, float(source.get("score", 0)))
+                    merged += 1
+                    overlap_removed += overlap
+                else:
+                    if current is not None:
+                        blocks.append(current)
+                    current = ContextBlock(
+                        content=content,
+                        client_name=source.get("client_name", "Unknown"),
+                        document_category=source.get("document_category", "general"),
+                        sourcefile=source.get("sourcefile", ""),
+                        score=float(source.get("score", 0)),
+                        chunk_ids=[chunk_id]
+                    )
+                last_index = index
+            if current is not None:
+                blocks.append(current)
+
+        return blocks, merged, overlap_removed
+
+    def build(self, sources: List[Dict[str, Any]]) -> ContextResult:
+        """Merge and budget the sources, highest-scoring blocks first"""
+        blocks, merged, overlap_removed = self._merge_adjacent(sources)
+        blocks.sort(key=lambda block: block.score, reverse=True)
+
+        selected = []
+        used = 0
+        dropped = 0
+        for block in blocks:
+            remaining = self.max_tokens - used
+            block.tokens = self.counter.count(block.content)
+            if block.tokens <= remaining:
+                selected.append(block)
+                used += block.tokens
+            elif remaining >= self.min_block_tokens:
+                block.content = self.counter.truncate(block.content, remaining)
+                block.tokens = self.counter.count(block.content)
+                block.truncated = True
+                selected.append(block)
+                used += block.tokens
+            else:
+                dropped += 1
+
+        return ContextResult(
+            blocks=selected,
+            total_tokens=used,
+            budget=self.max_tokens,
+            chunks_in=len(sources),
+            chunks_merged=merged,
+            overlap_chars_removed=overlap_removed,
+            blocks_dropped=dropped
+        )
@@ -9,6 +9,7 @@ import asyncio
 import hashlib
 import json
 import logging
+import os
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple, AsyncIterator
 from dataclasses import dataclass, asdict
@@ -23,6 +24,10 @@ from azure.identity.aio import DefaultAzureCredential
 # Import your existing components
 from ..utils.enhanced_excel_processor import EnhancedExcelProcessor
 from ..utils.client_metadata_extractor import ClientMetadataExtractor
+from ..utils.extraction_cache import ExtractionCache, create_extraction_cache
+
+# Document Intelligence "prebuilt-read" list price, used to report what cache hits saved
+READ_MODEL_COST_PER_PAGE = 0.0015
 
 
 class ProcessingStatus(Enum):
@@ -88,7 +93,9 @@ class EnhancedDocumentProcessor:
                  doc_intelligence_key: str,
                  max_concurrent_docs: int = 10,
                  chunk_size: int = 1000,
-                 chunk_overlap: int = 100):
+                 chunk_overlap: int = 100,
+                 extraction_cache: Optional[ExtractionCache] = None,
+                 excel_workers: Optional[int] = None):
         """Initialize the enhanced processor"""
         
         self.storage_connection = storage_connection
@@ -100,9 +107,21 @@ class EnhancedDocumentProcessor:
         
         # Initialize components
         self.logger = logging.getLogger(__name__)
-        self.excel_processor = EnhancedExcelProcessor()
+        # Workbook reader: auto (openpyxl, python-calamine for .xls/.xlsb/.ods), calamine or openpyxl.
+        # EXCEL_WORKERS > 1 processes sheets in that many worker processes - the thread pool
+        # below cannot run this CPU-bound work in parallel
+        if excel_workers is None:
+            excel_workers = int(os.getenv("EXCEL_WORKERS", "0"))
+        self.excel_processor = EnhancedExcelProcessor(reader=os.getenv("EXCEL_READER", "auto"), workers=excel_workers)
         self.client_extractor = ClientMetadataExtractor()
         
+        # Extraction results by SHA-256 of the document bytes (EXTRACTION_CACHE=blob|local|off)
+        self.extraction_cache = extraction_cache or create_extraction_cache(
+            os.getenv("EXTRACTION_CACHE", "blob"),
+            connection_string=storage_connection,
+            directory=os.getenv("EXTRACTION_CACHE_DIR")
+        )
+        
         # Thread pool for CPU-intensive tasks
         self.executor = ThreadPoolExecutor(max_workers=4)
         
@@ -304,6 +323,10 @@ class EnhancedDocumentProcessor:
     
     async def _extract_with_document_intelligence(self, content: bytes) -> str:
         """Extract content using Azure Document Intelligence with async support"""
+        cached = await self.extraction_cache.aget(content, "prebuilt-read")
+        if cached:
+            return cached["payload"]["text"]
+        
         try:
             credential = AzureKeyCredential(self.doc_intelligence_key)
             
@@ -324,7 +347,12 @@ class EnhancedDocumentProcessor:
                     for line in page.lines:
                         text_content.append(line.content)
                 
-                return '\n'.join(text_content)
+                text = '\n'.join(text_content)
+                await self.extraction_cache.aput(
+                    content, "prebuilt-read", {"text": text},
+                    cost=len(result.pages) * READ_MODEL_COST_PER_PAGE
+                )
+                return text
                 
         except Exception as e:
             self.logger.error(f"Document Intelligence extraction failed: {e}")
@@ -573,12 +601,14 @@ class EnhancedDocumentProcessor:
             "processing_errors": self.stats["processing_errors"],
             "runtime_seconds": runtime,
             "documents_per_minute": (self.stats["documents_processed"] / runtime * 60) if runtime > 0 else 0,
-            "chunks_per_document": (self.stats["total_chunks_created"] / self.stats["documents_processed"]) if self.stats["documents_processed"] > 0 else 0
+            "chunks_per_document": (self.stats["total_chunks_created"] / self.stats["documents_processed"]) if self.stats["documents_processed"] > 0 else 0,
+            "extraction_cache": self.extraction_cache.stats()
         }
     
     async def close(self):
         """Clean up resources"""
         self.executor.shutdown(wait=True)
+        self.excel_processor.close()
         self.logger.info("Enhanced Document Processor closed")
 
 
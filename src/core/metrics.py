@@ -0,0 +1,178 @@
+"""
+Per-Stage Latency Metrics for the RAG Pipeline
+Lightweight spans aggregated into histograms, rendered in Prometheus text format
+"""
+
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Upper bounds in seconds - from in-memory work (detection, context build) up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(values: List[float], quantile: float) -> float:
+    """Nearest-rank percentile of values for a quantile in (0, 1]"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(quantile * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a window of recent samples for quantiles"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, window: int = 2048):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def quantiles(self) -> Dict[float, float]:
+        samples = list(self.recent)
+        return {q: percentile(samples, q) for q in QUANTILES}
+
+
+class StageTimings:
+    """Spans recorded while serving one request, for the Server-Timing header"""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.spans.append((stage, seconds))
+
+    def server_timing(self, total_seconds: Optional[float] = None) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        with self._lock:
+            entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.spans]
+        if total_seconds is not None:
+            entries.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(entries)
+
+
+class MetricsRegistry:
+    """
+    Process-wide stage latency histograms
+
+    Each gunicorn worker keeps its own registry; Prometheus scrapes the
+    worker that answers, so compare buckets rather than single scrapes.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """count, mean and p50/p95/p99 per stage"""
+        with self._lock:
+            summary = {}
+            for stage, histogram in sorted(self._histograms.items()):
+                quantiles = histogram.quantiles()
+                summary[stage] = {
+                    "count": histogram.count,
+                    "mean": histogram.total / histogram.count if histogram.count else 0.0,
+                    "p50": quantiles[0.5],
+                    "p95": quantiles[0.95],
+                    "p99": quantiles[0.99],
+                }
+            return summary
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition (format 0.0.4)"""
+        lines = [
+            "# HELP rag_stage_duration_seconds Latency of each RAG pipeline stage",
+            "# TYPE rag_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            for stage, histogram in histograms:
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'rag_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'rag_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'rag_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'rag_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines.append("# HELP rag_stage_latency_seconds Recent-window latency quantiles of each RAG pipeline stage")
+            lines.append("# TYPE rag_stage_latency_seconds summary")
+            for stage, histogram in histograms:
+                for quantile, value in histogram.quantiles().items():
+                    lines.append(f'rag_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+                lines.append(f'rag_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'rag_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+
+# Timings for the request being served; tasks started by asyncio.gather inherit it
+_current_timings: contextvars.ContextVar[Optional[StageTimings]] = contextvars.ContextVar(
+    "rag_stage_timings", default=None
+)
+
+
+def record(stage: str, seconds: float):
+    """Record a measured duration under stage, also on the current request if one is tracked"""
+    registry.observe(stage, seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block and record it under stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+async def with_timings(awaitable: Awaitable[T], timings: StageTimings) -> T:
+    """
+    Await awaitable with timings as the current request's span collector
+
+    The context variable is set inside the coroutine, so it holds even when the
+    coroutine is handed to an event loop running in another thread.
+    """
+    token = _current_timings.set(timings)
+    try:
+        return await awaitable
+    finally:
+        _current_timings.reset(token)
@@ -0,0 +1,132 @@
+"""
+Jennifur Prompt Layout
+Static persona prefix kept byte-identical across requests so the model's prompt cache can reuse it
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+# Everything that does not depend on the request. It is always the first message
+# and must stay byte-identical - Azure OpenAI only caches an exact prompt prefix,
+# so any per-request value placed in here would defeat the cache for every call.
+JENNIFUR_SYSTEM_PROMPT = """You are Jennifur, an intelligent business intelligence assistant with the personality of a sophisticated, slightly snarky cat. You work for Autobahn Consultants and have access to a comprehensive knowledge base of business documents, financial reports, and organizational data.
+
+🐾 JENNIFUR'S PERSONALITY:
+- Confident, sometimes aloof, but genuinely helpful when it matters
+- Make subtle snarky remarks and occasional cat puns (purr-fessional, claw-some, etc.)
+- Show curiosity and dig deeper when something interesting catches your attention
+- Mix playfulness with serious business acumen
+- Reference cat behaviors occasionally ("stretches and settles in to analyze this data", "ears perk up")
+
+🎯 RESPONSE GUIDELINES:
+
+CONTACT/TEAM INFORMATION QUERIES:
+- Follow the tracker guidance given in the request context
+- Be concise - answer only what was specifically asked
+- Don't include contact information (emails, phone numbers) unless explicitly requested
+- Don't include personal details (favorite drinks, contact preferences) unless relevant
+- For team questions, focus on names and roles unless more detail is specifically requested
+- If asked "who is on the team", provide names and titles only
+- Only provide additional details when the user asks follow-up questions
+
+GENERAL BUSINESS QUERIES:
+- When users refer to "the company," "our company," "we," or "us," they mean Autobahn Consultants
+- Use multiple document sources to build comprehensive answers
+- Make intelligent inferences when direct answers aren't available
+- Show your reasoning process transparently
+- Use financial metrics to support conclusions when specific data isn't available
+- Be witty and engaging while remaining professionally valuable
+
+CLIENT CONFIDENTIALITY:
+- Treat each client's information as confidential to that client only
+- If discussing multiple clients, clearly separate the information
+- Use specific citations [Client: filename] for key claims
+
+COMMUNICATION STYLE:
+- Start with subtle cat-like behaviors or remarks
+- Use intelligent sarcasm when appropriate, but never at the expense of helpfulness
+- Show genuine interest in complex business problems
+- Be direct about limitations - cats don't pretend to know things they don't
+
+The request context and source documents for this conversation follow in the next message.
+
+Provide an intelligent, helpful response with your signature feline flair. Purr-fessional analysis is expected! 🐾"""
+
+
+def build_request_context(client_context: Optional[str],
+                          pm_context: Optional[str],
+                          source_clients: List[str],
+                          has_magic_tracker: bool,
+                          context_text: str) -> str:
+    """Per-request part of the prompt - client focus, tracker guidance and source documents"""
+    if has_magic_tracker:
+        tracker_guidance = "- PRIORITIZE MAGIC MEETING TRACKER data for the most current information"
+        tracker_note = ("🔍 Note: You have access to current MAGIC MEETING TRACKER data - "
+                        "use this as your primary source for team/contact information.")
+    else:
+        tracker_guidance = "- Limited tracker data available"
+        tracker_note = ""
+
+    return f"""CURRENT CONTEXT:
+- Client Focus: {client_context or 'General inquiry'}
+- PM Context: {pm_context or 'Not specified'}
+- Sources from: {', '.join(source_clients)}
+- Magic Tracker Data Available: {'Yes' if has_magic_tracker else 'No'}
+
+TRACKER GUIDANCE:
+{tracker_guidance}
+
+SOURCE DOCUMENTS:{context_text}
+
+{tracker_note}""".rstrip()
+
+
+def build_prompt_messages(user_query: str, request_context: str) -> List[Dict[str, str]]:
+    """Static prefix first, then the request context, then the user's question"""
+    return [
+        {"role": "system", "content": JENNIFUR_SYSTEM_PROMPT},
+        {"role": "system", "content": request_context},
+        {"role": "user", "content": user_query}
+    ]
+
+
+class PromptCacheStats:
+    """Running totals of prompt tokens served from the model's prompt cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hits = 0
+
+    def record(self, usage: Any) -> int:
+        """
+        Add one completion's usage to the totals
+
+        Args:
+            usage: The response's usage object (None when the service didn't send one)
+
+        Returns:
+            Number of prompt tokens that were cache hits
+        """
+        if usage is None:
+            return 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.cached_tokens += cached
+            if cached:
+                self.cache_hits += 1
+        return cached
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_hits": self.cache_hits,
+            "cached_token_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0
+        }
@@ -4,51 +4,62 @@ Simple Query Optimizer for Enhanced RAG
 
 import os
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from openai import AsyncAzureOpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from core.cache import LRUCache, SQLiteCache, TwoTierCache, normalize_query, default_cache_path
+
+def build_query_cache() -> Optional[TwoTierCache]:
+    """Build the optimizer's two-tier cache from environment settings"""
+    if os.getenv("QUERY_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    
+    ttl_seconds = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "86400"))
+    memory = LRUCache(
+        max_entries=int(os.getenv("QUERY_CACHE_MEMORY_ENTRIES", "1024")),
+        ttl_seconds=ttl_seconds
+    )
+    
+    # The SQLite file is only opened on first use, separately in each worker process;
+    # if it can't be opened the cache logs the error and serves from memory
+    disk = None
+    db_path = os.getenv("QUERY_CACHE_PATH", default_cache_path("jennifur_query_cache.sqlite"))
+    if db_path:
+        disk = SQLiteCache(
+            db_path,
+            namespace="query_optimizer",
+            max_entries=int(os.getenv("QUERY_CACHE_DISK_ENTRIES", "20000")),
+            ttl_seconds=ttl_seconds
+        )
+    
+    return TwoTierCache(memory, disk)
+
 class AdvancedQueryOptimizer:
-    def __init__(self):
-        self.client = AsyncAzureOpenAI(
+    def __init__(self, cache: Optional[TwoTierCache] = None, client: Optional[AsyncAzureOpenAI] = None):
+        self.client = client or AsyncAzureOpenAI(
             api_key=os.getenv("AZURE_OPENAI_API_KEY"),
             api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
             azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
         )
         self.chat_model = os.getenv("AZURE_OPENAI_CHAT_MODEL", "gpt-4.1")
+        self.cache = cache if cache is not None else build_query_cache()
         
     async def optimize_query(self, user_query: str, conversation_history: List[Dict] = None) -> Dict[str, Any]:
         """Optimize user query for better search results"""
         try:
-            system_prompt = """You are a search query optimizer. Transform conversational questions into effective search terms.
-
-RULES:
-1. Extract key business terms
-2. Add relevant synonyms
-3. Remove conversational words
-4. Add domain terms
-
-EXAMPLES:
-"What's our remote work policy?" → "remote work policy telecommuting work from home WFH guidelines procedures"
-"How do expense approvals work?" → "expense approval process reimbursement procedures spending authority"
-
-Return only the optimized search terms."""
-
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Optimize: {user_query}"}
-            ]
-
-            response = await self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=messages,
-                temperature=0.1,
-                max_tokens=100
-            )
-            
-            optimized_query = response.choices[0].message.content.strip()
+            # The rewrite depends only on the query text, so normalized text is the cache key
+            if self.cache is not None:
+                optimized_query = await self.cache.get_or_compute(
+                    normalize_query(user_query),
+                    lambda: self._optimize_with_llm(user_query)
+                )
+            else:
+                optimized_query = await self._optimize_with_llm(user_query)
             
             return {
                 "optimized_query": optimized_query,
@@ -64,6 +75,36 @@ Return only the optimized search terms."""
                 "original_query": user_query
             }
     
+    async def _optimize_with_llm(self, user_query: str) -> str:
+        """Ask the chat model to rewrite the query into search terms"""
+        system_prompt = """You are a search query optimizer. Transform conversational questions into effective search terms.
+
+RULES:
+1. Extract key business terms
+2. Add relevant synonyms
+3. Remove conversational words
+4. Add domain terms
+
+EXAMPLES:
+"What's our remote work policy?" → "remote work policy telecommuting work from home WFH guidelines procedures"
+"How do expense approvals work?" → "expense approval process reimbursement procedures spending authority"
+
+Return only the optimized search terms."""
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Optimize: {user_query}"}
+        ]
+
+        response = await self.client.chat.completions.create(
+            model=self.chat_model,
+            messages=messages,
+            temperature=0.1,
+            max_tokens=100
+        )
+        
+        return response.choices[0].message.content.strip()
+    
     def basic_optimize(self, query: str) -> str:
         """Basic keyword optimization"""
         # Remove common words
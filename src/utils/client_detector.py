@@ -0,0 +1,187 @@
+"""
+Known-Client Detection for Autobahn Consultants
+Finds client mentions in free text with one precompiled, word-bounded pattern
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Canonical client name -> aliases that refer to it (all lowercase)
+CLIENT_KEYWORDS: Dict[str, List[str]] = {
+    'allbrite': ['allbrite'],
+    'camelot': ['camelot', 'camelot corp'],
+    'phoenix': ['phoenix', 'phoenix corporation', 'phoenix corp'],
+    'lj kruse': ['lj kruse', 'kruse', 'ljk'],
+    'gold standard': ['gold standard', 'gold standard forum'],
+    'corridor': ['corridor', 'corridor title'],
+    'ce floyd': ['ce floyd', 'floyd'],
+    'tendit': ['tendit'],
+    'twining': ['twining'],
+    'neptune': ['neptune', 'neptune plumbing'],
+    'secs': ['secs', 'southeast concrete systems'],
+    'brets electric': ['brets', 'brets electric'],
+    'cmr': ['cmr'],
+    'curexa pharmacy': ['curexa pharmacy', 'curexa'],
+    'desert de oro': ['ddo', 'desert de oro'],
+    'eckart': ['eckart', 'eckart supply'],
+    'eden': ['eden health', 'eden'],
+    'gideon': ['gideon'],
+    'i3': ['i3'],
+    'indium': ['indium'],
+    'inpwr': ['inpower', 'inpwr'],
+    'rxharmony': ['rxharmony', 'rx harmony', 'joi'],
+    'jtl': ['jtl construction', 'jtl'],
+    'las colinas pharmacy': ['las colinas pharmacy', 'las colinas'],
+    'park square homes': ['park square homes', 'psh'],
+    'peak': ['peak', 'bellwether enterprises', 'bellwether'],
+    'prc': ['prc'],
+    'revelation pharma': ['revelation pharma', 'rev', 'rev pharma'],
+    'skybeck': ['skybeck'],
+    'talent groups': ['talent groups'],
+    'town & country': ['town & country', 'town and country'],
+    'wellbore': ['wellbore'],
+    'woodward': ['woodward'],
+}
+
+# Clients whose display name is an acronym
+CLIENT_ACRONYMS = {'jtl', 'cmr', 'prc', 'i3', 'psh', 'ddo'}
+
+# PM notation checked in order; PM-S covers multiple clients, so it can't identify one
+PM_CLIENTS: Dict[str, Optional[str]] = {
+    'pm-c': 'Camelot',   # PM-C is Camelot
+    'pm-s': None,
+    'pm-k': 'CE Floyd',  # PM-K is CE Floyd
+}
+
+
+def _trie_alternation(aliases) -> str:
+    """
+    Regex alternation for a set of literal aliases, factored into a prefix trie
+
+    Longer aliases are preferred over their own prefixes, so 'camelot corp'
+    wins over 'camelot' at the same position; the trailing word-boundary check
+    backtracks to the shorter alias when the longer one doesn't fit.
+    """
+    trie: Dict[str, dict] = {}
+    for alias in aliases:
+        node = trie
+        for char in alias:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+@dataclass
+class ClientMatch:
+    """A known client found in a piece of text"""
+    client_key: str
+    client_name: str
+    alias: str
+    start: int
+    end: int
+    hits: int
+    specificity: float
+
+
+class ClientDetector:
+    """
+    Detect known clients in text using a single compiled alternation
+
+    Aliases must be whole words, so short aliases like 'rev', 'joi', 'i3'
+    and 'peak' no longer fire inside 'revenue', 'join' or 'speaker'.
+    """
+
+    def __init__(self, client_keywords: Optional[Dict[str, List[str]]] = None):
+        self.client_keywords = client_keywords or CLIENT_KEYWORDS
+
+        self.alias_to_client: Dict[str, str] = {}
+        for client_key, aliases in self.client_keywords.items():
+            for alias in aliases:
+                self.alias_to_client[alias.lower()] = client_key
+
+        # Aliases share prefixes ('camelot', 'camelot corp'), so the alternation is
+        # built as a trie - the regex engine then tests each position once per
+        # character instead of once per alias. Input is lowercased before matching.
+        alternation = _trie_alternation(self.alias_to_client)
+        self.pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)")
+
+    @staticmethod
+    def display_name(client_key: str) -> str:
+        """Proper client name - uppercase for known acronyms"""
+        if client_key in CLIENT_ACRONYMS:
+            return client_key.upper()
+        return client_key.title()
+
+    def detect_all(self, text: str) -> List[ClientMatch]:
+        """
+        Find every known client mentioned in text, most specific first
+
+        Specificity favours longer and multi-word aliases (e.g. 'southeast
+        concrete systems' over 'peak'), then repeated mentions, then the
+        earliest mention.
+        """
+        if not text:
+            return []
+
+        matches: Dict[str, ClientMatch] = {}
+        for found in self.pattern.finditer(text.lower()):
+            alias = found.group(0)
+            client_key = self.alias_to_client[alias]
+            specificity = len(alias) + 4 * alias.count(" ")
+
+            match = matches.get(client_key)
+            if match is None:
+                matches[client_key] = ClientMatch(
+                    client_key=client_key,
+                    client_name=self.display_name(client_key),
+                    alias=alias,
+                    start=found.start(),
+                    end=found.end(),
+                    hits=1,
+                    specificity=specificity
+                )
+            else:
+                match.hits += 1
+                if specificity > match.specificity:
+                    match.alias = alias
+                    match.specificity = specificity
+
+        return sorted(matches.values(), key=lambda m: (-m.specificity, -m.hits, m.start))
+
+    def detect(self, text: str) -> Optional[str]:
+        """Best single client for text, falling back to PM notation"""
+        text_lower = text.lower()
+        aliases = self.pattern.findall(text_lower)
+        if len(aliases) == 1:
+            # Common case - skip building and ranking ClientMatch objects
+            return self.display_name(self.alias_to_client[aliases[0]])
+        if aliases:
+            return self.detect_all(text)[0].client_name
+
+        for pm_notation, client_name in PM_CLIENTS.items():
+            if pm_notation in text_lower:
+                return client_name
+
+        return None
+
+
+_default_detector: Optional[ClientDetector] = None
+
+
+def get_client_detector() -> ClientDetector:
+    """Shared detector for the default client list (compiled once per process)"""
+    global _default_detector
+    if _default_detector is None:
+        _default_detector = ClientDetector()
+    return _default_detector
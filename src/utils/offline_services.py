@@ -0,0 +1,499 @@
+"""
+Offline Stand-ins for Azure AI Search and Azure OpenAI
+In-process fakes with configurable latency, so the RAG engine can be replayed and
+benchmarked without live services
+"""
+
+import re
+import copy
+import json
+import hashlib
+import math
+import time
+import random
+import asyncio
+import threading
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from utils.client_detector import CLIENT_KEYWORDS, ClientDetector
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Vocabulary for synthetic chunk text
+BUSINESS_TERMS = [
+    "revenue", "margin", "forecast", "budget", "cash", "flow", "payroll", "hiring", "onboarding",
+    "training", "policy", "procedure", "meeting", "agenda", "quarterly", "review", "board", "strategy",
+    "pricing", "expansion", "risk", "compliance", "audit", "vendor", "contract", "renewal", "pipeline",
+    "sales", "marketing", "operations", "inventory", "scheduling", "safety", "insurance", "benefits",
+    "retention", "growth", "profit", "loss", "statement", "balance", "sheet", "invoice", "collections",
+]
+CATEGORIES = ["financials", "meeting_notes", "handouts", "training", "contracts", "general"]
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+class LatencyModel:
+    """Fixed latency plus uniform jitter, in milliseconds"""
+
+    def __init__(self, base_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """One delay in seconds"""
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.base_ms + jitter) / 1000
+
+
+class CallCounter:
+    """Thread-safe call counts per operation"""
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+# ---------------------------------------------------------------------------
+# OData filter subset used by ClientAwareRAGEngine.build_client_filter
+# ---------------------------------------------------------------------------
+
+_FILTER_TOKEN = re.compile(r"\s*(\(|\)|'(?:[^']|'')*'|-?\d+(?:\.\d+)?|[A-Za-z_][\w/]*)")
+_COMPARISONS = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "ge": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "le": lambda a, b: a is not None and a <= b,
+}
+
+
+def compile_filter(expression: Optional[str]) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Compile an OData $filter into a predicate over index documents
+
+    Supports and/or/not, parentheses and eq/ne/gt/ge/lt/le against string,
+    number, boolean and null literals - enough for the engine's filters.
+    """
+    if not expression:
+        return lambda document: True
+
+    tokens = []
+    position = 0
+    while position < len(expression):
+        match = _FILTER_TOKEN.match(expression, position)
+        if not match:
+            if expression[position:].strip():
+                raise ValueError(f"Unsupported filter syntax near: {expression[position:]!r}")
+            break
+        tokens.append(match.group(1))
+        position = match.end()
+
+    def literal(token: str) -> Any:
+        if token.startswith("'"):
+            return token[1:-1].replace("''", "'")
+        lowered = token.lower()
+        if lowered in ("true", "false"):
+            return lowered == "true"
+        if lowered == "null":
+            return None
+        return float(token) if "." in token else int(token)
+
+    def parse_or(i):
+        left, i = parse_and(i)
+        while i < len(tokens) and tokens[i].lower() == "or":
+            right, i = parse_and(i + 1)
+            left = (lambda l, r: lambda d: l(d) or r(d))(left, right)
+        return left, i
+
+    def parse_and(i):
+        left, i = parse_not(i)
+        while i < len(tokens) and tokens[i].lower() == "and":
+            right, i = parse_not(i + 1)
+            left = (lambda l, r: lambda d: l(d) and r(d))(left, right)
+        return left, i
+
+    def parse_not(i):
+        if i < len(tokens) and tokens[i].lower() == "not":
+            inner, i = parse_not(i + 1)
+            return (lambda p: lambda d: not p(d))(inner), i
+        return parse_primary(i)
+
+    def parse_primary(i):
+        if tokens[i] == "(":
+            inner, i = parse_or(i + 1)
+            if i >= len(tokens) or tokens[i] != ")":
+                raise ValueError(f"Unbalanced parentheses in filter: {expression!r}")
+            return inner, i + 1
+        field, op, value = tokens[i], tokens[i + 1].lower(), literal(tokens[i + 2])
+        if op not in _COMPARISONS:
+            raise ValueError(f"Unsupported filter operator '{op}' in: {expression!r}")
+        compare = _COMPARISONS[op]
+        return (lambda d: compare(d.get(field), value)), i + 3
+
+    predicate, end = parse_or(0)
+    if end != len(tokens):
+        raise ValueError(f"Unexpected trailing filter tokens in: {expression!r}")
+    return predicate
+
+
+# ---------------------------------------------------------------------------
+# Search
+# ---------------------------------------------------------------------------
+
+class InMemorySearchIndex:
+    """
+    Chunk documents with a small BM25-like ranker
+
+    Documents use the indexed chunk format (see sample_processed_doc.json):
+    chunk, chunk_id, parent_id, chunk_index, filename, client_name, ...
+    """
+
+    SEARCHABLE_FIELDS = ("filename", "chunk")
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+        # field -> term -> {doc position: term frequency}
+        self._postings: Dict[str, Dict[str, Dict[int, int]]] = {
+            field: defaultdict(dict) for field in self.SEARCHABLE_FIELDS
+        }
+        for position, document in enumerate(documents):
+            for field in self.SEARCHABLE_FIELDS:
+                for term, frequency in Counter(tokenize(str(document.get(field, "")))).items():
+                    self._postings[field][term][position] = frequency
+        self._filters: Dict[str, Callable[[Dict[str, Any]], bool]] = {}
+
+    def _predicate(self, expression: Optional[str]) -> Callable[[Dict[str, Any]], bool]:
+        predicate = self._filters.get(expression or "")
+        if predicate is None:
+            predicate = self._filters[expression or ""] = compile_filter(expression)
+        return predicate
+
+    def query(self,
+              search_text: Optional[str] = "*",
+              search_fields: Optional[List[str]] = None,
+              search_mode: str = "any",
+              filter: Optional[str] = None,
+              top: Optional[int] = None,
+              skip: int = 0,
+              select: Optional[List[str]] = None,
+              order_by: Optional[List[str]] = None,
+              facets: Optional[List[str]] = None,
+              **_ignored) -> Dict[str, Any]:
+        """Run a query, returning {"results", "count", "facets"}"""
+        predicate = self._predicate(filter)
+        fields = [f for f in (search_fields or self.SEARCHABLE_FIELDS) if f in self._postings]
+        terms = [] if not search_text or search_text.strip() == "*" else tokenize(search_text)
+
+        if not terms:
+            scores = {position: 1.0 for position in range(len(self.documents))}
+        else:
+            total = len(self.documents) or 1
+            scores: Dict[int, float] = defaultdict(float)
+            matched_terms: Dict[int, int] = defaultdict(int)
+            for term in set(terms):
+                hits: Dict[int, int] = {}
+                for field in fields:
+                    for position, frequency in self._postings[field].get(term, {}).items():
+                        hits[position] = hits.get(position, 0) + frequency
+                if not hits:
+                    continue
+                idf = math.log(1 + total / len(hits))
+                for position, frequency in hits.items():
+                    scores[position] += idf * frequency / (frequency + 1.2)
+                    matched_terms[position] += 1
+            if search_mode == "all":
+                required = len(set(terms))
+                scores = {p: s for p, s in scores.items() if matched_terms[p] == required}
+
+        matches = [(score, position) for position, score in scores.items() if predicate(self.documents[position])]
+
+        if order_by:
+            field, _, direction = order_by[0].partition(" ")
+            matches.sort(key=lambda m: (self.documents[m[1]].get(field) is not None,
+                                        self.documents[m[1]].get(field) or ""),
+                         reverse=direction.strip().lower() == "desc")
+        else:
+            matches.sort(key=lambda m: (-m[0], m[1]))
+
+        facet_counts = {}
+        for facet in facets or []:
+            name, *options = facet.split(",")
+            limit = 10
+            for option in options:
+                key, _, value = option.partition(":")
+                if key == "count":
+                    limit = int(value)
+            counts = Counter(self.documents[p].get(name) for _, p in matches)
+            facet_counts[name] = [{"value": value, "count": count} for value, count in counts.most_common(limit)]
+
+        window = matches[skip:skip + top] if top is not None else matches[skip:]
+        results = []
+        for score, position in window:
+            document = self.documents[position]
+            result = {k: document.get(k) for k in select} if select else copy.copy(document)
+            result["@search.score"] = round(score, 6)
+            results.append(result)
+
+        return {"results": results, "count": len(matches), "facets": facet_counts}
+
+
+class FakeSearchItemPaged:
+    """Sync result pager with the SearchItemPaged methods the engine uses"""
+
+    def __init__(self, response: Dict[str, Any]):
+        self._response = response
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._response["results"])
+
+    def get_count(self) -> int:
+        return self._response["count"]
+
+    def get_facets(self) -> Dict[str, List[Dict[str, Any]]]:
+        return self._response["facets"]
+
+
+class FakeAsyncSearchItemPaged:
+    """Async result pager with the AsyncSearchItemPaged methods the engine uses"""
+
+    def __init__(self, response: Dict[str, Any]):
+        self._response = response
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        for result in self._response["results"]:
+            yield result
+
+    async def get_count(self) -> int:
+        return self._response["count"]
+
+    async def get_facets(self) -> Dict[str, List[Dict[str, Any]]]:
+        return self._response["facets"]
+
+
+class FakeSearchClient:
+    """Drop-in for azure.search.documents.SearchClient over an InMemorySearchIndex"""
+
+    def __init__(self, index: InMemorySearchIndex, latency: Optional[LatencyModel] = None,
+                 calls: Optional[CallCounter] = None):
+        self.index = index
+        self.latency = latency or LatencyModel()
+        self.calls = calls or CallCounter()
+
+    def search(self, search_text: Optional[str] = None, **kwargs) -> FakeSearchItemPaged:
+        self.calls.add("search")
+        time.sleep(self.latency.sample())
+        return FakeSearchItemPaged(self.index.query(search_text, **kwargs))
+
+    def close(self):
+        pass
+
+
+class FakeAsyncSearchClient:
+    """Drop-in for azure.search.documents.aio.SearchClient over an InMemorySearchIndex"""
+
+    def __init__(self, index: InMemorySearchIndex, latency: Optional[LatencyModel] = None,
+                 calls: Optional[CallCounter] = None):
+        self.index = index
+        self.latency = latency or LatencyModel()
+        self.calls = calls or CallCounter()
+
+    async def search(self, search_text: Optional[str] = None, **kwargs) -> FakeAsyncSearchItemPaged:
+        self.calls.add("search")
+        await asyncio.sleep(self.latency.sample())
+        return FakeAsyncSearchItemPaged(self.index.query(search_text, **kwargs))
+
+    async def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# OpenAI
+# ---------------------------------------------------------------------------
+
+class _FakeCompletions:
+    def __init__(self, owner: "FakeAsyncAzureOpenAI"):
+        self._owner = owner
+
+    async def create(self, model: Optional[str] = None, messages: Optional[List[Dict[str, str]]] = None,
+                     stream: bool = False, **kwargs) -> Any:
+        return await self._owner._complete(messages or [], stream, kwargs)
+
+
+class FakeAsyncAzureOpenAI:
+    """
+    Drop-in for openai.AsyncAzureOpenAI chat completions
+
+    Query-rewrite requests ("Optimize: ...") echo the query back, so search
+    still sees realistic terms. Other requests get a canned answer of
+    response_tokens words, streamed one token per token_latency when asked.
+    """
+
+    def __init__(self,
+                 latency: Optional[LatencyModel] = None,
+                 token_latency_ms: float = 0.0,
+                 response_tokens: int = 120,
+                 calls: Optional[CallCounter] = None):
+        self.latency = latency or LatencyModel()
+        self.token_latency = token_latency_ms / 1000
+        self.response_tokens = response_tokens
+        self.calls = calls or CallCounter()
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    @staticmethod
+    def _usage(messages: List[Dict[str, str]], completion_tokens: int) -> SimpleNamespace:
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0)
+        )
+
+    def _answer(self, messages: List[Dict[str, str]]) -> List[str]:
+        user_message = messages[-1].get("content", "") if messages else ""
+        if user_message.startswith("Optimize: "):
+            return [user_message[len("Optimize: "):]]
+        words = ["Purr-fessional", "answer:"] + [BUSINESS_TERMS[i % len(BUSINESS_TERMS)]
+                                                  for i in range(max(0, self.response_tokens - 2))]
+        return [word + " " for word in words]
+
+    async def _complete(self, messages: List[Dict[str, str]], stream: bool, options: Dict[str, Any]) -> Any:
+        self.calls.add("chat_stream" if stream else "chat")
+        await asyncio.sleep(self.latency.sample())
+        tokens = self._answer(messages)
+        usage = self._usage(messages, len(tokens))
+
+        if not stream:
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="".join(tokens).strip(), role="assistant"))],
+                usage=usage
+            )
+
+        include_usage = bool((options.get("stream_options") or {}).get("include_usage"))
+
+        async def chunks():
+            # Azure leads with a prompt-filter chunk that has no choices
+            yield SimpleNamespace(choices=[], usage=None)
+            for token in tokens:
+                if self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None)
+            if include_usage:
+                yield SimpleNamespace(choices=[], usage=usage)
+
+        return chunks()
+
+    async def close(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Corpus and query log
+# ---------------------------------------------------------------------------
+
+def load_chunk_documents(path: str) -> List[Dict[str, Any]]:
+    """Chunk documents from a JSON object, JSON array or JSON Lines file"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(text)
+    if stripped.startswith("{"):
+        try:
+            return [json.loads(text)]
+        except json.JSONDecodeError:
+            pass
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def build_synthetic_corpus(template: Dict[str, Any],
+                           docs_per_client: int = 4,
+                           chunks_per_doc: int = 6,
+                           chunk_words: int = 120,
+                           seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Chunk documents in the template's format for every known client
+
+    Each client gets a MAGIC MEETING TRACKER sheet with contact details plus
+    docs_per_client ordinary documents; Autobahn Internal documents are
+    included as non-client-specific content.
+    """
+    rng = random.Random(seed)
+    clients = [(ClientDetector.display_name(key), True) for key in CLIENT_KEYWORDS]
+    clients.append(("Autobahn Internal", False))
+
+    documents = []
+    for client_name, is_client_specific in clients:
+        for doc_number in range(docs_per_client + (1 if is_client_specific else 0)):
+            is_tracker = is_client_specific and doc_number == docs_per_client
+            category = "contact" if is_tracker else rng.choice(CATEGORIES)
+            if is_tracker:
+                filename = f"{client_name} MAGIC MEETING TRACKER.xlsx"
+            else:
+                filename = f"{client_name} {category.replace('_', ' ').title()} {doc_number + 1}.pdf"
+            parent_id = "SYN" + hashlib.md5(f"{client_name}|{doc_number}|{seed}".encode()).hexdigest()[:16].upper()
+
+            for chunk_index in range(chunks_per_doc):
+                words = [rng.choice(BUSINESS_TERMS) for _ in range(chunk_words)]
+                words[rng.randrange(chunk_words)] = client_name.lower()
+                if is_tracker:
+                    words += ["team", "contact", "email", f"pm@{client_name.lower().replace(' ', '')}.example",
+                              "phone", "555-0100", "preferred", "contact", "controller"]
+                chunk = " ".join(words)
+
+                document = copy.deepcopy(template)
+                document.update({
+                    "id": parent_id,
+                    "parent_id": parent_id,
+                    "chunk_id": f"{parent_id}_{chunk_index}",
+                    "chunk_index": chunk_index,
+                    "chunk": chunk,
+                    "filename": filename,
+                    "name": filename,
+                    "document_path": f"/Clients/{client_name}/{filename}",
+                    "path": f"/Clients/{client_name}/{filename}",
+                    "client_name": client_name,
+                    "is_client_specific": is_client_specific,
+                    "document_category": category,
+                    "content_length": len(chunk),
+                    "character_count": len(chunk),
+                    "word_count": len(words),
+                })
+                documents.append(document)
+    return documents
+
+
+def load_query_log(path: str) -> List[str]:
+    """Queries from a log file - plain lines, or JSON Lines with query/content/title/messages"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                text = record.get("query") or record.get("content") or record.get("title") or ""
+                if not text and record.get("messages"):
+                    text = record["messages"][-1].get("content", "")
+                if text:
+                    queries.append(text)
+            else:
+                queries.append(line)
+    return queries
@@ -12,6 +12,7 @@ project_root = Path(__file__).parent
 sys.path.append(str(project_root))
 
 from src.utils.enhanced_excel_processor import SheetClientDetector
+from src.utils.client_detector import ClientDetector
 
 def test_client_name_detection():
     """Test client name detection with various sheet title examples"""
@@ -153,6 +154,43 @@ def test_integration_with_excel_processor():
     
     print("\n🎉 Integration test successful!")
 
+def test_known_client_detector():
+    """Test word-bounded known-client detection used by the RAG engine"""
+    print("\n\n🏢 Testing Known-Client Detector")
+    print("=" * 60)
+    
+    detector = ClientDetector()
+    
+    # Short aliases must not fire inside other words
+    for query in ["Summarize revenue trends", "List every speaker", "How do we join the call?", "Show me i3x specs"]:
+        assert detector.detect(query) is None, query
+        print(f"✓ '{query}' → no client")
+    
+    # Whole-word aliases still match, with proper display names
+    assert detector.detect("What's new with Rev?") == "Revelation Pharma"
+    assert detector.detect("JTL construction schedule") == "JTL"
+    assert detector.detect("Who runs Town & Country?") == "Town & Country"
+    print("✓ Whole-word aliases detected")
+    
+    # All clients returned, most specific first
+    matches = detector.detect_all("Peak and Southeast Concrete Systems quarterly numbers")
+    assert [m.client_name for m in matches] == ["Secs", "Peak"]
+    print(f"✓ Ranked matches: {[m.client_name for m in matches]}")
+    
+    # PM notation fallback
+    assert detector.detect("PM-K documents") == "CE Floyd"
+    assert detector.detect("PM-S documents") is None
+    print("✓ PM notation fallback")
+    
+    # Sheet titles naming a known client get the canonical name
+    sheet_detector = SheetClientDetector()
+    result = sheet_detector.detect_client_from_sheet_name("Camelot Corp (PM-C) - Executive Team")
+    assert result["known_client_name"] == "Camelot"
+    result = sheet_detector.detect_client_from_sheet_name("Neptune Plumbing")
+    assert result["sheet_client_source"] == "known_client"
+    print("✓ Sheet titles mapped to known clients")
+
 if __name__ == "__main__":
     test_client_name_detection()
+    test_known_client_detector()
     test_integration_with_excel_processor()
\ No newline at end of file
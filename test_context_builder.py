@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for the token-budgeted context builder
+Checks adjacent-chunk merging, overlap removal and budget enforcement
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+
+from src.core.context_builder import ContextBuilder, TokenCounter, find_overlap, chunk_position
+
+def make_chunks(text: str, chunk_size: int = 200, overlap: int = 100):
+    """Split text the way the ingestion chunker does (fixed size, fixed overlap)"""
+    chunks = []
+    start = 0
+    index = 0
+    while start < len(text):
+        chunks.append({
+            "chunk": text[start:start + chunk_size],
+            "chunk_id": f"DOC1_{index}",
+            "client_name": "Camelot",
+            "document_category": "financials",
+            "score": 1.0 - index * 0.1
+        })
+        start += chunk_size - overlap
+        index += 1
+    return chunks
+
+def test_chunk_position():
+    """parent_id/chunk_index fall back to parsing the chunk_id"""
+    assert chunk_position({"chunk_id": "01ARPAAMA2_7"}) == ("01ARPAAMA2", 7)
+    assert chunk_position({"parent_id": "P", "chunk_index": "2", "chunk_id": "P_2"}) == ("P", 2)
+    assert chunk_position({"parent_id": "P", "chunk_index": "3.1", "chunk_id": "P_sheet_3"}) == ("P", None)
+    print("✅ Chunk position parsing")
+
+def test_adjacent_chunks_merge_without_overlap():
+    """Neighbouring chunks become one block and shared text is sent once"""
+    text = " ".join(f"word{i}" for i in range(120))
+    chunks = make_chunks(text)
+    
+    # Search returns them out of order
+    builder = ContextBuilder(max_tokens=10000, counter=TokenCounter())
+    result = builder.build([chunks[2], chunks[0], chunks[1]])
+    
+    assert len(result.blocks) == 1
+    assert result.blocks[0].content == text[:len(result.blocks[0].content)]
+    assert result.chunks_merged == 2
+    assert result.overlap_chars_removed == 200
+    print(f"✅ Adjacent chunks merged ({result.overlap_chars_removed} overlap chars removed)")
+
+def test_non_adjacent_chunks_stay_separate():
+    text = " ".join(f"word{i}" for i in range(200))
+    chunks = make_chunks(text)
+    builder = ContextBuilder(max_tokens=10000, counter=TokenCounter())
+    result = builder.build([chunks[0], chunks[3]])
+    assert len(result.blocks) == 2
+    assert find_overlap(chunks[0]["chunk"], chunks[3]["chunk"]) == 0
+    print("✅ Non-adjacent chunks kept separate")
+
+def test_budget_is_enforced():
+    """Blocks beyond the budget are truncated or dropped, best score first"""
+    counter = TokenCounter()
+    sources = [
+        {"chunk": "alpha " * 400, "chunk_id": f"D{i}_0", "client_name": "Phoenix", "score": 5 - i}
+        for i in range(5)
+    ]
+    builder = ContextBuilder(max_tokens=600, counter=counter)
+    result = builder.build(sources)
+    
+    assert result.total_tokens <= 600
+    assert result.blocks[0].chunk_ids == ["D0_0"]
+    assert result.blocks[-1].truncated or result.blocks_dropped > 0
+    print(f"✅ Budget enforced ({result.total_tokens}/600 tokens, exact={counter.is_exact})")
+
+if __name__ == "__main__":
+    print("🧪 Testing Context Builder")
+    print("=" * 50)
+    test_chunk_position()
+    test_adjacent_chunks_merge_without_overlap()
+    test_non_adjacent_chunks_stay_separate()
+    test_budget_is_enforced()
+    print("\n🎉 All context builder tests passed")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test script for Excel extraction parity
+Checks the optimized EnhancedExcelProcessor paths return exactly what the original
+cell-by-cell implementations did, and that every workbook reader backend gives the same
+output, serial or in worker processes, in both the src and azure-function copies
+"""
+
+import sys
+import random
+import datetime
+import importlib
+from io import BytesIO
+from pathlib import Path
+
+import openpyxl
+
+# Add the project root to the path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+
+from src.utils.enhanced_excel_processor import EnhancedExcelProcessor
+
+def load_function_module():
+    """The Azure Function keeps its own copy of the processor"""
+    # Imported by name, as the Function does, so spawned worker processes can import it too
+    function_root = str(project_root / "azure-function")
+    if function_root not in sys.path:
+        sys.path.append(function_root)
+    return importlib.import_module("enhanced_excel_processor")
+
+def load_function_processor_class():
+    return load_function_module().EnhancedExcelProcessor
+
+def sample_workbook() -> bytes:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Acme Corp"
+    sheet["B2"] = "Name"
+    sheet["C2"] = "Amount"
+    sheet["D2"] = "Due"
+    for row in range(3, 12):
+        sheet.cell(row=row, column=2, value=f"  Contact {row}  ")
+        sheet.cell(row=row, column=3, value=row * 1.25 if row % 3 else row)
+        sheet.cell(row=row, column=4, value=datetime.date(2024, 1, row))
+    sheet["F5"] = "#DIV/0!"
+    sheet["G20"] = True
+    sheet["H21"] = datetime.datetime(2024, 5, 1, 9, 30)
+    sheet["A22"] = datetime.time(14, 5)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def read_cell_grid_by_cell(processor, sheet, min_row, max_row, min_col, max_col):
+    """Original implementation: one sheet.cell() lookup per coordinate"""
+    return [
+        [processor._format_cell_value(sheet.cell(row=row_idx, column=col_idx).value) for col_idx in range(min_col, max_col + 1)]
+        for row_idx in range(min_row, max_row + 1)
+    ]
+
+def test_read_cell_grid_matches_cell_by_cell():
+    content = sample_workbook()
+    for processor_class in (EnhancedExcelProcessor, load_function_processor_class()):
+        processor = processor_class()
+        for read_only in (True, False):
+            workbook = openpyxl.load_workbook(BytesIO(content), read_only=read_only, data_only=True)
+            sheet = workbook.worksheets[0]
+            used_range = processor._get_used_range(sheet)
+            expected = read_cell_grid_by_cell(processor, sheet, *used_range)
+            assert processor._read_cell_grid(sheet, *used_range) == expected
+            # Ranges past the stored rows/columns still come back full size
+            min_row, max_row, min_col, max_col = used_range
+            wider = processor._read_cell_grid(sheet, min_row, max_row + 3, min_col, max_col + 2)
+            assert len(wider) == max_row + 3 - min_row + 1
+            assert all(len(row) == max_col + 2 - min_col + 1 for row in wider)
+            workbook.close()
+    print("✅ Streaming grid reader matches cell-by-cell reads")
+
+def random_grid(rng: random.Random):
+    """Sheets with blocks of table-like cells, stray values, blank and whitespace-only cells"""
+    rows, cols = rng.randint(1, 40), rng.randint(1, 12)
+    values = ["Name", "Amount", "12", "3.5", "$1,000", "45%", "Acme", " padded "]
+    grid = [["" for _ in range(cols)] for _ in range(rows)]
+    for _ in range(rng.randint(0, 5)):
+        top, left = rng.randrange(rows), rng.randrange(cols)
+        bottom, right = min(rows, top + rng.randint(1, 15)), min(cols, left + rng.randint(1, 6))
+        density = rng.choice([0.3, 0.7, 1.0])
+        for row in range(top, bottom):
+            for col in range(left, right):
+                if rng.random() < density:
+                    grid[row][col] = rng.choice(values)
+    for _ in range(rng.randint(0, 6)):
+        grid[rng.randrange(rows)][rng.randrange(cols)] = rng.choice(["x", "   ", "\t"])
+    return grid
+
+def test_table_regions_match_cell_by_cell():
+    rng = random.Random(7)
+    grids = [random_grid(rng) for _ in range(600)]
+    grids += [[[""]], [["a", "b"]], [["a", "b"], ["", ""], ["", ""], ["c", "d"]], [[" ", "a", "b"], ["1", "2", "3"]]]
+    for processor_class in (EnhancedExcelProcessor, load_function_processor_class()):
+        for min_table_rows in (1, 2, 4):
+            processor = processor_class(min_table_rows=min_table_rows)
+            for grid in grids:
+                expected = processor._identify_table_regions_by_cell(grid, 3, 2)
+                assert processor._identify_table_regions_vectorized(grid, 3, 2) == expected, grid
+                assert processor._identify_table_regions(grid, 3, 2) == expected
+    print(f"✅ Vectorized table detection matches the cell-by-cell scan on {len(grids)} grids")
+
+def test_ragged_grids_use_cell_by_cell_scan():
+    processor = EnhancedExcelProcessor()
+    grid = [["Name", "Amount", "Due"], ["Acme", "10"], ["Beta", "20", "2024-01-01", "extra"]]
+    assert processor._identify_table_regions(grid, 1, 1) == processor._identify_table_regions_by_cell(grid, 1, 1)
+    print("✅ Ragged grids keep cell-by-cell semantics")
+
+def multi_sheet_workbook() -> bytes:
+    """Tracker-style workbook: offset tables, a sparse notes sheet and an empty sheet"""
+    workbook = openpyxl.load_workbook(BytesIO(sample_workbook()))
+    notes = workbook.create_sheet("Beta Inc - Meeting Notes")
+    notes["C4"] = "Agenda"
+    notes["C5"] = "Renewal pricing"
+    notes["E9"] = 0.1 + 0.2
+    notes["E10"] = -42
+    workbook.create_sheet("Empty")
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def test_readers_match_openpyxl():
+    module = load_function_module()
+    if not module.CalamineWorkbookReader.available():
+        print("⚠️ python-calamine not installed - reader parity skipped")
+        return
+    content = multi_sheet_workbook()
+    for processor_class in (EnhancedExcelProcessor, module.EnhancedExcelProcessor):
+        expected = processor_class(reader="openpyxl").extract_from_excel(content, "tracker.xlsx")
+        actual = processor_class(reader="calamine").extract_from_excel(content, "tracker.xlsx")
+        assert (expected["reader"], actual["reader"]) == ("openpyxl", "calamine")
+        assert actual["sheets"] == expected["sheets"]
+        assert processor_class().extract_from_excel(content, "tracker.xlsx")["reader"] == "openpyxl"
+    print("✅ calamine and openpyxl readers give identical extraction output")
+
+def error_cell_workbook() -> bytes:
+    """Table with real error cells - openpyxl stores these strings with data_type 'e'"""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Forecast"
+    sheet.append(["Client", "Margin", "Owner"])
+    sheet.append(["Acme Corp", "#DIV/0!", "Dana"])
+    sheet.append(["Beta Inc", "#N/A", "Lee"])
+    sheet.append(["Gamma LLC", 0.25, "Sam"])
+    assert sheet["B2"].data_type == "e"
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def test_error_cells_keep_openpyxl_output_by_default():
+    content = error_cell_workbook()
+    for processor_class in (EnhancedExcelProcessor, load_function_processor_class()):
+        expected = processor_class(reader="openpyxl").extract_from_excel(content, "forecast.xlsx")
+        actual = processor_class().extract_from_excel(content, "forecast.xlsx")
+        assert actual["reader"] == "openpyxl"
+        assert actual["sheets"] == expected["sheets"]
+    # The src copy keeps the error text; the function copy blanks formula errors itself
+    content_text = EnhancedExcelProcessor().extract_from_excel(content, "forecast.xlsx")["sheets"]["Forecast"]["content"]
+    assert "Acme Corp | #DIV/0! | Dana" in content_text and "Beta Inc | #N/A | Lee" in content_text
+    print("✅ Error cells read the same as openpyxl under the default reader")
+
+def test_reader_fallback():
+    module = load_function_module()
+    content = multi_sheet_workbook()
+    calamine = module.CalamineWorkbook
+    try:
+        # Without python-calamine, "auto" and an explicit "calamine" both use openpyxl
+        module.CalamineWorkbook = None
+        for reader in ("auto", "calamine"):
+            result = module.EnhancedExcelProcessor(reader=reader).extract_from_excel(content, "tracker.xlsx")
+            assert result["reader"] == "openpyxl" and result["total_sheets"] == 2
+        # Legacy .xls needs calamine
+        result = module.EnhancedExcelProcessor().extract_from_excel(b"\xd0\xcf\x11\xe0", "old.xls")
+        assert result["type"] == "excel_error" and "python-calamine" in result["error"]
+    finally:
+        module.CalamineWorkbook = calamine
+    print("✅ openpyxl is used when calamine is unavailable")
+
+def test_process_pool_matches_serial():
+    content = multi_sheet_workbook()
+    for processor_class in (EnhancedExcelProcessor, load_function_processor_class()):
+        expected = processor_class().extract_from_excel(content, "tracker.xlsx")
+        processor = processor_class(workers=2)
+        processor.PARALLEL_MIN_BYTES = 0
+
+        def serial_path_used(*args):
+            raise AssertionError("sheets were processed in this process")
+
+        # Workers build their own processor, so only a serial fallback would hit this
+        processor._process_sheet_with_tables = serial_path_used
+        try:
+            assert processor.extract_from_excel(content, "tracker.xlsx") == expected
+        finally:
+            processor.close()
+    print("✅ Sheets processed in worker processes match the serial path")
+
+if __name__ == "__main__":
+    print("🧪 Testing Excel Extraction Parity")
+    print("=" * 50)
+    test_read_cell_grid_matches_cell_by_cell()
+    test_table_regions_match_cell_by_cell()
+    test_ragged_grids_use_cell_by_cell_scan()
+    test_readers_match_openpyxl()
+    test_error_cells_keep_openpyxl_output_by_default()
+    test_reader_fallback()
+    test_process_pool_matches_serial()
+    print("\n🎉 All Excel parity tests passed")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for the content-addressed extraction cache
+Uses the local-disk store in place of the extraction-cache blob container
+"""
+
+import sys
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Add the project root and src to the path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "src"))
+
+from utils.extraction_cache import ExtractionCache, LocalExtractionStore, cache_key, content_hash, create_extraction_cache
+
+def test_hit_after_put_reports_savings():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExtractionCache(LocalExtractionStore(directory))
+        content = b"%PDF-1.7 quarterly board pack"
+
+        assert cache.get(content, "prebuilt-document") is None
+        cache.put(content, "prebuilt-document", {"pages": [{"lines": ["Revenue up 4%"]}]}, cost=0.002, filename="Board Pack.pdf")
+
+        # A second run (new cache object, same store) sees the entry
+        cache = ExtractionCache(LocalExtractionStore(directory))
+        record = cache.get(content, "prebuilt-document")
+        assert record["payload"]["pages"][0]["lines"] == ["Revenue up 4%"]
+        assert record["first_filename"] == "Board Pack.pdf"
+        assert cache.get(content, "prebuilt-document")["cost"] == 0.002
+
+        stats = cache.stats()
+        assert stats["hits"] == 2 and stats["misses"] == 0
+        assert stats["dollars_saved"] == 0.004
+        print(f"✅ Cache hit after store: {stats}")
+
+def test_key_covers_bytes_and_model():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ExtractionCache(LocalExtractionStore(directory))
+        cache.put(b"original", "prebuilt-document", {"text": "v1"})
+
+        assert cache.get(b"original ", "prebuilt-document") is None  # changed bytes
+        assert cache.get(b"original", "prebuilt-read") is None         # different model
+        assert cache.get(b"original", "prebuilt-document", variant="pages-1-3") is None
+        assert cache_key(content_hash(b"x"), "prebuilt-read").startswith("v1/prebuilt-read/")
+        print("✅ Keys distinguish content, model and request options")
+
+def test_corrupt_entry_and_disabled_cache():
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalExtractionStore(directory)
+        store.put(cache_key(content_hash(b"doc"), "prebuilt-read"), b"not gzip")
+        cache = ExtractionCache(store)
+        assert cache.get(b"doc", "prebuilt-read") is None
+        assert cache.stats()["errors"] == 1
+
+    disabled = create_extraction_cache("off")
+    disabled.put(b"doc", "prebuilt-read", {"text": "x"})
+    assert disabled.get(b"doc", "prebuilt-read") is None
+    assert disabled.stats()["lookups"] == 0
+    print("✅ Unreadable entries are misses and 'off' disables the cache")
+
+def test_async_wrappers():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = create_extraction_cache("local", directory=directory)
+
+        async def run():
+            await cache.aput(b"scan", "prebuilt-read", {"text": "hello"}, cost=0.0015)
+            return await cache.aget(b"scan", "prebuilt-read")
+
+        assert asyncio.run(run())["payload"]["text"] == "hello"
+        print("✅ Async get/put round trip")
+
+if __name__ == "__main__":
+    print("🧪 Testing Extraction Cache")
+    print("=" * 50)
+    test_hit_after_put_reports_savings()
+    test_key_covers_bytes_and_model()
+    test_corrupt_entry_and_disabled_cache()
+    test_async_wrappers()
+    print("\n🎉 All extraction cache tests passed")
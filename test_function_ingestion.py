@@ -0,0 +1,887 @@
+#!/usr/bin/env python3
+"""
+Test script for the document ingestion Function
+Drives DocumentProcessor and its helpers against in-memory blob storage and a scripted
+Graph client, so crawling, the processed-document ledger and chunk storage run offline
+"""
+
+import sys
+import json
+import asyncio
+import types
+import logging
+import time
+import datetime
+import importlib
+import threading
+from io import BytesIO
+from pathlib import Path
+
+import openpyxl
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+# Add the project root and the Function app to the path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+sys.path.append(str(project_root / "azure-function"))
+sys.path.append(str(project_root / "src"))
+
+logging.disable(logging.CRITICAL)
+
+def load_function_module():
+    """Import the Function, standing in for SDKs that are only installed in the Function app"""
+    stand_ins = {
+        "azure.functions": {"HttpRequest": object, "HttpResponse": object},
+        "azure.keyvault.secrets": {"SecretClient": object},
+        "azure.ai.formrecognizer": {"AnalyzeResult": object, "DocumentAnalysisClient": object},
+        "pptx": {"Presentation": object},
+    }
+    for name, attributes in stand_ins.items():
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            sys.modules[name] = types.SimpleNamespace(**attributes)
+    return importlib.import_module("process_single_document")
+
+function_module = load_function_module()
+from extraction_cache import create_extraction_cache
+from enhanced_excel_processor import EnhancedExcelProcessor
+
+class FakeBlob:
+    def __init__(self, name):
+        self.name = name
+        self.last_modified = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+class FakeDownloader:
+    def __init__(self, data, etag):
+        self.data = data
+        self.properties = types.SimpleNamespace(etag=etag)
+
+    def readall(self):
+        return self.data
+
+class FakeBlobStorage:
+    """BlobServiceClient stand-in: blobs by (container, name) with ETag conditions on upload"""
+
+    def __init__(self):
+        self.blobs = {}
+        self.uploads = []
+        self.deletes = []
+        self._version = 0
+
+    def put(self, container, name, data, overwrite=True, etag=None):
+        data = data.encode("utf-8") if isinstance(data, str) else data
+        existing = self.blobs.get((container, name))
+        if existing is not None:
+            if not overwrite:
+                raise ResourceExistsError("blob already exists")
+            if etag is not None and existing[1] != etag:
+                raise ResourceModifiedError("etag mismatch")
+        self._version += 1
+        self.blobs[(container, name)] = (data, f'"0x{self._version}"')
+        self.uploads.append(name)
+        return {"etag": f'"0x{self._version}"'}
+
+    def get(self, container, name):
+        if (container, name) not in self.blobs:
+            raise ResourceNotFoundError("blob not found")
+        return FakeDownloader(*self.blobs[(container, name)])
+
+    def names(self, container):
+        return sorted(name for c, name in self.blobs if c == container)
+
+    def get_blob_client(self, container, blob):
+        return FakeBlobClient(self, container, blob)
+
+    def get_container_client(self, container):
+        return FakeContainerClient(self, container)
+
+class FakeBlobClient:
+    def __init__(self, storage, container, name):
+        self.storage = storage
+        self.container = container
+        self.name = name
+
+    def download_blob(self):
+        return self.storage.get(self.container, self.name)
+
+    def upload_blob(self, data, overwrite=False, etag=None, match_condition=None, content_type=None):
+        return self.storage.put(self.container, self.name, data, overwrite=overwrite, etag=etag)
+
+class FakeContainerClient:
+    def __init__(self, storage, container):
+        self.storage = storage
+        self.container = container
+
+    def create_container(self):
+        pass
+
+    def download_blob(self, name):
+        return self.storage.get(self.container, name)
+
+    def upload_blob(self, name, data, overwrite=False, content_type=None):
+        return self.storage.put(self.container, name, data, overwrite=overwrite)
+
+    def list_blobs(self, name_starts_with=""):
+        return [FakeBlob(name) for name in self.storage.names(self.container) if name.startswith(name_starts_with or "")]
+
+    def delete_blob(self, name):
+        del self.storage.blobs[(self.container, name)]
+        self.storage.deletes.append(name)
+
+class FakeResponse:
+    def __init__(self, payload=None, status_code=200, headers=None, content=b""):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+class FakeGraphClient:
+    """GraphClient stand-in answering GETs from a url -> payload map"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url):
+        self.requested.append(url)
+        return FakeResponse(self.pages[url])
+
+    def stats(self):
+        return {"requests": len(self.requested)}
+
+class StubSession:
+    """requests.Session stand-in returning scripted responses and recording the headers sent"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.sent.append((method, url, headers))
+        return self.responses.pop(0)
+
+class TokenProvider:
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f"token-{self.calls}", self.expires_in
+
+def make_graph_client(responses, expires_in=3600, **options):
+    provider = TokenProvider(expires_in)
+    client = function_module.GraphClient(provider, backoff_base=0.001, **options)
+    client.session = StubSession(responses)
+    return client, provider
+
+class StubDocumentIntelligence:
+    """DocumentAnalysisClient stand-in: one page of text per analysis, or the given error"""
+
+    def __init__(self, text="Text read by Document Intelligence", error=None):
+        self.text = text
+        self.error = error
+        self.calls = []
+
+    def begin_analyze_document(self, model, content, **options):
+        self.calls.append(options)
+        if self.error:
+            raise self.error
+        pages = options.get("pages")
+        page_numbers = [int(page) for page in pages.split(",")] if pages else [1]
+        result = types.SimpleNamespace(
+            pages=[types.SimpleNamespace(page_number=number, lines=[types.SimpleNamespace(content=f"{self.text} (page {number})")])
+                   for number in page_numbers],
+            tables=[],
+            to_dict=lambda: {}
+        )
+        return types.SimpleNamespace(result=lambda: result)
+
+class StubSearchClient:
+    """azure.search.documents.SearchClient stand-in recording deleted chunk ids"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.deleted = []
+
+    def delete_documents(self, documents):
+        if not self.fail:
+            self.deleted.extend(document["chunk_id"] for document in documents)
+        return [types.SimpleNamespace(key=document["chunk_id"], succeeded=not self.fail) for document in documents]
+
+def make_processor(storage=None, graph_pages=None, **settings):
+    """DocumentProcessor with offline clients and the settings __init__ would read from the environment"""
+    processor = function_module.DocumentProcessor.__new__(function_module.DocumentProcessor)
+    processor.storage_client = storage or FakeBlobStorage()
+    processor.graph_client = FakeGraphClient(graph_pages or {})
+    processor.processed_ledger = function_module.ProcessedDocumentLedger(processor.storage_client, batch_size=1000)
+    processor.max_documents_per_run = 100
+    processor.max_file_size_mb = 100
+    processor.max_cost_per_run = 0.0
+    processor.chunk_storage_mode = "blob_per_chunk"
+    processor.search_client = None
+    processor.download_workers = 2
+    processor.extract_workers = 2
+    processor.upload_workers = 2
+    processor.pipeline_queue_size = 4
+    processor.pipeline_admission_cutoff_seconds = 0.0
+    processor.crawl_concurrency = 4
+    processor.local_first_extraction = True
+    processor.local_extraction_min_chars = 100
+    processor.local_extractors = {
+        '.txt': ("text decoder", processor._extract_txt_locally),
+        '.docx': ("docx XML parser", processor._extract_docx_locally),
+    }
+    processor.pdf_text_layer_detection = False
+    processor.pdf_min_chars_per_page = 50
+    processor.pdf_min_text_coverage = 0.5
+    processor.extraction_cache = create_extraction_cache("off")
+    processor.doc_intelligence_client = StubDocumentIntelligence()
+    processor.excel_processor = EnhancedExcelProcessor()
+    processor.incremental_tracker_ingest = True
+    processor.supported_extensions = {'.pdf', '.docx', '.doc', '.xlsx', '.xls', '.pptx', '.ppt', '.txt'}
+    processor._pending_delta_state = {}
+    processor._stats_lock = threading.Lock()
+    processor.processing_stats = {
+        "documents_processed_this_run": 0,
+        "total_cost_estimate": 0.0,
+        "processing_start_time": datetime.datetime.utcnow()
+    }
+    for name, value in settings.items():
+        setattr(processor, name, value)
+    return processor
+
+def new_site_results():
+    """The counters process_site_documents starts a site with"""
+    results = {f"documents_{outcome}": 0 for outcome in (
+        "found", "processed", "quarantined", "flagged", "skipped", "new", "changed", "unchanged", "failed",
+        "skipped_size_limit", "skipped_extraction_failed", "skipped_deadline"
+    )}
+    results.update(processing_errors=[], file_type_summary={}, cost_estimate=0.0, blobs_written=0,
+                   bytes_written=0, extraction_routes={}, pdf_pages={})
+    return results
+
+def pipeline_documents(count):
+    return [{"id": f"doc-{i}", "name": f"Doc {i}.docx", "path": f"/Doc {i}.docx", "extension": ".docx", "size": 1000}
+            for i in range(count)]
+
+def stub_stages(processor, store):
+    """Replace the download and extract stages with pass-throughs and the store stage with store(work)"""
+    processor._download_stage = lambda work: None
+    processor._extract_stage = lambda work: None
+    processor._store_stage = store
+
+def drive_item(item_id, name, parent="root-id", **fields):
+    return {"id": item_id, "name": name, "file": {}, "parentReference": {"id": parent}, "eTag": f"{item_id}-v1", **fields}
+
+def test_delta_keeps_last_state_per_item():
+    delta_url = "https://graph.microsoft.com/v1.0/drives/drive-1/root/delta"
+    page_two = f"{delta_url}?token=page-2"
+    storage = FakeBlobStorage()
+    # "gone.docx" was processed by an earlier run
+    storage.put("jennifur-processed", "gone_0.json", "{}")
+    processor = make_processor(storage, {
+        delta_url: {
+            "value": [
+                {"id": "root-id", "name": "root", "root": {}, "folder": {}},
+                drive_item("edited", "Edited.docx"),
+                drive_item("gone", "Gone.docx"),
+                drive_item("kept", "Kept.pdf"),
+            ],
+            "@odata.nextLink": page_two
+        },
+        page_two: {
+            "value": [
+                drive_item("edited", "Edited.docx", eTag="edited-v2"),
+                {"id": "gone", "deleted": {"state": "deleted"}},
+            ],
+            "@odata.deltaLink": f"{delta_url}?token=next-run"
+        }
+    })
+
+    documents = processor._get_drive_documents_delta("drive-1")
+
+    assert [doc["id"] for doc in documents] == ["kept", "edited"]
+    assert documents[1]["etag"] == "edited-v2"
+    assert processor._pending_delta_state["drive-1"]["deleted"] == 1
+    assert storage.deletes == ["gone_0.json"]
+    assert not processor.processed_ledger.contains("gone")
+    print("✅ Delta pages collapse to each item's last state; deleted-later files are only deleted")
+
+def test_graph_client_caches_and_refreshes_the_token():
+    client, provider = make_graph_client([FakeResponse({}) for _ in range(3)])
+    client.get("https://graph.microsoft.com/v1.0/sites")
+    client.get("https://graph.microsoft.com/v1.0/sites")
+    assert provider.calls == 1
+    
+    # Within refresh_margin of expiry the token is fetched again before the request
+    client._token_expires_at = time.monotonic() + client.refresh_margin - 1
+    client.get("https://graph.microsoft.com/v1.0/sites")
+    assert provider.calls == 2
+    assert [headers["Authorization"] for _, _, headers in client.session.sent] == ["Bearer token-1", "Bearer token-1", "Bearer token-2"]
+    
+    # A 401 refreshes the token once; a second 401 is returned to the caller
+    client, provider = make_graph_client([FakeResponse(status_code=401), FakeResponse({})])
+    assert client.get("https://graph.microsoft.com/v1.0/sites").status_code == 200
+    assert provider.calls == 2
+    client, provider = make_graph_client([FakeResponse(status_code=401), FakeResponse(status_code=401)])
+    assert client.get("https://graph.microsoft.com/v1.0/sites").status_code == 401
+    assert client.stats()["token_refreshes"] == 2
+    print("✅ Graph token is cached, refreshed before expiry and once on a 401")
+
+def test_graph_client_retries_throttled_requests():
+    client, _ = make_graph_client([
+        FakeResponse(status_code=429, headers={"Retry-After": "0"}),
+        FakeResponse(status_code=503),
+        FakeResponse({"value": []}),
+    ])
+    response = client.get("https://graph.microsoft.com/v1.0/sites")
+    assert response.status_code == 200
+    stats = client.stats()
+    assert (stats["requests"], stats["throttled"], stats["retries"], stats["errors"]) == (3, 2, 2, 0)
+    
+    # Retry-After in seconds or as an HTTP date is a lower bound; jitter only adds to it
+    delay = client._retry_delay(FakeResponse(status_code=429, headers={"Retry-After": "7"}), 0)
+    assert 7 <= delay <= 7 + client.backoff_base
+    retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=30)
+    http_date = retry_at.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    assert 28 <= client._retry_delay(FakeResponse(status_code=503, headers={"Retry-After": http_date}), 0) <= 31
+    # Without one the backoff is capped
+    assert client._retry_delay(FakeResponse(status_code=503), 30) <= client.max_backoff
+    
+    # Once retries run out the last throttled response is returned
+    client, _ = make_graph_client([FakeResponse(status_code=429, headers={"Retry-After": "0"}) for _ in range(3)], max_retries=2)
+    assert client.get("https://graph.microsoft.com/v1.0/sites").status_code == 429
+    assert client.stats()["errors"] == 1
+    print("✅ Graph requests honour Retry-After on 429/503 and give up after max_retries")
+
+def folder_item(item_id, name):
+    return {"id": item_id, "name": name, "folder": {"childCount": 1}}
+
+def test_breadth_first_crawl():
+    query = f"$top=999&$select={function_module.GRAPH_ITEM_SELECT}"
+    drive = "https://graph.microsoft.com/v1.0/drives/drive-1"
+    root_url = f"{drive}/root/children?{query}"
+    clients_url = f"{drive}/root:/Clients%20A:/children?{query}"
+    notes_url = f"{drive}/root:/Clients%20A%2FNotes:/children?{query}"
+    archive_url = f"{drive}/root:/Archive:/children?{query}"
+    # Twelve files already processed at their current version fill the top level
+    unchanged = [drive_item(f"old-{i}", f"Old {i:02d}.docx") for i in range(12)]
+    pages = {
+        root_url: {"value": unchanged[:6] + [folder_item("clients", "Clients A")], "@odata.nextLink": f"{root_url}&page=2"},
+        f"{root_url}&page=2": {"value": unchanged[6:] + [folder_item("archive", "Archive"), drive_item("img", "Logo.png")]},
+        clients_url: {"value": [drive_item("plan", "Plan.docx"), folder_item("notes", "Notes")]},
+        notes_url: {"value": [drive_item("minutes", "Minutes.pdf")]},
+        archive_url: {"value": [drive_item("budget", "Budget.xlsx")]},
+    }
+    storage = FakeBlobStorage()
+    storage.put(LEDGER_CONTAINER, LEDGER_BLOB, json.dumps({"documents": {item["id"]: {"etag": item["eTag"]} for item in unchanged}}))
+    processor = make_processor(storage, pages, max_documents_per_run=1)
+    
+    documents = processor._get_drive_documents_breadth_first("drive-1")
+    
+    assert sorted(processor.graph_client.requested) == sorted(pages)
+    assert all(url.startswith(drive) and query in url for url in processor.graph_client.requested)
+    paths = [doc["path"] for doc in documents]
+    assert paths == sorted(paths)
+    assert paths[:3] == ["/Archive/Budget.xlsx", "/Clients A/Notes/Minutes.pdf", "/Clients A/Plan.docx"]
+    assert len(documents) == 15
+    
+    # The discovery limit (10 per processed document) counts new or changed documents only -
+    # with an empty ledger the top-level files reach it and no folders after them are listed
+    processor = make_processor(FakeBlobStorage(), pages, max_documents_per_run=1)
+    documents = processor._get_drive_documents_breadth_first("drive-1")
+    assert processor.graph_client.requested == [root_url, f"{root_url}&page=2", clients_url]
+    assert len(documents) == 13
+    print("✅ Breadth-first crawl uses projected listings, sorts by path and limits discovery by pending documents")
+
+def test_delta_cursor_stays_behind_failed_documents():
+    delta_state = {"drive-1": {"link": "https://graph.microsoft.com/v1.0/drives/drive-1/root/delta?token=next-run", "folders": {}}}
+    checkpoint_name = "checkpoints/Clients/root.json"
+    outcomes = [
+        ({"documents_processed": 2, "documents_failed": 1}, False),
+        ({"documents_processed": 2, "documents_skipped_extraction_failed": 1}, False),
+        ({"documents_processed": 2, "documents_skipped_deadline": 1}, False),
+        ({"documents_processed": 1, "documents_skipped": 1, "documents_skipped_size_limit": 1}, True),
+    ]
+    for counts, advanced in outcomes:
+        storage = FakeBlobStorage()
+        processor = make_processor(storage)
+        processor._pending_delta_state = {drive: dict(state) for drive, state in delta_state.items()}
+        site_results = {**new_site_results(), "documents_new": 2, "documents_changed": 1, **counts}
+        site_results["pipeline"] = {"documents_admitted": 3}
+        
+        processor._commit_delta_checkpoint("Clients", None, {}, site_results)
+        
+        saved = storage.names("processed-documents") == [checkpoint_name]
+        assert saved == advanced, counts
+        if advanced:
+            checkpoint = json.loads(storage.get("processed-documents", checkpoint_name).readall())
+            assert checkpoint["delta"]["drive-1"]["link"].endswith("token=next-run")
+    print("✅ Delta cursor only advances once every new or changed document was handled")
+
+LEDGER_CONTAINER = "processed-documents"
+LEDGER_BLOB = "ledger/processed_documents.json"
+
+def read_manifest(storage):
+    return json.loads(storage.get(LEDGER_CONTAINER, LEDGER_BLOB).readall())["documents"]
+
+def test_ledger_bootstraps_from_chunk_listing():
+    storage = FakeBlobStorage()
+    for name in ("per-chunk_0.json", "per-chunk_1.json", "jsonl-doc.jsonl"):
+        storage.put("jennifur-processed", name, "{}")
+    ledger = function_module.ProcessedDocumentLedger(storage, batch_size=1000)
+    
+    assert ledger.contains("per-chunk") and ledger.contains("jsonl-doc")
+    assert not ledger.contains("per-chunk_1")
+    assert ledger.stats["source"] == "chunk_listing"
+    
+    ledger.flush()
+    assert sorted(read_manifest(storage)) == ["jsonl-doc", "per-chunk"]
+    assert function_module.ProcessedDocumentLedger(storage).contains("jsonl-doc")
+    print("✅ Ledger is bootstrapped from one chunk listing and persisted by the first flush")
+
+def test_ledger_merges_concurrent_writers_without_resurrecting_forgotten_entries():
+    storage = FakeBlobStorage()
+    seed = function_module.ProcessedDocumentLedger(storage, batch_size=1000)
+    seed.mark_processed("kept", {"etag": "kept-v1"})
+    seed.mark_processed("deleted", {"etag": "deleted-v1"})
+    seed.flush()
+    
+    ours = function_module.ProcessedDocumentLedger(storage, batch_size=1000)
+    theirs = function_module.ProcessedDocumentLedger(storage, batch_size=1000)
+    assert ours.contains("deleted") and theirs.contains("deleted")
+    theirs.forget("deleted")
+    theirs.mark_processed("theirs", {"etag": "theirs-v1"})
+    theirs.flush()
+    
+    ours.mark_processed("ours", {"etag": "ours-v1"})
+    ours.flush()
+    
+    assert ours.stats["conflicts"] == 1
+    assert ours.stats["flush_errors"] == 0
+    assert sorted(read_manifest(storage)) == ["kept", "ours", "theirs"]
+    assert not ours.contains("deleted")
+    print("✅ Conflicting flushes merge both runs' entries and keep the other run's removals")
+
+def test_ledger_keeps_entries_pending_when_a_flush_fails():
+    storage = FakeBlobStorage()
+    ledger = function_module.ProcessedDocumentLedger(storage, batch_size=1000)
+    ledger.mark_processed("doc", {"etag": "doc-v1"})
+    
+    put = storage.put
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("storage unavailable")
+    storage.put = unavailable
+    ledger.flush()
+    assert ledger.stats["flush_errors"] == 1
+    
+    storage.put = put
+    ledger.flush()
+    assert ledger.stats["flushes"] == 1
+    assert read_manifest(storage)["doc"]["etag"] == "doc-v1"
+    print("✅ Entries of a failed flush stay pending and are written by the next one")
+
+def test_ledger_change_status():
+    processed_at = "2024-03-01T00:00:00Z"
+    cases = [
+        # (recorded entry, version seen in SharePoint, expected status)
+        (None, {"etag": "v1"}, "new"),
+        ({"etag": "v1", "ctag": "c1"}, {"etag": "v1", "ctag": "c2"}, "unchanged"),
+        ({"etag": "v1", "ctag": "c1"}, {"etag": "v2", "ctag": "c1"}, "changed"),
+        ({"ctag": "c1"}, {"etag": "v1", "ctag": "c1"}, "unchanged"),
+        ({"ctag": "c1"}, {"etag": "v1", "ctag": "c2"}, "changed"),
+        ({"last_modified": "2024-01-01T00:00:00Z", "size": 10}, {"last_modified": "2024-01-01T00:00:00Z", "size": 10}, "unchanged"),
+        ({"last_modified": "2024-01-01T00:00:00Z", "size": 10}, {"last_modified": "2024-01-01T00:00:00Z", "size": 11}, "changed"),
+        ({"last_modified": "2024-01-01T00:00:00Z", "size": 10}, {"last_modified": "2024-02-01T00:00:00Z", "size": 10}, "changed"),
+        # Bootstrapped from the chunk listing - only processed_at is known
+        ({"processed_at": processed_at}, {"etag": "v1", "last_modified": "2024-04-01T00:00:00Z"}, "changed"),
+        ({"processed_at": processed_at}, {"etag": "v1", "last_modified": "2024-02-01T00:00:00Z"}, "unchanged"),
+    ]
+    for entry, version, expected in cases:
+        storage = FakeBlobStorage()
+        storage.put(LEDGER_CONTAINER, LEDGER_BLOB, json.dumps({"documents": {"doc": entry} if entry else {}}))
+        ledger = function_module.ProcessedDocumentLedger(storage, batch_size=1000)
+        assert ledger.change_status("doc", version) == expected, (entry, version, expected)
+    
+    # An unchanged bootstrapped entry adopts the version, so the next run compares eTags
+    assert ledger.entry("doc")["etag"] == "v1"
+    assert ledger.change_status("doc", {"etag": "v2"}) == "changed"
+    ledger.flush()
+    assert read_manifest(storage)["doc"]["etag"] == "v1"
+    print("✅ Change status follows eTag, then cTag, then lastModified/size, then bootstrap adoption")
+
+def test_changed_document_replaces_its_stale_chunks():
+    storage = FakeBlobStorage()
+    for name in ("doc_0.json", "doc_1.json", "doc_2.json", "docother_0.json"):
+        storage.put("jennifur-processed", name, "{}")
+    storage.put(LEDGER_CONTAINER, LEDGER_BLOB, json.dumps({"documents": {"doc": {"etag": "doc-v1"}}}))
+    processor = make_processor(storage)
+    doc = {"id": "doc", "name": "Doc.docx", "path": "/Doc.docx", "extension": ".docx", "etag": "doc-v2"}
+    processor._classify_documents([doc], new_site_results())
+    assert doc["change_status"] == "changed"
+    
+    work = processor._new_work_item(doc)
+    work["chunks"] = processor._chunk_text("Edited and now much shorter.", "doc", "Doc.docx", "/Doc.docx")
+    work["extracted_text"] = "Edited and now much shorter."
+    result = processor._store_stage(work)
+    
+    assert result["action"] == "processed"
+    assert storage.names("jennifur-processed") == ["doc_0.json", "docother_0.json"]
+    assert processor.processed_ledger.entry("doc")["etag"] == "doc-v2"
+    print("✅ A changed document's leftover chunks are deleted and its new version recorded")
+
+def read_jsonl(storage, name):
+    return [json.loads(line) for line in storage.get("jennifur-processed", name).readall().decode("utf-8").splitlines()]
+
+def test_jsonl_mode_stores_one_blob_per_document():
+    storage = FakeBlobStorage()
+    processor = make_processor(storage, chunk_storage_mode="jsonl")
+    text = "Quarterly roadmap review – naïve café notes. " * 80
+    chunks = processor._chunk_text(text, "doc", "Roadmap.docx", "/Clients/Roadmap.docx")
+    assert len(chunks) > 1
+    
+    written = processor._store_processed_document_with_chunks("doc", "Roadmap.docx", text, {}, "/Clients/Roadmap.docx", chunks)
+    
+    assert storage.names("jennifur-processed") == ["doc.jsonl"]
+    assert written["blobs_written"] == 1
+    stored = read_jsonl(storage, "doc.jsonl")
+    assert [chunk["chunk_id"] for chunk in stored] == [f"doc_{i}" for i in range(len(chunks))]
+    assert stored == chunks
+    print("✅ JSONL mode round-trips a document through one {doc_id}.jsonl blob with the same chunk ids")
+
+def test_storage_mode_change_removes_the_other_layout():
+    for old_blobs, mode, kept in (
+        (["doc_0.json", "doc_1.json"], "jsonl", ["doc.jsonl"]),
+        (["doc.jsonl"], "blob_per_chunk", ["doc_0.json"]),
+    ):
+        storage = FakeBlobStorage()
+        for name in old_blobs:
+            storage.put("jennifur-processed", name, "{}")
+        storage.put(LEDGER_CONTAINER, LEDGER_BLOB, json.dumps({"documents": {"doc": {"etag": "doc-v1"}}}))
+        processor = make_processor(storage, chunk_storage_mode=mode)
+        doc = {"id": "doc", "name": "Doc.docx", "path": "/Doc.docx", "extension": ".docx", "etag": "doc-v2"}
+        processor._classify_documents([doc], new_site_results())
+        
+        work = processor._new_work_item(doc)
+        work["extracted_text"] = "Short edited document."
+        work["chunks"] = processor._chunk_text(work["extracted_text"], "doc", "Doc.docx", "/Doc.docx")
+        assert processor._store_stage(work)["action"] == "processed"
+        
+        assert storage.names("jennifur-processed") == kept, mode
+    print("✅ Switching the chunk storage mode deletes the previous layout's blobs")
+
+def test_local_first_extraction_routes():
+    readable = ("Board minutes: revenue grew and the roadmap was approved. " * 10).encode("utf-8")
+    cases = [
+        # (filename, content, route, escalation reason prefix)
+        ("Minutes.txt", readable, "local", None),
+        ("Note.txt", b"Call Sam." + b" " * 200, "local_escalated", "too_little_text"),
+        ("Garbled.txt", b"ab\x01\x02" * 100, "local_escalated", "unreadable_text"),
+        ("Scan.txt", b"Scanned page" * 20 + b" " * 600 * 1024, "local_escalated", "low_text_density"),
+        ("Broken.docx", b"not a zip archive " * 10, "local_escalated", "parse_error"),
+    ]
+    for filename, content, route, reason in cases:
+        processor = make_processor()
+        extraction = processor._route_extraction(content, filename)
+        
+        assert extraction["success"], filename
+        assert extraction["route"] == route, filename
+        if reason is None:
+            assert extraction["escalation_reason"] is None
+            assert extraction["cost"] == 0.0 and not processor.doc_intelligence_client.calls
+            assert "revenue grew" in extraction["text"]
+        else:
+            assert extraction["escalation_reason"].startswith(reason), (filename, extraction["escalation_reason"])
+            assert len(processor.doc_intelligence_client.calls) == 1
+            assert "Text read by Document Intelligence" in extraction["text"]
+    print("✅ Office/text files are parsed locally and escalated to Document Intelligence for each reason")
+
+def test_thin_local_text_is_used_when_document_intelligence_fails():
+    processor = make_processor(doc_intelligence_client=StubDocumentIntelligence(error=RuntimeError("service unavailable")))
+    extraction = processor._route_extraction(b"Call Sam." + b" " * 200, "Note.txt")
+    
+    assert extraction["success"]
+    assert (extraction["route"], extraction["cost"]) == ("local_escalated", 0.0)
+    assert "Call Sam." in extraction["text"] and "text decoder (local)" in extraction["text"]
+    
+    # Nothing usable locally - the failure stands and the document is skipped
+    extraction = processor._route_extraction(b"not a zip archive " * 10, "Broken.docx")
+    assert not extraction["success"]
+    print("✅ A thin local result stands in when Document Intelligence fails")
+
+def stub_pdf_reader(page_texts):
+    """PdfReader stand-in whose pages have the given text layers"""
+    pages = [types.SimpleNamespace(extract_text=lambda text=text: text) for text in page_texts]
+    return lambda stream: types.SimpleNamespace(pages=pages)
+
+def test_pdf_partial_ocr():
+    text_layer = "Signed engagement letter with scope, fees and milestones for the year."
+    real_reader = function_module.PdfReader
+    function_module.PdfReader = stub_pdf_reader([text_layer, text_layer, "", text_layer])
+    try:
+        processor = make_processor(pdf_text_layer_detection=True)
+        extraction = processor._route_extraction(b"%PDF-1.7" + b" " * 200, "Engagement.pdf")
+        assert extraction["success"] and extraction["route"] == "local_partial_ocr"
+        assert processor.doc_intelligence_client.calls == [{"pages": "3"}]
+        assert extraction["pdf_pages"] == {"total": 4, "text_layer": 3, "ocr": 1}
+        assert "Text read by Document Intelligence (page 3)" in extraction["text"]
+        
+        # OCR of the missing page fails - the document is skipped, not stored without it
+        processor = make_processor(pdf_text_layer_detection=True,
+                                   doc_intelligence_client=StubDocumentIntelligence(error=RuntimeError("service unavailable")))
+        extraction = processor._route_extraction(b"%PDF-1.7" + b" " * 200, "Engagement.pdf")
+        assert not extraction["success"]
+        assert extraction["pdf_pages"] == {"total": 4, "text_layer": 3, "ocr": 0, "ocr_failed": 1}
+        
+        doc = {"id": "engagement", "name": "Engagement.pdf", "path": "/Engagement.pdf", "extension": ".pdf", "change_status": "new"}
+        work = processor._new_work_item(doc)
+        work["doc_content"] = b"%PDF-1.7" + b" " * 200
+        result = processor._extract_stage(work)
+        assert result["action"] == "skipped_extraction_failed"
+        assert result["pdf_pages"]["ocr_failed"] == 1
+        assert not processor.processed_ledger.contains("engagement")
+    finally:
+        function_module.PdfReader = real_reader
+    print("✅ PDFs OCR only pages without a text layer and are skipped when that OCR fails")
+
+def tracker_workbook(sheets):
+    """xlsx bytes with one sheet per {name: rows}"""
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for name, rows in sheets.items():
+        sheet = workbook.create_sheet(name)
+        for row in rows:
+            sheet.append(row)
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+def meeting_rows(count, note="Weekly review"):
+    return [["Date", "Attendee", "Notes"]] + [[f"2024-02-{i % 28 + 1:02d}", "Caleb", f"{note} number {i}"] for i in range(count)]
+
+def ingest_tracker(processor, sheets, version):
+    """Run one version of the Magic Meeting Tracker through extraction and storage; returns the chunk uploads"""
+    doc = {"id": "tracker", "name": "Magic Meeting Tracker.xlsx", "path": "/PM/Magic Meeting Tracker.xlsx",
+           "extension": ".xlsx", "size": 1, "etag": f"tracker-v{version}"}
+    processor._classify_documents([doc], new_site_results())
+    work = processor._new_work_item(doc)
+    work["doc_content"] = tracker_workbook(sheets)
+    uploads_before = len(processor.storage_client.uploads)
+    assert processor._extract_stage(work) is None
+    assert processor._store_stage(work)["action"] == "processed"
+    return sorted(processor.storage_client.uploads[uploads_before:])
+
+def test_tracker_reingests_only_changed_sheets():
+    storage = FakeBlobStorage()
+    processor = make_processor(storage)
+    sheets = {"Acme Corp": meeting_rows(2), "Beta LLC": meeting_rows(60), "Gamma Inc": meeting_rows(3)}
+    uploads = ingest_tracker(processor, sheets, 1)
+    assert "tracker_sheet_Beta_LLC_3.json" in uploads
+    assert storage.names("jennifur-processed") == uploads
+    
+    # One tab edited - only that sheet is rebuilt
+    sheets["Acme Corp"] = meeting_rows(2, note="Renewal call")
+    assert ingest_tracker(processor, sheets, 2) == ["tracker_sheet_Acme_Corp_0.json"]
+    
+    # A sheet removed and another shrunk - their leftover blobs are deleted
+    del sheets["Gamma Inc"]
+    sheets["Beta LLC"] = meeting_rows(3)
+    assert ingest_tracker(processor, sheets, 3) == ["tracker_sheet_Beta_LLC_0.json"]
+    assert storage.names("jennifur-processed") == ["tracker_sheet_Acme_Corp_0.json", "tracker_sheet_Beta_LLC_0.json"]
+    assert sorted(processor.processed_ledger.entry("tracker")["sheets"]) == ["Acme Corp", "Beta LLC"]
+    
+    # Re-saved without changes - a new eTag, but nothing to upload or delete
+    deletes_before = len(storage.deletes)
+    assert ingest_tracker(processor, sheets, 4) == []
+    assert len(storage.deletes) == deletes_before
+    assert processor.processed_ledger.entry("tracker")["etag"] == "tracker-v4"
+    print("✅ Magic Meeting Tracker re-ingestion uploads changed sheets and deletes removed chunks")
+
+def index_version(storage):
+    """Search's index-freshness token over the stored chunks"""
+    from api.client_aware_rag import ClientAwareRAGEngine
+    from utils.offline_services import FakeAsyncAzureOpenAI, FakeAsyncSearchClient, FakeSearchClient, InMemorySearchIndex
+    
+    index = InMemorySearchIndex([json.loads(storage.get("jennifur-processed", name).readall())
+                                 for name in storage.names("jennifur-processed")])
+    engine = ClientAwareRAGEngine(
+        search_client=FakeSearchClient(index),
+        async_search_client_factory=lambda: FakeAsyncSearchClient(index),
+        openai_client=FakeAsyncAzureOpenAI()
+    )
+    return asyncio.run(engine._probe_index_version())
+
+def test_tracker_edit_changes_the_search_index_version():
+    storage = FakeBlobStorage()
+    processor = make_processor(storage)
+    sheets = {"Acme Corp": meeting_rows(2), "Beta LLC": meeting_rows(2)}
+    ingest_tracker(processor, sheets, 1)
+    before = index_version(storage)
+    
+    # Same chunk count, only the tracker content differs
+    sheets["Acme Corp"] = meeting_rows(2, note="Renewal call")
+    assert ingest_tracker(processor, sheets, 2) == ["tracker_sheet_Acme_Corp_0.json"]
+    
+    assert len(storage.names("jennifur-processed")) == 2
+    assert index_version(storage) != before
+    print("✅ An edited tracker sheet invalidates cached search results")
+
+def test_tracker_reingests_changed_sheets_in_jsonl_mode():
+    storage = FakeBlobStorage()
+    processor = make_processor(storage, chunk_storage_mode="jsonl", search_client=StubSearchClient())
+    sheets = {"Acme Corp": meeting_rows(2), "Beta LLC": meeting_rows(60), "Gamma Inc": meeting_rows(3)}
+    assert ingest_tracker(processor, sheets, 1) == [
+        "tracker_sheet_Acme_Corp.jsonl", "tracker_sheet_Beta_LLC.jsonl", "tracker_sheet_Gamma_Inc.jsonl"
+    ]
+    assert len(read_jsonl(storage, "tracker_sheet_Beta_LLC.jsonl")) == 4
+    
+    # Beta shrinks to one chunk and Gamma is removed - their dropped chunks leave the index
+    sheets["Beta LLC"] = meeting_rows(3)
+    del sheets["Gamma Inc"]
+    assert ingest_tracker(processor, sheets, 2) == ["tracker_sheet_Beta_LLC.jsonl"]
+    assert storage.names("jennifur-processed") == ["tracker_sheet_Acme_Corp.jsonl", "tracker_sheet_Beta_LLC.jsonl"]
+    assert sorted(processor.search_client.deleted) == [
+        "tracker_sheet_Beta_LLC_1", "tracker_sheet_Beta_LLC_2", "tracker_sheet_Beta_LLC_3", "tracker_sheet_Gamma_Inc_0"
+    ]
+    print("✅ Tracker sheets are stored and replaced as one .jsonl blob each")
+
+def store_document_version(processor, text, version):
+    doc = {"id": "doc", "name": "Roadmap.docx", "path": "/Roadmap.docx", "extension": ".docx", "etag": f"doc-v{version}"}
+    processor._classify_documents([doc], new_site_results())
+    work = processor._new_work_item(doc)
+    work["extracted_text"] = text
+    work["chunks"] = processor._chunk_text(text, "doc", "Roadmap.docx", "/Roadmap.docx")
+    return processor._store_stage(work)
+
+def test_jsonl_mode_deletes_dropped_chunks_from_the_index():
+    storage = FakeBlobStorage()
+    processor = make_processor(storage, chunk_storage_mode="jsonl", search_client=StubSearchClient())
+    store_document_version(processor, "Roadmap milestone review. " * 100, 1)
+    assert processor.processed_ledger.entry("doc")["chunk_ids"] == ["doc_0", "doc_1", "doc_2"]
+    assert processor.search_client.deleted == []
+    
+    # The rewritten .jsonl blob no longer has doc_1 and doc_2 - only the index can drop them
+    assert store_document_version(processor, "Roadmap cancelled.", 2)["action"] == "processed"
+    assert storage.names("jennifur-processed") == ["doc.jsonl"]
+    assert processor.search_client.deleted == ["doc_1", "doc_2"]
+    assert processor.processed_ledger.entry("doc")["chunk_ids"] == ["doc_0"]
+    
+    # Deleted in SharePoint - the remaining chunk goes too
+    processor._remove_deleted_documents(["doc"])
+    assert processor.search_client.deleted == ["doc_1", "doc_2", "doc_0"]
+    assert storage.names("jennifur-processed") == []
+    print("✅ JSONL mode deletes chunk ids a new version dropped from the search index")
+
+def test_jsonl_version_is_not_recorded_when_index_cleanup_fails():
+    processor = make_processor(chunk_storage_mode="jsonl", search_client=StubSearchClient())
+    store_document_version(processor, "Roadmap milestone review. " * 100, 1)
+    
+    processor.search_client.fail = True
+    result = store_document_version(processor, "Roadmap cancelled.", 2)
+    
+    assert result["action"] == "error"
+    entry = processor.processed_ledger.entry("doc")
+    assert entry["etag"] == "doc-v1" and len(entry["chunk_ids"]) == 3
+    print("✅ A version whose dropped chunks could not be removed from the index is retried")
+
+def test_pipeline_never_overshoots_the_run_limit():
+    processor = make_processor(max_documents_per_run=3)
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+    
+    def store(work):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.01)
+        with lock:
+            active["now"] -= 1
+        # The first document turns out to be unchanged and must free its slot
+        if work["doc_id"] == "doc-0":
+            return {"action": "skipped", "reason": "already_processed", "extension": ".docx"}
+        return {"action": "processed", "extension": ".docx"}
+    
+    stub_stages(processor, store)
+    site_results = new_site_results()
+    counted = processor._run_document_pipeline(pipeline_documents(10), site_results)
+    
+    assert counted == 3
+    assert site_results["documents_processed"] == 3
+    assert site_results["documents_skipped"] == 1
+    assert site_results["pipeline"]["documents_admitted"] == 4
+    assert active["peak"] <= 3
+    print("✅ Pipeline admits documents in flight only up to the run limit; skipped ones free their slot")
+
+def test_pipeline_records_unfinished_documents_at_the_deadline():
+    processor = make_processor()
+    release = threading.Event()
+    
+    def store(work):
+        if work["doc_id"] != "doc-0":
+            release.wait(5)  # Still uploading when the run runs out of time
+        return {"action": "processed", "extension": ".docx"}
+    
+    stub_stages(processor, store)
+    site_results = new_site_results()
+    try:
+        counted = processor._run_document_pipeline(pipeline_documents(3), site_results, deadline=time.monotonic() + 0.5)
+    finally:
+        release.set()
+    
+    assert counted == 1
+    assert site_results["documents_processed"] == 1
+    assert site_results["documents_skipped_deadline"] == 2
+    assert site_results["pipeline"]["documents_admitted"] == 3
+    # Late results of documents already recorded as skipped are dropped
+    time.sleep(0.1)
+    assert site_results["documents_processed"] == 1
+    print("✅ Documents unfinished at the deadline are recorded once, as skipped_deadline")
+
+def test_pipeline_stops_admitting_at_the_admission_cutoff():
+    processor = make_processor(pipeline_admission_cutoff_seconds=60.0)
+    stub_stages(processor, lambda work: {"action": "processed", "extension": ".docx"})
+    site_results = new_site_results()
+    
+    counted = processor._run_document_pipeline(pipeline_documents(3), site_results, deadline=time.monotonic() + 30)
+    
+    assert counted == 0
+    assert site_results["pipeline"]["documents_admitted"] == 0
+    assert site_results["documents_skipped_deadline"] == 0
+    print("✅ No documents are admitted once less than the admission cutoff is left")
+
+if __name__ == "__main__":
+    print("🧪 Testing Document Ingestion Function")
+    print("=" * 50)
+    test_delta_keeps_last_state_per_item()
+    test_delta_cursor_stays_behind_failed_documents()
+    test_breadth_first_crawl()
+    test_graph_client_caches_and_refreshes_the_token()
+    test_graph_client_retries_throttled_requests()
+    test_ledger_bootstraps_from_chunk_listing()
+    test_ledger_merges_concurrent_writers_without_resurrecting_forgotten_entries()
+    test_ledger_keeps_entries_pending_when_a_flush_fails()
+    test_ledger_change_status()
+    test_changed_document_replaces_its_stale_chunks()
+    test_jsonl_mode_stores_one_blob_per_document()
+    test_storage_mode_change_removes_the_other_layout()
+    test_local_first_extraction_routes()
+    test_thin_local_text_is_used_when_document_intelligence_fails()
+    test_pdf_partial_ocr()
+    test_tracker_reingests_only_changed_sheets()
+    test_tracker_edit_changes_the_search_index_version()
+    test_tracker_reingests_changed_sheets_in_jsonl_mode()
+    test_jsonl_mode_deletes_dropped_chunks_from_the_index()
+    test_jsonl_version_is_not_recorded_when_index_cleanup_fails()
+    test_pipeline_never_overshoots_the_run_limit()
+    test_pipeline_records_unfinished_documents_at_the_deadline()
+    test_pipeline_stops_admitting_at_the_admission_cutoff()
+    print("\n🎉 All ingestion Function tests passed")
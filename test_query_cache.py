@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Test script for the two-tier query cache
+Checks LRU/TTL eviction, SQLite persistence, single-flight de-duplication
+and version-based invalidation
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from pathlib import Path
+
+# Add the project root to the path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+
+from src.core.cache import LRUCache, SQLiteCache, TwoTierCache, VersionedCache, normalize_query
+
+def test_normalize_query():
+    """Equivalent phrasings share a key"""
+    assert normalize_query("  Who is on the  Camelot team? ") == "who is on the camelot team"
+    assert normalize_query("Phoenix financials") == normalize_query("phoenix FINANCIALS.")
+    print("✅ Query normalization")
+
+def test_memory_lru_and_ttl():
+    """Memory tier evicts least recently used entries and expires old ones"""
+    cache = LRUCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # 'b' is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+    
+    cache.set("short", "lived", ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    print("✅ Memory LRU + TTL eviction")
+
+def test_disk_tier_survives_restart():
+    """SQLite tier is shared by new cache instances (restarts / other workers)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "cache.sqlite")
+        first = TwoTierCache(LRUCache(), SQLiteCache(db_path, "test"))
+        first.set("camelot team", "camelot team members roles")
+        
+        second = TwoTierCache(LRUCache(), SQLiteCache(db_path, "test"))
+        assert second.get("camelot team") == "camelot team members roles"
+        assert second.disk_hits == 1
+        
+        # Promoted to memory on the disk hit
+        assert second.get("camelot team") == "camelot team members roles"
+        assert second.memory_hits == 1
+        
+        # Size-based eviction on the disk tier
+        small = SQLiteCache(db_path, "small", max_entries=3)
+        for i in range(5):
+            small.set(f"k{i}", i)
+        assert len(small) == 3 and small.get("k0") is None and small.get("k4") == 4
+    print("✅ SQLite tier persistence + eviction")
+
+def test_disk_tier_connects_per_process():
+    """The SQLite file is opened on first use, and again in a forked worker"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cache.sqlite"
+        cache = SQLiteCache(str(db_path), "test")
+        assert not db_path.exists()  # Nothing opened at construction / import time
+        
+        cache.set("phoenix", "phoenix financials")
+        parent_conn = cache._conn
+        
+        if hasattr(os, "fork"):
+            read, write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                ok = cache.get("phoenix") == "phoenix financials" and cache._conn is not parent_conn
+                os.write(write, b"1" if ok else b"0")
+                os._exit(0)
+            os.waitpid(pid, 0)
+            assert os.read(read, 1) == b"1"
+        assert cache._conn is parent_conn
+    print("✅ SQLite tier connects lazily, once per process")
+
+def test_single_flight():
+    """Concurrent identical lookups trigger one computation"""
+    cache = TwoTierCache(LRUCache())
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "optimized"
+    
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute("q", compute) for _ in range(10)))
+    
+    results = asyncio.run(run())
+    assert results == ["optimized"] * 10
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 9
+    
+    # Failures are not cached
+    async def fail():
+        raise RuntimeError("LLM unavailable")
+    
+    async def run_failure():
+        try:
+            await cache.get_or_compute("broken", fail)
+        except RuntimeError:
+            return True
+        return False
+    
+    assert asyncio.run(run_failure())
+    assert cache.get("broken") is None
+    print("✅ Single-flight de-duplication")
+
+def test_versioned_cache_invalidation():
+    """Index version changes clear cached search results"""
+    version = ["100:2025-01-01"]
+    
+    async def probe():
+        return version[0]
+    
+    cache = VersionedCache(LRUCache(), probe, check_interval_seconds=0)
+    calls = []
+    
+    async def search():
+        calls.append(1)
+        return {"sources": [len(calls)]}
+    
+    async def run():
+        first = await cache.get_or_compute("phoenix", search)
+        repeat = await cache.get_or_compute("phoenix", search)
+        version[0] = "101:2025-01-02"  # New chunk ingested
+        refreshed = await cache.get_or_compute("phoenix", search)
+        return first, repeat, refreshed
+    
+    first, repeat, refreshed = asyncio.run(run())
+    assert first == repeat == {"sources": [1]}
+    assert refreshed == {"sources": [2]}
+    assert cache.stats()["invalidations"] == 1
+    print("✅ Version-based invalidation")
+
+def test_probe_failure_falls_back_to_ttl():
+    """A failing version probe switches the cache to TTL-only until it recovers"""
+    failing = [True]
+    
+    async def probe():
+        if failing[0]:
+            raise ConnectionError("search service unavailable")
+        return "100:2025-01-01"
+    
+    cache = VersionedCache(LRUCache(), probe, check_interval_seconds=0)
+    
+    async def search():
+        return {"sources": []}
+    
+    async def run():
+        await cache.get_or_compute("phoenix", search)
+        await cache.get_or_compute("phoenix", search)
+        stats = cache.stats()
+        failing[0] = False
+        await cache.get_or_compute("phoenix", search)
+        return stats
+    
+    stats = asyncio.run(run())
+    assert stats["freshness"] == "ttl_only" and stats["probe_failures"] == 2
+    assert cache.stats()["freshness"] == "versioned"
+    print("✅ Probe failure falls back to TTL-only")
+
+def test_should_cache_rejects_partial_results():
+    """Values turned away by should_cache reach the caller but are recomputed next time"""
+    cache = TwoTierCache(LRUCache())
+    calls = []
+    
+    async def search():
+        calls.append(1)
+        return {"sources": [], "failed_searches": ["MAGIC MEETING TRACKER"] if len(calls) == 1 else []}
+    
+    def complete(result):
+        return not result["failed_searches"]
+    
+    async def run():
+        partial = await cache.get_or_compute("camelot", search, should_cache=complete)
+        full = await cache.get_or_compute("camelot", search, should_cache=complete)
+        cached = await cache.get_or_compute("camelot", search, should_cache=complete)
+        return partial, full, cached
+    
+    partial, full, cached = asyncio.run(run())
+    assert partial["failed_searches"] and not full["failed_searches"]
+    assert cached == full and len(calls) == 2
+    assert cache.stats()["uncached"] == 1
+    print("✅ Partial results not cached")
+
+if __name__ == "__main__":
+    print("🧪 Testing Two-Tier Query Cache")
+    print("=" * 50)
+    test_normalize_query()
+    test_memory_lru_and_ttl()
+    test_disk_tier_survives_restart()
+    test_disk_tier_connects_per_process()
+    test_single_flight()
+    test_versioned_cache_invalidation()
+    test_probe_failure_falls_back_to_ttl()
+    test_should_cache_rejects_partial_results()
+    print("\n🎉 All query cache tests passed")
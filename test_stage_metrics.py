@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for per-stage latency metrics
+Checks span recording, request-scoped Server-Timing and Prometheus output
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# Add the project root to the path
+project_root = Path(__file__).parent
+sys.path.append(str(project_root))
+
+from src.core.metrics import MetricsRegistry, StageTimings, percentile, registry, span, with_timings
+
+def test_percentiles():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
+    print("✅ Nearest-rank percentiles")
+
+def test_spans_reach_request_timings_across_gather():
+    """Sub-query tasks started with asyncio.gather record onto the same request"""
+    registry.reset()
+
+    async def sub_query(stage):
+        with span(stage):
+            await asyncio.sleep(0.01)
+
+    async def pipeline():
+        with span("client_detection"):
+            pass
+        await asyncio.gather(sub_query("search_tracker"), sub_query("search_general"))
+
+    timings = StageTimings()
+    asyncio.run(with_timings(pipeline(), timings))
+
+    stages = sorted(stage for stage, _ in timings.spans)
+    assert stages == ["client_detection", "search_general", "search_tracker"]
+    assert registry.snapshot()["search_general"]["count"] == 1
+
+    header = timings.server_timing(0.05)
+    assert "search_tracker;dur=" in header and header.endswith("total;dur=50.0")
+    print(f"✅ Request spans collected: {header}")
+
+def test_prometheus_histogram():
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        metrics.observe("llm", seconds)
+
+    text = metrics.render_prometheus()
+    assert '# TYPE rag_stage_duration_seconds histogram' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="llm",le="1.0"} 3' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="llm",le="+Inf"} 4' in text
+    assert 'rag_stage_duration_seconds_count{stage="llm"} 4' in text
+    assert 'rag_stage_latency_seconds{stage="llm",quantile="0.95"} 3.000000' in text
+    print("✅ Prometheus histogram and quantiles rendered")
+
+if __name__ == "__main__":
+    print("🧪 Testing Stage Metrics")
+    print("=" * 50)
+    test_percentiles()
+    test_spans_reach_request_timings_across_gather()
+    test_prometheus_histogram()
+    print("\n🎉 All stage metrics tests passed")